@@ -0,0 +1,223 @@
+"""
+Adjudicação de partidas: encerra cedo posições já decididas, sem gastar
+mais chamadas ao LLM. Verificada antes de cada lance em play_game/aplay_game.
+
+Regras, na ordem:
+- material insuficiente, repetição tripla reclamável e regra dos 50 lances
+  (ADJUDICATE_DRAW_CLAIMS)
+- tablebase Syzygy local (SYZYGY_PATH; vários diretórios separados por
+  os.pathsep) quando a posição tem poucas peças e nenhum roque
+- avaliação (ADJUDICATION_EVAL = "material" ou "engine", com um motor UCI
+  em ADJUDICATION_ENGINE_PATH): vitória quando a vantagem passa de
+  ADJUDICATION_WIN_CP por ADJUDICATION_WIN_PLIES lances seguidos; empate
+  quando fica abaixo de ADJUDICATION_DRAW_CP por ADJUDICATION_DRAW_PLIES
+  lances, a partir do lance ADJUDICATION_DRAW_MIN_PLY
+
+O motivo vai para o cabeçalho "Termination" ("adjudication") e para o
+cabeçalho "Adjudication" do PGN.
+"""
+
+import asyncio
+import atexit
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, NamedTuple, Optional
+
+import chess
+import chess.engine
+import chess.syzygy
+
+ADJUDICATION_ENABLED = os.getenv("ADJUDICATION", "true").lower() == "true"
+ADJUDICATE_DRAW_CLAIMS = os.getenv("ADJUDICATE_DRAW_CLAIMS", "true").lower() == "true"
+SYZYGY_PATH = os.getenv("SYZYGY_PATH")
+# "off", "material" (contagem de peças) ou "engine" (motor UCI)
+ADJUDICATION_EVAL = os.getenv("ADJUDICATION_EVAL", "off").lower()
+ADJUDICATION_ENGINE_PATH = os.getenv("ADJUDICATION_ENGINE_PATH")
+ADJUDICATION_ENGINE_DEPTH = int(os.getenv("ADJUDICATION_ENGINE_DEPTH", "12"))
+ADJUDICATION_WIN_CP = int(os.getenv("ADJUDICATION_WIN_CP", "1000"))
+ADJUDICATION_WIN_PLIES = int(os.getenv("ADJUDICATION_WIN_PLIES", "8"))
+ADJUDICATION_DRAW_CP = int(os.getenv("ADJUDICATION_DRAW_CP", "20"))
+ADJUDICATION_DRAW_PLIES = int(os.getenv("ADJUDICATION_DRAW_PLIES", "20"))
+ADJUDICATION_DRAW_MIN_PLY = int(os.getenv("ADJUDICATION_DRAW_MIN_PLY", "80"))
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330,
+                chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+MATE_SCORE = 100000
+
+
+class Adjudication(NamedTuple):
+    result: str
+    reason: str
+
+
+_tablebase = None
+_tablebase_lock = threading.Lock()
+_engine = None
+_engine_lock = threading.Lock()
+_engine_failed = False
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_tablebase() -> Optional[chess.syzygy.Tablebase]:
+    """Tablebase Syzygy aberta uma vez por processo (None sem SYZYGY_PATH)"""
+    global _tablebase
+    if _tablebase is None and SYZYGY_PATH:
+        with _tablebase_lock:
+            if _tablebase is None:
+                tablebase = chess.syzygy.Tablebase()
+                for directory in SYZYGY_PATH.split(os.pathsep):
+                    try:
+                        tablebase.add_directory(directory)
+                    except OSError as e:
+                        print(f"Erro ao abrir tablebase {directory}: {e}")
+                _tablebase = tablebase
+    return _tablebase
+
+
+def get_eval_engine() -> Optional[chess.engine.SimpleEngine]:
+    """Motor UCI compartilhado pelas partidas; None se não configurado ou se falhou"""
+    global _engine, _engine_failed
+    if _engine is None and not _engine_failed:
+        with _engine_lock:
+            if _engine is None and not _engine_failed:
+                if not ADJUDICATION_ENGINE_PATH:
+                    print("ADJUDICATION_EVAL=engine sem ADJUDICATION_ENGINE_PATH; avaliação desativada")
+                    _engine_failed = True
+                    return None
+                try:
+                    _engine = chess.engine.SimpleEngine.popen_uci(ADJUDICATION_ENGINE_PATH)
+                    atexit.register(_engine.quit)
+                except (OSError, chess.engine.EngineError) as e:
+                    print(f"Erro ao iniciar motor de adjudicação {ADJUDICATION_ENGINE_PATH}: {e}")
+                    _engine_failed = True
+    return _engine
+
+
+def material_eval(board: chess.Board) -> int:
+    """Saldo de material em centipeões, do ponto de vista das brancas"""
+    score = 0
+    for piece_type, value in PIECE_VALUES.items():
+        score += value * (len(board.pieces(piece_type, chess.WHITE)) -
+                          len(board.pieces(piece_type, chess.BLACK)))
+    return score
+
+
+def engine_eval(board: chess.Board) -> Optional[int]:
+    engine = get_eval_engine()
+    if engine is None:
+        return None
+    try:
+        info = engine.analyse(board, chess.engine.Limit(depth=ADJUDICATION_ENGINE_DEPTH))
+    except chess.engine.EngineError as e:
+        print(f"Erro na avaliação do motor: {e}")
+        return None
+    return info["score"].white().score(mate_score=MATE_SCORE)
+
+
+def _winner(color: chess.Color) -> str:
+    return "1-0" if color == chess.WHITE else "0-1"
+
+
+class Adjudicator:
+    """Estado de uma partida (contagem de lances seguidos acima/abaixo do limite)"""
+
+    def __init__(self, enabled: bool = ADJUDICATION_ENABLED, draw_claims: bool = ADJUDICATE_DRAW_CLAIMS,
+                 eval_mode: str = ADJUDICATION_EVAL, win_cp: int = ADJUDICATION_WIN_CP,
+                 win_plies: int = ADJUDICATION_WIN_PLIES, draw_cp: int = ADJUDICATION_DRAW_CP,
+                 draw_plies: int = ADJUDICATION_DRAW_PLIES, draw_min_ply: int = ADJUDICATION_DRAW_MIN_PLY):
+        self.enabled = enabled
+        self.draw_claims = draw_claims
+        self.eval_mode = eval_mode if eval_mode in ("material", "engine") else "off"
+        self.win_cp = win_cp
+        self.win_plies = win_plies
+        self.draw_cp = draw_cp
+        self.draw_plies = draw_plies
+        self.draw_min_ply = draw_min_ply
+        self.tablebase = get_tablebase() if enabled else None
+        self._winning = 0  # > 0: brancas acima de win_cp há N lances; < 0: pretas
+        self._drawish = 0
+        # Motor e tablebase fazem I/O: na versão assíncrona rodam em thread
+        self.blocking = self.tablebase is not None or self.eval_mode == "engine"
+
+    def check(self, board: chess.Board) -> Optional[Adjudication]:
+        """Resultado adjudicado da posição atual, ou None para seguir jogando"""
+        if not self.enabled or board.is_checkmate() or board.is_stalemate():
+            return None
+        adjudication = (self._check_rules(board) or self._check_tablebase(board)
+                        or self._check_eval(board))
+        if adjudication:
+            with _stats_lock:
+                _stats[adjudication.reason.split(" (")[0]] += 1
+        return adjudication
+
+    async def acheck(self, board: chess.Board) -> Optional[Adjudication]:
+        if self.blocking:
+            return await asyncio.to_thread(self.check, board)
+        return self.check(board)
+
+    def _check_rules(self, board: chess.Board) -> Optional[Adjudication]:
+        if board.is_insufficient_material():
+            return Adjudication("1/2-1/2", "insufficient material")
+        if not self.draw_claims:
+            return None
+        if board.can_claim_fifty_moves():
+            return Adjudication("1/2-1/2", "fifty-move rule")
+        if board.can_claim_threefold_repetition():
+            return Adjudication("1/2-1/2", "threefold repetition")
+        return None
+
+    def _check_tablebase(self, board: chess.Board) -> Optional[Adjudication]:
+        if self.tablebase is None or board.castling_rights:
+            return None
+        if chess.popcount(board.occupied) > chess.syzygy.TBPIECES:
+            return None
+        try:
+            wdl = self.tablebase.probe_wdl(board)
+        except KeyError:
+            # MissingTableError também é KeyError
+            return None
+        # WDL do lado a jogar; ±1 (cursed/blessed) é empate pela regra dos 50 lances
+        if wdl == 2:
+            return Adjudication(_winner(board.turn), "syzygy win")
+        if wdl == -2:
+            return Adjudication(_winner(not board.turn), "syzygy win")
+        return Adjudication("1/2-1/2", "syzygy draw")
+
+    def _check_eval(self, board: chess.Board) -> Optional[Adjudication]:
+        if self.eval_mode == "off":
+            return None
+        score = material_eval(board) if self.eval_mode == "material" else engine_eval(board)
+        if score is None:
+            return None
+        if score >= self.win_cp:
+            self._winning = self._winning + 1 if self._winning > 0 else 1
+        elif score <= -self.win_cp:
+            self._winning = self._winning - 1 if self._winning < 0 else -1
+        else:
+            self._winning = 0
+        if abs(self._winning) >= self.win_plies:
+            return Adjudication(_winner(self._winning > 0),
+                                f"eval ({score:+d} cp for {abs(self._winning)} plies)")
+        if board.ply() >= self.draw_min_ply and abs(score) <= self.draw_cp:
+            self._drawish += 1
+            if self._drawish >= self.draw_plies:
+                return Adjudication("1/2-1/2", f"eval draw ({self._drawish} plies within {self.draw_cp} cp)")
+        else:
+            self._drawish = 0
+        return None
+
+
+def get_adjudication_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        reasons = dict(_stats)
+    return {
+        "enabled": ADJUDICATION_ENABLED,
+        "draw_claims": ADJUDICATE_DRAW_CLAIMS,
+        "eval": ADJUDICATION_EVAL,
+        "syzygy": bool(SYZYGY_PATH),
+        "games_adjudicated": sum(reasons.values()),
+        "reasons": reasons,
+    }
@@ -6,7 +6,7 @@ Migrado de tests_streamlit/src/analysis.py
 import chess
 import chess.pgn
 from typing import Dict, List, Any, Optional
-import numpy as np
+from statistics import fmean
 from io import StringIO
 from fastapi import APIRouter, HTTPException, Query, Body
 from fastapi.responses import JSONResponse
@@ -97,8 +97,8 @@ class GameAnalyzer:
             'model1_wins': model1_wins,
             'model2_wins': model2_wins,
             'draws': draws,
-            'model1_accuracy': np.mean(model1_accuracies) if model1_accuracies else 0,
-            'model2_accuracy': np.mean(model2_accuracies) if model2_accuracies else 0,
+            'model1_accuracy': fmean(model1_accuracies) if model1_accuracies else 0,
+            'model2_accuracy': fmean(model2_accuracies) if model2_accuracies else 0,
             'performance_over_time': performance_over_time
         }
 
@@ -155,7 +155,7 @@ class GameAnalyzer:
                 'elo': round(ratings[model]),
                 'games_played': games_played[model],
                 'win_rate': win_rate,
-                'avg_accuracy': np.mean(accuracies) if accuracies else 0
+                'avg_accuracy': fmean(accuracies) if accuracies else 0
             }
         return result_data
 
@@ -184,7 +184,7 @@ class GameAnalyzer:
                     accuracies.append(analysis['white_accuracy'])
                 else:
                     accuracies.append(analysis['black_accuracy'])
-        avg_accuracy = np.mean(accuracies) if accuracies else 0
+        avg_accuracy = fmean(accuracies) if accuracies else 0
         recent_games = games[-20:] if len(games) >= 20 else games
         recent_accuracies = []
         for game_data in recent_games:
@@ -255,7 +255,7 @@ class GameAnalyzer:
             if stats['games_played'] >= 3:
                 win_rate = (stats['white_wins'] +
                             stats['black_wins']) / stats['games_played']
-                avg_accuracy = np.mean(
+                avg_accuracy = fmean(
                     stats['accuracies']) if stats['accuracies'] else 0
                 avg_game_length = stats['total_moves'] / stats['games_played']
                 result.append({
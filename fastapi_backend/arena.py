@@ -1,23 +1,42 @@
-from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, WebSocket
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 import os
 import asyncio
+import hmac
 import json
 import time
 import uuid
 from datetime import datetime
 import sqlite3
-import threading
 from enum import Enum
 from pathlib import Path
 from fastapi_backend.pgn_utils import parse_pgn
-from fastapi_backend.models_manager import ModelManager
-from fastapi_backend.analysis import GameAnalyzer
+from fastapi_backend.models_manager import get_model_manager
+from fastapi_backend.model_registry import get_model_registry
+from fastapi_backend.analysis import game_analyzer
 from fastapi_backend.lichess_api import LichessAPI
 from fastapi_backend.pgn_importer import PGNImporter
 from fastapi_backend.human_game_utils import HumanGameUtils
 from fastapi_backend.game_engine import GameEngine
+from fastapi_backend.scheduler import GameScheduler
+from fastapi_backend.rate_limiter import get_rate_limiter_stats
+from fastapi_backend.move_parser import get_parse_stats
+from fastapi_backend.adjudication import get_adjudication_stats
+from fastapi_backend.llm_streaming import get_stream_stats
+from fastapi_backend.hedging import get_hedge_policy
+from fastapi_backend.telemetry import get_move_telemetry, summarize_move_metrics
+from fastapi_backend.database import GameDatabase, bump_write_generation
+from fastapi_backend.checkpoint import CHECKPOINTS_ENABLED, get_checkpoint_store
+from fastapi_backend.ws_hub import WS_QUEUE_SIZE, get_ws_hub
+from fastapi_backend.live_stream import LIVE_STREAM_BUFFER, get_live_streams
+from fastapi_backend.state_backend import get_state_backend
+from fastapi_backend.job_queue import GAME_DISPATCH, JOB_LEASE_SECONDS, JOB_WORKER_TOKEN, get_job_queue
+from fastapi_backend.human_sessions import HumanSession, HumanSessionManager, IllegalMove
+from fastapi_backend.battle_registry import BattleRegistry, pack_moves, pack_san, unpack_moves
+from fastapi_backend.arena_engine import registry_stats
+from fastapi_backend.opening_book import BookNotAllowed, validate_opening
+import chess
 
 router = APIRouter(prefix="/api/arena", tags=["arena"])
 
@@ -29,6 +48,7 @@ class GameStatus(str, Enum):
     PLAYING = "playing"
     FINISHED = "finished"
     ERROR = "error"
+    CANCELLED = "cancelled"
 
 
 class BattleRequest(BaseModel):
@@ -36,10 +56,11 @@ class BattleRequest(BaseModel):
                              description="Modelo que jogará com as peças brancas")
     black_model: str = Field(...,
                              description="Modelo que jogará com as peças pretas")
-    opening: str = Field("1. e4", description="Abertura a ser usada")
+    opening: str = Field("1. e4", description="Abertura: linha PGN, linhas separadas por '|', "
+                         "suite:<nome> ou livro polyglot (book / book:<arquivo.bin> de OPENING_BOOK_DIR)")
     num_games: int = Field(1, ge=1, le=20, description="Número de partidas")
     realtime_speed: float = Field(
-        1.0, ge=0.1, le=10.0, description="Velocidade em segundos por lance")
+        1.0, ge=0.1, le=10.0, description="Mantido por compatibilidade; as partidas não esperam mais entre lances")
 
 
 class HumanGameRequest(BaseModel):
@@ -55,6 +76,36 @@ class MoveRequest(BaseModel):
     move: str = Field(..., description="Lance em notação algébrica")
 
 
+class JobLeaseRequest(BaseModel):
+    worker_id: str
+    lease_seconds: float = Field(JOB_LEASE_SECONDS, gt=0, le=3600)
+
+
+class JobHeartbeatRequest(JobLeaseRequest):
+    moves: Optional[List[str]] = None
+
+
+class JobResult(BaseModel):
+    white: str
+    black: str
+    result: str = Field(..., pattern=r"^(1-0|0-1|1/2-1/2|\*)$")
+    pgn: str
+    moves: int = Field(..., ge=0)
+    fen: str
+    san_moves: List[str] = []
+    uci_moves: Optional[List[str]] = None
+
+
+class JobCompleteRequest(BaseModel):
+    worker_id: str
+    result: JobResult
+
+
+class JobFailRequest(BaseModel):
+    worker_id: str
+    error: str
+
+
 class GameResponse(BaseModel):
     id: str
     status: GameStatus
@@ -138,16 +189,88 @@ class GameState:
         }
 
 
+
+class GameRecord:
+    """Resultado de uma partida da batalha; lances empacotados (2 bytes por lance)"""
+    __slots__ = ("game", "result", "moves", "fen", "stream_id", "error", "packed")
+
+    def __init__(self, game: int, result: str = None, moves: int = 0, fen: str = None,
+                 stream_id: str = None, error: str = None, packed=None):
+        self.game = game
+        self.result = result
+        self.moves = moves
+        self.fen = fen
+        self.stream_id = stream_id
+        self.error = error
+        self.packed = packed
+
+    @classmethod
+    def from_result(cls, game_num: int, game_result: Dict[str, Any], stream_id: str,
+                    san_moves: List[str] = None) -> "GameRecord":
+        packed = None
+        if san_moves:
+            try:
+                packed = pack_san(san_moves)
+            except ValueError as e:
+                print(f"Lances da partida {game_num} não puderam ser empacotados: {e}")
+        return cls(game_num, game_result.get("result"), game_result.get("moves", 0),
+                   game_result.get("fen"), stream_id, game_result.get("error"), packed)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GameRecord":
+        """Registro gravado em checkpoint/arquivo (lances em UCI)"""
+        packed = None
+        if data.get("uci"):
+            packed = pack_moves(chess.Move.from_uci(uci) for uci in data["uci"])
+        return cls(data.get("game"), data.get("result"), data.get("moves", 0), data.get("fen"),
+                   data.get("stream_id"), data.get("error"), packed)
+
+    def to_dict(self, config: "BattleRequest", with_moves: bool = False) -> Dict[str, Any]:
+        data = {
+            "game": self.game,
+            "white": config.white_model,
+            "black": config.black_model,
+            "result": self.result,
+            "moves": self.moves,
+            "fen": self.fen,
+            "opening": config.opening,
+            "stream_id": self.stream_id,
+        }
+        if self.error:
+            data["error"] = self.error
+        if with_moves and self.packed is not None:
+            data["uci"] = [move.uci() for move in unpack_moves(self.packed)]
+        return data
+
+
 class BattleState:
+    __slots__ = ("id", "config", "status", "current_game", "results", "created_at", "updated_at",
+                 "cancel_requested", "resume_moves")
+
     def __init__(self, battle_id: str, config: BattleRequest):
         self.id = battle_id
         self.config = config
         self.status = GameStatus.WAITING
         self.current_game = 0
-        self.games = []
-        self.results = []
+        self.results: List[GameRecord] = []
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
+        # Cancelamento pedido pelo usuário (distingue de um shutdown do servidor)
+        self.cancel_requested = False
+        # Lances (UCI) das partidas interrompidas, por número da partida
+        self.resume_moves: Dict[int, List[str]] = {}
+
+    def checkpoint_state(self) -> Dict[str, Any]:
+        return {
+            "config": self.config.model_dump(),
+            "results": [record.to_dict(self.config, with_moves=True) for record in self.results],
+            "created_at": self.created_at.isoformat(),
+        }
+
+    def archive_state(self) -> Dict[str, Any]:
+        """Estado final gravado em battle_archive (inclui os lances de cada partida)"""
+        return {**self.to_dict(), "results": [record.to_dict(self.config, with_moves=True)
+                                             for record in self.results]}
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -157,45 +280,126 @@ class BattleState:
             "black_model": self.config.black_model,
             "current_game": self.current_game,
             "total_games": self.config.num_games,
-            "results": self.results,
+            "results": [record.to_dict(self.config) for record in self.results],
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat()
         }
 
 
 # Armazenamento em memória
-active_games: Dict[str, GameState] = {}
-active_battles: Dict[str, BattleState] = {}
-connected_clients: List[WebSocket] = []
+# Batalhas concluídas são arquivadas no banco e saem da memória por TTL/LRU
+active_battles = BattleRegistry("battle", lambda battle: battle.archive_state())
+# Tasks asyncio das batalhas em andamento (permite cancelamento)
+battle_tasks: Dict[str, asyncio.Task] = {}
+
+# Com ARENA_STATE_BACKEND=sqlite, partidas e batalhas também ficam num
+# estado compartilhado para que qualquer worker responda por elas
+state_backend = get_state_backend()
+
 
-# Locks para thread safety
-games_lock = threading.Lock()
-battles_lock = threading.Lock()
+def share_battle(battle: BattleState):
+    if state_backend.shared:
+        state_backend.put("battles", battle.id, battle.to_dict())
+
+
+async def find_battle(battle_id: str) -> Optional[Dict[str, Any]]:
+    """Estado da batalha: neste worker, em outro ou já arquivada no banco"""
+    battle = active_battles.get(battle_id)
+    if battle:
+        return battle.to_dict()
+    # Leituras do SQLite fora do event loop
+    if state_backend.shared:
+        shared = await asyncio.to_thread(state_backend.get, "battles", battle_id)
+        if shared:
+            return shared
+    archived = await asyncio.to_thread(active_battles.archived_state, battle_id)
+    if archived:
+        # Sem os lances, como no status de uma batalha em memória
+        for result in archived["results"]:
+            result.pop("uci", None)
+    return archived
+
+
+def list_battles() -> List[Dict[str, Any]]:
+    battles = {battle.id: battle.to_dict() for battle in active_battles.values()}
+    if state_backend.shared:
+        for data in state_backend.list("battles"):
+            battles.setdefault(data["id"], data)
+    return list(battles.values())
+
+
+def handle_shared_event(channel: str, message: Dict[str, Any]):
+    """Eventos publicados por outros workers (ver state_backend.py)"""
+    if channel == "ws":
+        topic, data = message["topic"], message["data"]
+        get_ws_hub().publish(topic, data, message.get("coalesce_key"), relay=False)
+        if topic.startswith("game:") and data.get("type") in ("move", "end"):
+            # Mantém o ring buffer local para replay de quem conectar aqui
+            get_live_streams().mirror(topic[len("game:"):], data)
+    elif channel == "cancel":
+        task = battle_tasks.get(message["battle_id"])
+        battle = active_battles.get(message["battle_id"])
+        if task and battle:
+            battle.cancel_requested = True
+            task.cancel()
+
+
+async def start_shared_state():
+    """Liga o pub/sub entre workers (no startup do app)"""
+    if not state_backend.shared:
+        return
+    get_ws_hub().relay = lambda topic, data, coalesce_key: state_backend.publish(
+        "ws", {"topic": topic, "data": data, "coalesce_key": coalesce_key})
+    await state_backend.start(handle_shared_event)
 
 # --- WebSocket para atualizações em tempo real ---
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    connected_clients.append(websocket)
-    try:
-        while True:
-            # Manter conexão viva
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        connected_clients.remove(websocket)
+async def websocket_endpoint(websocket: WebSocket, topics: Optional[str] = None):
+    """
+    Atualizações em tempo real. ?topics=battle:<id>,game:<id> limita o que o
+    cliente recebe (sem topics, só os eventos do frontend antigo; "*" recebe
+    tudo); ver ws_hub.py para o protocolo.
+    """
+    await get_ws_hub().serve(websocket, filter(None, (topics or "").split(",")))
+
+
+@router.websocket("/ws/games/{stream_id}")
+async def live_game_websocket(websocket: WebSocket, stream_id: str, since: int = 0):
+    """
+    Lances de uma partida ao vivo como deltas numerados (ver live_stream.py).
+    stream_id é "<battle_id>:<número da partida>". Ao reconectar, ?since=<último
+    seq recebido> reenvia só o que faltou.
+    """
+    stream = get_live_streams().get(stream_id)
+
+    def replay(client):
+        if stream is None:
+            client.queue.put(json.dumps(
+                {"type": "error", "stream": stream_id, "error": "stream não encontrado"}))
+            return
+        for delta in stream.since(since):
+            client.queue.put(json.dumps({**delta, "topic": stream.topic}))
+
+    await get_ws_hub().serve(websocket, [f"game:{stream_id}"], on_connect=replay,
+                             queue_size=LIVE_STREAM_BUFFER + WS_QUEUE_SIZE)
+
+
+def update_topic(data: Dict[str, Any]) -> str:
+    for field, prefix in (("battle_id", "battle"), ("game_id", "game"), ("tournament_id", "tournament")):
+        if data.get(field):
+            return f"{prefix}:{data[field]}"
+    return "arena"
 
 
 async def broadcast_update(data: Dict[str, Any]):
-    """Envia atualizações para todos os clientes conectados"""
-    if connected_clients:
-        message = json.dumps(data)
-        for client in connected_clients.copy():
-            try:
-                await client.send_text(message)
-            except:
-                connected_clients.remove(client)
+    """Enfileira a atualização para os clientes que assinam o tópico dela"""
+    coalesce_key = None
+    if data.get("type") == "battle_update":
+        # Só o estado mais recente da batalha importa para quem ficou para trás
+        coalesce_key = f"battle_update:{data['battle_id']}"
+    get_ws_hub().publish(update_topic(data), data, coalesce_key)
 
 # --- Endpoints principais ---
 
@@ -216,6 +420,22 @@ async def get_active_models():
     return {"models": active_models}
 
 
+@router.get("/models/registry")
+async def get_model_registry_stats():
+    """Clientes LLM já construídos e pools HTTP compartilhados por provedor"""
+    return get_model_registry().stats()
+
+
+@router.post("/models/warm")
+async def warm_provider_connections(provider: str = Query(..., description="Provedor, ex.: OpenAI")):
+    """Abre a conexão com o provedor antes de uma batalha (evita o handshake no 1º lance)"""
+    seconds = await asyncio.to_thread(get_model_registry().warm, provider)
+    if seconds is None:
+        raise HTTPException(
+            status_code=404, detail=f"Nenhum pool HTTP para o provedor '{provider}'")
+    return {"provider": provider, "warmup_seconds": round(seconds, 4)}
+
+
 @router.post("/battle")
 async def start_battle(request: BattleRequest):
     """Inicia uma batalha entre dois modelos"""
@@ -239,15 +459,22 @@ async def start_battle(request: BattleRequest):
             detail=f"Modelo '{request.black_model}' não disponível"
         )
 
+    try:
+        validate_opening(request.opening)
+    except BookNotAllowed as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     # Criar nova batalha
     battle_id = str(uuid.uuid4())
     battle = BattleState(battle_id, request)
 
-    with battles_lock:
-        active_battles[battle_id] = battle
+    active_battles[battle_id] = battle
+    share_battle(battle)
 
     # Iniciar processamento em background
-    asyncio.create_task(process_battle(battle))
+    task = asyncio.create_task(process_battle(battle))
+    battle_tasks[battle_id] = task
+    task.add_done_callback(lambda _: battle_tasks.pop(battle_id, None))
 
     return {
         "battle_id": battle_id,
@@ -259,22 +486,37 @@ async def start_battle(request: BattleRequest):
 @router.get("/battle/{battle_id}/status")
 async def get_battle_status(battle_id: str):
     """Obtém o status de uma batalha específica"""
-    with battles_lock:
-        battle = active_battles.get(battle_id)
+    battle = await find_battle(battle_id)
 
     if not battle:
         raise HTTPException(status_code=404, detail="Batalha não encontrada")
 
-    return battle.to_dict()
+    return battle
+
+
+@router.post("/battle/{battle_id}/cancel")
+async def cancel_battle(battle_id: str):
+    """Cancela uma batalha em andamento, interrompendo o lance atual"""
+    task = battle_tasks.get(battle_id)
+    if not task:
+        shared = await find_battle(battle_id)
+        if shared and shared["status"] == GameStatus.PLAYING.value:
+            # Batalha rodando em outro worker: ele cancela ao receber o evento
+            state_backend.publish("cancel", {"battle_id": battle_id})
+            return {"success": True, "battle_id": battle_id, "status": GameStatus.CANCELLED}
+        raise HTTPException(
+            status_code=404, detail="Batalha não encontrada ou já finalizada")
+    battle = active_battles.get(battle_id)
+    if battle:
+        battle.cancel_requested = True
+    task.cancel()
+    return {"success": True, "battle_id": battle_id, "status": GameStatus.CANCELLED}
 
 
 @router.get("/battles/active")
 async def get_active_battles():
     """Lista todas as batalhas ativas"""
-    with battles_lock:
-        battles = [battle.to_dict() for battle in active_battles.values()]
-
-    return {"battles": battles}
+    return {"battles": list_battles()}
 
 
 @router.post("/games/human")
@@ -287,21 +529,7 @@ async def create_human_game(request: HumanGameRequest):
             detail=f"Modelo '{request.opponent_model}' não disponível"
         )
 
-    game_id = str(uuid.uuid4())
-
-    # Determinar quem é branco e preto
-    if request.player_color == "white":
-        white_player = "Human"
-        black_player = request.opponent_model
-    else:
-        white_player = request.opponent_model
-        black_player = "Human"
-
-    game = GameState(game_id, white_player, black_player)
-    game.status = GameStatus.PLAYING
-
-    with games_lock:
-        active_games[game_id] = game
+    game = await human_sessions.create(request.opponent_model, request.player_color)
 
     return {
         "success": True,
@@ -312,49 +540,39 @@ async def create_human_game(request: HumanGameRequest):
 
 @router.post("/games/{game_id}/move")
 async def make_human_move(game_id: str, request: MoveRequest):
-    """Processa um lance do jogador humano"""
+    """Valida e aplica o lance do jogador; a resposta do LLM chega por WebSocket"""
 
-    with games_lock:
-        game = active_games.get(game_id)
-
-    if not game:
+    try:
+        game = await human_sessions.move(game_id, request.move)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Partida não encontrada")
-
-    if game.status != GameStatus.PLAYING:
-        raise HTTPException(
-            status_code=400, detail="Partida não está em andamento")
-
-    # Aqui você validaria o lance com chess.js ou similar
-    # Por simplicidade, vamos aceitar qualquer lance
-
-    # Adicionar lance ao histórico
-    game.move_history.append(request.move)
-    game.updated_at = datetime.now()
-
-    # Simular mudança de turno
-    game.current_turn = "black" if game.current_turn == "white" else "white"
-
-    # Broadcast update
-    await broadcast_update({
-        "type": "move_made",
-        "game_id": game_id,
-        "move": request.move,
-        "game_state": game.to_dict()
-    })
+    except IllegalMove as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
         "success": True,
-        "move": request.move,
+        "move": game.san_moves[-1],
         "game_state": game.to_dict()
     }
 
 
+@router.get("/games/active")
+async def get_active_games():
+    """Lista todas as partidas ativas"""
+    return {"games": await human_sessions.list()}
+
+
+@router.get("/games/sessions/stats")
+async def get_human_session_stats():
+    """Sessões humano vs LLM em memória, memória aproximada e expirações"""
+    return human_sessions.stats()
+
+
 @router.get("/games/{game_id}")
 async def get_game_state(game_id: str):
     """Obtém o estado atual de uma partida"""
 
-    with games_lock:
-        game = active_games.get(game_id)
+    game = await human_sessions.get(game_id)
 
     if not game:
         raise HTTPException(status_code=404, detail="Partida não encontrada")
@@ -362,43 +580,24 @@ async def get_game_state(game_id: str):
     return game.to_dict()
 
 
-@router.get("/games/active")
-async def get_active_games():
-    """Lista todas as partidas ativas"""
-
-    with games_lock:
-        games = [game.to_dict() for game in active_games.values()]
-
-    return {"games": games}
-
-
 @router.delete("/games/{game_id}")
 async def end_game(game_id: str):
     """Finaliza uma partida"""
 
-    with games_lock:
-        if game_id in active_games:
-            game = active_games[game_id]
-            game.status = GameStatus.FINISHED
-            del active_games[game_id]
-
-            # Salvar no banco de dados
-            save_game_to_db(game)
-
-            return {"success": True, "message": "Partida finalizada"}
+    game = await human_sessions.end(game_id)
+    if not game:
+        raise HTTPException(status_code=404, detail="Partida não encontrada")
 
-    raise HTTPException(status_code=404, detail="Partida não encontrada")
+    return {"success": True, "message": "Partida finalizada", "game": game.to_dict()}
 
 
 @router.get("/stats")
 async def get_arena_stats():
     """Obtém estatísticas gerais da arena"""
 
-    with games_lock:
-        active_games_count = len(active_games)
+    active_games_count = len(await human_sessions.list())
 
-    with battles_lock:
-        active_battles_count = len(active_battles)
+    active_battles_count = len(list_battles())
 
     # Estatísticas do banco de dados
     try:
@@ -416,68 +615,386 @@ async def get_arena_stats():
         "model_performance": model_stats
     }
 
+
+@router.get("/scheduler")
+async def get_scheduler_stats():
+    """Fila e partidas em andamento no agendador, por provedor"""
+    return game_scheduler.stats()
+
+
+@router.get("/rate-limits")
+async def get_rate_limits():
+    """Taxa aprendida, 429 recebidos e espera acumulada por provedor"""
+    return {"providers": get_rate_limiter_stats()}
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Modo e acertos do cache de respostas dos LLMs"""
+    return game_engine.response_cache.stats()
+
+
+@router.get("/parse-stats")
+async def get_move_parse_stats():
+    """Falhas de parsing, tentativas extras e fallbacks por modelo"""
+    return {"models": get_parse_stats()}
+
+
+@router.get("/adjudication")
+async def get_adjudication_summary():
+    """Partidas encerradas por adjudicação, por motivo, e regras ativas"""
+    return get_adjudication_stats()
+
+
+@router.get("/streaming")
+async def get_streaming_stats():
+    """Tempo até o lance vs. tempo total das respostas em streaming, por modelo"""
+    return {"models": get_stream_stats()}
+
+
+@router.get("/hedging")
+async def get_hedging_stats():
+    """Histograma de latência por modelo, duplicatas disparadas e gasto extra"""
+    return get_hedge_policy().to_dict()
+
+
+@router.get("/ws/stats")
+async def get_websocket_stats():
+    """Clientes WebSocket, filas, descartes e coalescências"""
+    return get_ws_hub().stats()
+
+
+@router.get("/live")
+async def get_live_stream_stats():
+    """Partidas transmitidas ao vivo e deltas em buffer"""
+    return get_live_streams().stats()
+
+
+@router.get("/state")
+async def get_state_backend_stats():
+    """Backend de estado (memory/sqlite), worker atual e eventos trocados"""
+    return state_backend.stats()
+
+
+@router.get("/memory")
+async def get_memory_stats():
+    """Ocupação dos registros em memória (batalhas, torneios, sessões e streams)"""
+    return {
+        "battles": active_battles.stats(),
+        **registry_stats(),
+        "human_sessions": human_sessions.stats(),
+        "live_streams": get_live_streams().stats(),
+    }
+
+
+@router.get("/jobs/stats")
+async def get_job_stats():
+    """Fila de partidas distribuída: jobs por status e workers com lease ativo"""
+    return await asyncio.to_thread(get_job_queue().stats)
+
+
+def require_worker_token(x_worker_token: Optional[str] = Header(None)):
+    """Só workers com ARENA_WORKER_TOKEN mexem nos jobs"""
+    if not JOB_WORKER_TOKEN:
+        raise HTTPException(status_code=403, detail="ARENA_WORKER_TOKEN não configurado no coordenador")
+    if not hmac.compare_digest(x_worker_token or "", JOB_WORKER_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de worker inválido")
+
+
+@router.post("/jobs/lease", dependencies=[Depends(require_worker_token)])
+async def lease_job(request: JobLeaseRequest):
+    """Entrega o próximo job a um worker remoto (worker.py --coordinator)"""
+    job = await asyncio.to_thread(get_job_queue().lease, request.worker_id, request.lease_seconds)
+    return {"job": job}
+
+
+@router.post("/jobs/{job_id}/heartbeat", dependencies=[Depends(require_worker_token)])
+async def heartbeat_job(job_id: str, request: JobHeartbeatRequest):
+    ok = await asyncio.to_thread(get_job_queue().heartbeat, job_id, request.worker_id,
+                                 request.moves, request.lease_seconds)
+    return {"ok": ok}
+
+
+@router.post("/jobs/{job_id}/complete", dependencies=[Depends(require_worker_token)])
+async def complete_job(job_id: str, request: JobCompleteRequest):
+    ok = await asyncio.to_thread(get_job_queue().complete, job_id, request.worker_id,
+                                 request.result.model_dump(exclude_none=True))
+    return {"ok": ok}
+
+
+@router.post("/jobs/{job_id}/fail", dependencies=[Depends(require_worker_token)])
+async def fail_job(job_id: str, request: JobFailRequest):
+    ok = await asyncio.to_thread(get_job_queue().fail, job_id, request.worker_id, request.error)
+    return {"ok": ok}
+
+
+@router.get("/checkpoints")
+async def get_checkpoint_stats():
+    """Checkpoints gravados por tipo e status"""
+    return get_checkpoint_store().stats()
+
+
+@router.get("/move-metrics")
+async def get_move_metrics(model: Optional[str] = None, game_uid: Optional[str] = None,
+                           limit: int = Query(10000, ge=1, le=200000)):
+    """Latência (p50/p95/p99) e tokens por lance, por modelo, a partir de move_metrics"""
+    recorder = get_move_telemetry()
+    await asyncio.to_thread(recorder.flush)
+    rows = await asyncio.to_thread(
+        recorder._database().get_move_metrics, model, game_uid, limit)
+    return {"rows": len(rows), "models": summarize_move_metrics(rows), "recorder": recorder.stats()}
+
 # --- Funções auxiliares ---
 
 
 game_engine = GameEngine()
+game_scheduler = GameScheduler(game_engine.model_manager._get_provider)
+
+
+def archive_human_session(session: HumanSession):
+    """Grava na tabela games a partida humano vs LLM que sai da memória"""
+    GameDatabase().save_game({
+        "white": session.white_player,
+        "black": session.black_player,
+        "result": session.result or "*",
+        "pgn": session.pgn(),
+        "moves": len(session.moves),
+        "opening": "",
+        "date": session.created_at.isoformat(),
+        "analysis": {"termination": session.termination, "source": "human"},
+    })
+
+
+human_sessions = HumanSessionManager(
+    lambda board, model, last_move: game_engine.aget_ai_move(board, model, last_move=last_move),
+    on_update=broadcast_update,
+    archive=archive_human_session,
+    backend=state_backend)
+
+
+def checkpoint_battle(battle: BattleState, status: str = GameStatus.PLAYING.value):
+    if not CHECKPOINTS_ENABLED:
+        return
+    try:
+        get_checkpoint_store().enqueue("battle", battle.id, battle.checkpoint_state(), status)
+    except Exception as e:
+        print(f"Erro ao gravar checkpoint da batalha {battle.id}: {e}")
+
+
+def checkpoint_battle_game(battle: BattleState, game_num: int, board, status: str = GameStatus.PLAYING.value):
+    if not CHECKPOINTS_ENABLED:
+        return
+    state = {
+        "game": game_num,
+        "white": battle.config.white_model,
+        "black": battle.config.black_model,
+        "moves": [move.uci() for move in board.move_stack] if board is not None else [],
+    }
+    try:
+        get_checkpoint_store().enqueue("battle_game", f"{battle.id}:{game_num}", state, status,
+                                       parent_id=battle.id)
+    except Exception as e:
+        print(f"Erro ao gravar checkpoint da partida {battle.id}:{game_num}: {e}")
 
 
 async def process_battle(battle: BattleState):
     """Processa uma batalha em background usando a engine real"""
     battle.status = GameStatus.PLAYING
+    checkpoint_battle(battle)
+    share_battle(battle)
+    done = {record.game for record in battle.results}
     try:
-        for game_num in range(battle.config.num_games):
-            battle.current_game = game_num + 1
-            # Rodar partida real usando GameEngine
-            game_result = await simulate_game(
-                battle.config.white_model,
-                battle.config.black_model,
-                battle.config.opening,
-                battle.config.realtime_speed
-            )
-            battle.results.append(game_result)
-            battle.updated_at = datetime.now()
-            # Broadcast update
-            await broadcast_update({
-                "type": "battle_update",
-                "battle_id": battle.id,
-                "battle_state": battle.to_dict(),
-                "current_board": game_result.get("fen"),
-                "current_moves": game_result.get("move_history"),
-            })
-            await asyncio.sleep(1)
+        # Todas as partidas entram no agendador de uma vez; ele limita a
+        # concorrência por provedor e no total
+        await asyncio.gather(*[
+            play_battle_game(battle, game_num)
+            for game_num in range(1, battle.config.num_games + 1)
+            if game_num not in done
+        ])
         battle.status = GameStatus.FINISHED
+        checkpoint_battle(battle, GameStatus.FINISHED.value)
+        share_battle(battle)
         await broadcast_update({
             "type": "battle_finished",
             "battle_id": battle.id,
             "battle_state": battle.to_dict()
         })
+    except asyncio.CancelledError:
+        battle.status = GameStatus.CANCELLED
+        battle.updated_at = datetime.now()
+        # Num shutdown/reload o checkpoint continua "playing" e a batalha é retomada
+        if battle.cancel_requested:
+            checkpoint_battle(battle, GameStatus.CANCELLED.value)
+            if GAME_DISPATCH == "queue":
+                # Workers abandonam a partida no próximo heartbeat
+                await asyncio.to_thread(get_job_queue().cancel_batch, battle.id)
+        share_battle(battle)
+        await broadcast_update({
+            "type": "battle_error",
+            "battle_id": battle.id,
+            "error": "cancelled"
+        })
+        raise
     except Exception as e:
         battle.status = GameStatus.ERROR
+        checkpoint_battle(battle, GameStatus.ERROR.value)
+        share_battle(battle)
         await broadcast_update({
             "type": "battle_error",
             "battle_id": battle.id,
             "error": str(e)
         })
+    finally:
+        # Grava o arquivo numa thread; shield: um segundo cancelamento não o interrompe
+        await asyncio.shield(asyncio.to_thread(active_battles.finish, battle.id))
+
+
+def publish_battle_move(battle: BattleState, game_num: int, stream, board, san: str):
+    """Checkpoint do lance e delta para quem acompanha a partida ao vivo"""
+    checkpoint_battle_game(battle, game_num, board)
+    hub = get_ws_hub()
+    for delta in stream.push(board, san):
+        hub.publish(stream.topic, delta)
 
 
-async def simulate_game(white_model: str, black_model: str, opening: str, speed: float):
+async def play_battle_game(battle: BattleState, game_num: int):
+    """Roda uma partida da batalha via agendador e publica o resultado"""
+    stream = get_live_streams().open(f"{battle.id}:{game_num}",
+                                     battle.config.white_model, battle.config.black_model)
+    try:
+        if GAME_DISPATCH == "queue":
+            game_result = await run_queued_game(battle, game_num, stream)
+        else:
+            game_result = await game_scheduler.run(
+                battle.config.white_model,
+                battle.config.black_model,
+                lambda: simulate_game(
+                    battle.config.white_model,
+                    battle.config.black_model,
+                    battle.config.opening,
+                    battle.config.realtime_speed,
+                    initial_moves=battle.resume_moves.get(game_num),
+                    game_num=game_num,
+                    on_move=lambda board, san: publish_battle_move(
+                        battle, game_num, stream, board, san)
+                )
+            )
+    except Exception as e:
+        game_result = {"error": str(e)}
+    get_ws_hub().publish(stream.topic, stream.finish(game_result.get("result", "*")))
+    # Lances vão só na atualização desta partida, não no estado da batalha
+    current_moves = game_result.pop("move_history", None)
+    # As partidas terminam fora de ordem; os resultados ficam na ordem das partidas
+    index = next((i for i, record in enumerate(battle.results) if record.game > game_num),
+                 len(battle.results))
+    battle.results.insert(index, GameRecord.from_result(game_num, game_result, stream.id, current_moves))
+    battle.current_game = len(battle.results)
+    battle.updated_at = datetime.now()
+    checkpoint_battle_game(battle, game_num, None, GameStatus.FINISHED.value)
+    checkpoint_battle(battle)
+    share_battle(battle)
+    # Broadcast update
+    await broadcast_update({
+        "type": "battle_update",
+        "battle_id": battle.id,
+        "battle_state": battle.to_dict(),
+        "current_board": game_result.get("fen"),
+        "current_moves": current_moves,
+    })
+
+
+async def simulate_game(white_model: str, black_model: str, opening: str, speed: float,
+                        initial_moves: List[str] = None, on_move=None, game_num: int = 1):
     """Executa uma partida real entre dois modelos usando GameEngine"""
-    # Chama a engine real (sincronamente, pois não há await)
-    result = game_engine.play_game(white_model, black_model, opening)
-    # Adiciona delay para simular tempo real
-    await asyncio.sleep(speed)
+    # Loop assíncrono: os lances aguardam o LLM sem bloquear o event loop.
+    # Sem delay artificial: a partida termina assim que os modelos respondem
+    result = await game_engine.aplay_game(white_model, black_model, opening,
+                                          initial_moves=initial_moves, on_move=on_move,
+                                          game_num=game_num)
     return {
         "white": white_model,
         "black": black_model,
         "result": result["result"],
         "moves": result["moves"],
         "fen": result["fen"],
-        "move_history": result["pgn"].split(),
+        "move_history": result["san_moves"],
         "opening": opening
     }
 
 
+async def run_queued_game(battle: BattleState, game_num: int, stream):
+    """
+    Partida jogada por um worker.py (ARENA_GAME_DISPATCH=queue). Os lances
+    que o worker registra no heartbeat seguem para checkpoint e transmissão
+    ao vivo como se a partida rodasse aqui.
+    """
+    queue = get_job_queue()
+    job_id = f"battle:{battle.id}:{game_num}"
+    await asyncio.to_thread(queue.enqueue, job_id, battle.id, battle.config.white_model,
+                            battle.config.black_model, battle.config.opening, game_num,
+                            battle.resume_moves.get(game_num))
+    board = chess.Board()
+
+    def on_progress(moves: List[str]):
+        for uci in moves[len(board.move_stack):-1]:
+            board.push_uci(uci)
+        move = chess.Move.from_uci(moves[-1])
+        san = board.san(move)
+        board.push(move)
+        publish_battle_move(battle, game_num, stream, board, san)
+
+    result = await queue.wait(job_id, on_progress)
+    return {
+        "white": result["white"],
+        "black": result["black"],
+        "result": result["result"],
+        "moves": result["moves"],
+        "fen": result["fen"],
+        "move_history": result["san_moves"],
+        "opening": battle.config.opening
+    }
+
+
+def resume_battles() -> int:
+    """
+    Retoma as batalhas com checkpoint "playing" (servidor reiniciado no meio).
+    Partidas já concluídas são mantidas; as interrompidas continuam do último ply.
+    Chamar com o event loop rodando (startup do FastAPI).
+    """
+    if not CHECKPOINTS_ENABLED:
+        return 0
+    store = get_checkpoint_store()
+    resumed = 0
+    for checkpoint in store.unfinished("battle"):
+        battle_id = checkpoint["id"]
+        if battle_id in battle_tasks:
+            continue
+        state = checkpoint["state"]
+        try:
+            config = BattleRequest(**state["config"])
+        except Exception as e:
+            print(f"Checkpoint de batalha inválido ({battle_id}): {e}")
+            store.set_status("battle", battle_id, GameStatus.ERROR.value)
+            continue
+        battle = BattleState(battle_id, config)
+        battle.results = [GameRecord.from_dict(result) for result in state.get("results", [])]
+        battle.current_game = len(battle.results)
+        battle.created_at = datetime.fromisoformat(state["created_at"])
+        for game in store.children("battle_game", battle_id):
+            if game["status"] == GameStatus.PLAYING.value and game["state"]["moves"]:
+                battle.resume_moves[game["state"]["game"]] = game["state"]["moves"]
+        active_battles[battle_id] = battle
+        task = asyncio.create_task(process_battle(battle))
+        battle_tasks[battle_id] = task
+        task.add_done_callback(
+            lambda _, battle_id=battle_id: battle_tasks.pop(battle_id, None))
+        resumed += 1
+        print(f"Batalha {battle_id} retomada ({config.white_model} vs {config.black_model}, "
+              f"{len(battle.results)}/{config.num_games} partidas, "
+              f"{len(battle.resume_moves)} em andamento)")
+    return resumed
+
+
 def save_game_to_db(game: GameState):
     """Salva uma partida no banco de dados"""
 
@@ -521,6 +1038,7 @@ def save_game_to_db(game: GameState):
             ))
 
             conn.commit()
+        bump_write_generation()
 
     except Exception as e:
         print(f"Erro ao salvar partida no banco: {e}")
@@ -589,13 +1107,10 @@ def get_model_stats_from_db() -> Dict[str, Dict[str, int]]:
 async def clear_all_data():
     """Limpa todos os dados em memória (apenas para desenvolvimento)"""
 
-    global active_games, active_battles
-
-    with games_lock:
-        active_games.clear()
+    human_sessions.clear()
+    active_battles.clear()
 
-    with battles_lock:
-        active_battles.clear()
+    state_backend.clear("battles")
 
     return {"message": "Todos os dados em memória foram limpos"}
 
@@ -666,18 +1181,27 @@ async def get_pgn_for_game(matchup: str, game_file: str):
 async def get_status(battle_id: Optional[str] = None):
     """Obtém o status de uma batalha, conforme o parâmetro passado."""
     if battle_id:
-        with battles_lock:
-            battle = active_battles.get(battle_id)
+        battle = await find_battle(battle_id)
         if not battle:
             raise HTTPException(
                 status_code=404, detail="Batalha não encontrada")
-        return battle.to_dict()
+        return battle
     else:
         raise HTTPException(
             status_code=400, detail="É necessário informar battle_id")
 
-model_manager = ModelManager()
-game_analyzer = GameAnalyzer()
+model_manager = get_model_manager()
 lichess_api = LichessAPI()
 pgn_importer = PGNImporter()
 human_game_utils = HumanGameUtils()
+
+# Modelos do provedor falso (FAKE_MODELS) entram na lista da arena para testes de carga
+for _name in model_manager.list_models():
+    if model_manager._get_provider(_name) == "Fake":
+        AVAILABLE_MODELS.setdefault(_name, {
+            "active": True,
+            "rating": 1200,
+            "provider": "fake",
+            "model_id": _name,
+            "description": "Modelo falso local (sem rede), para testes de carga"
+        })
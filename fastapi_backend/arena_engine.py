@@ -1,18 +1,35 @@
 import chess
-import chess.pgn
 import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import sqlite3
 import json
 import os
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi_backend.database import GameDatabase, bump_write_generation
+from fastapi_backend.pgn_builder import PgnBuilder
+from fastapi_backend.checkpoint import (
+    CANCELLED, CHECKPOINTS_ENABLED, FINISHED, PLAYING, get_checkpoint_store)
+from fastapi_backend.state_backend import get_state_backend
+from fastapi_backend.job_queue import GAME_DISPATCH, JobFailed, get_job_queue
+from fastapi_backend.battle_registry import BattleRegistry
+from fastapi_backend.opening_book import book_plies, opening_moves
+from fastapi_backend.ws_hub import get_ws_hub
 
 DB_PATH = os.path.abspath(os.path.join(
     os.path.dirname(__file__), '..', 'chess_arena.db'))
 
+# Batalhas simultâneas de um torneio e partidas simultâneas por modelo
+TOURNAMENT_MAX_WORKERS = int(os.getenv("TOURNAMENT_MAX_WORKERS", "4"))
+TOURNAMENT_MAX_GAMES_PER_MODEL = int(
+    os.getenv("TOURNAMENT_MAX_GAMES_PER_MODEL", "1"))
+
 
 def save_game_to_db(game_data):
+    # Garante o schema (inclusive a coluna tournament_id) antes do INSERT
+    GameDatabase(DB_PATH)
     with sqlite3.connect(DB_PATH) as conn:
         cursor = conn.cursor()
         cursor.execute("""
@@ -30,18 +47,51 @@ def save_game_to_db(game_data):
             json.dumps(game_data.get('analysis', {}))
         ))
         conn.commit()
+    bump_write_generation()
+
+
+
 
+# Batalhas e torneios em memória; os concluídos vão para battle_archive e
+# saem da memória por TTL/LRU (ver battle_registry.py)
+_battles = BattleRegistry("arena_battle", lambda battle: _battle_status(battle), db_path=lambda: DB_PATH)
+_tournaments = BattleRegistry("tournament", lambda tournament: _tournament_status(tournament),
+                              db_path=lambda: DB_PATH)
 
-# Estado em memória para batalhas e torneios
-_battles = {}
-_battles_lock = threading.Lock()
-_tournaments = {}
-_tournaments_lock = threading.Lock()
+
+def _checkpoint(kind, key, state, status=PLAYING, parent_id=None):
+    if not CHECKPOINTS_ENABLED:
+        return
+    try:
+        get_checkpoint_store().save(kind, key, state, status, parent_id)
+    except Exception as e:
+        print(f"Erro ao gravar checkpoint {kind} {key}: {e}")
+
+
+def _share(namespace, key, build_status):
+    """
+    Publica o status no estado compartilhado para os outros workers.
+    build_status só é chamado com backend compartilhado (monta o PGN parcial).
+    """
+    backend = get_state_backend()
+    if not backend.shared:
+        return
+    try:
+        backend.put(namespace, key, build_status())
+    except Exception as e:
+        print(f"Erro ao compartilhar estado {namespace} {key}: {e}")
 
 
 class ArenaBattle:
-    def __init__(self, white, black, opening, num_games, realtime_speed, tournament_id=None):
-        self.id = str(uuid.uuid4())
+    __slots__ = ("id", "white", "black", "opening", "num_games", "realtime_speed", "current_game",
+                 "total_games", "results", "status", "thread", "_stop", "last_board_fen",
+                 "_pgn_builder", "tournament_id", "error", "done", "on_finished", "dispatch",
+                 "_resume_moves")
+
+    def __init__(self, white, black, opening, num_games, realtime_speed, tournament_id=None,
+                 autostart=True, on_finished=None, battle_id=None, resume_state=None,
+                 dispatch=GAME_DISPATCH):
+        self.id = battle_id or str(uuid.uuid4())
         self.white = white
         self.black = black
         self.opening = opening
@@ -54,67 +104,193 @@ class ArenaBattle:
         self.thread = threading.Thread(target=self.run_battle)
         self.thread.daemon = True
         self._stop = False
-        self.pgns = []
         self.last_board_fen = None
-        self.last_pgn = None
+        # PGN da partida em andamento, montado sob demanda (ver last_pgn)
+        self._pgn_builder = None
         self.tournament_id = tournament_id
-        self.thread.start()
+        self.error = None
+        # Sinalizado quando a batalha termina (normalmente, parada ou com erro)
+        self.done = threading.Event()
+        self.on_finished = on_finished
+        # "local": partidas simuladas nesta thread; "queue": jogadas por worker.py
+        self.dispatch = dispatch
+        # Lances (UCI) da partida interrompida, vindos do checkpoint
+        self._resume_moves = []
+        if resume_state:
+            self.results = resume_state.get("results", [])
+            self.current_game = len(self.results)
+            self._resume_moves = resume_state.get("moves", [])
+        if autostart:
+            self.thread.start()
+
+    def checkpoint(self, board=None, status=PLAYING):
+        state = {
+            "white": self.white,
+            "black": self.black,
+            "opening": self.opening,
+            "num_games": self.num_games,
+            "realtime_speed": self.realtime_speed,
+            "results": self.results,
+            "moves": [move.uci() for move in board.move_stack] if board is not None else [],
+            "dispatch": self.dispatch,
+        }
+        _checkpoint("arena_battle", self.id, state, status, self.tournament_id)
+        _share("arena_battles", self.id, lambda: _battle_status(self))
 
     def run_battle(self):
-        for game_num in range(1, self.num_games + 1):
+        try:
+            self._play_games()
+        except Exception as e:
+            print(f"Erro na batalha {self.white} vs {self.black}: {e}")
+            self.error = str(e)
+            self.status = "error"
+        finally:
+            self.checkpoint(status={"finished": FINISHED, "stopped": CANCELLED}.get(
+                self.status, self.status))
+            self.done.set()
+            _battles.finish(self.id)
+            if self.on_finished:
+                self.on_finished(self)
+
+    def _play_games(self):
+        self.checkpoint()
+        if self.dispatch == "queue":
+            self._play_queued()
+        else:
+            self._play_simulated()
+        if self.status != "stopped":
+            self.status = "finished"
+
+    def _play_simulated(self):
+        for game_num in range(len(self.results) + 1, self.num_games + 1):
             if self._stop:
                 self.status = "stopped"
                 break
             board = chess.Board()
-            game = chess.pgn.Game()
-            node = game
-            game.headers["White"] = self.white
-            game.headers["Black"] = self.black
-            game.headers["Date"] = datetime.now().strftime("%Y.%m.%d")
-            game.headers["Event"] = "LLM Chess Arena"
-            # Abertura
-            try:
-                move = board.parse_san(self.opening.split()[-1])
-                board.push(move)
-                node = node.add_variation(move)
-            except Exception:
-                pass
+            builder = self._new_pgn_builder()
             move_count = 0
+            book = opening_moves(self.opening, game_num)
+            if book:
+                builder.set_header("Opening", chess.Board().variation_san(book))
+            if self._resume_moves:
+                # Retomada: reaplica os lances do checkpoint (abertura inclusa)
+                for uci in self._resume_moves:
+                    move = chess.Move.from_uci(uci)
+                    builder.push(board, move)
+                    board.push(move)
+                move_count = len(self._resume_moves) - book_plies(book, self._resume_moves)
+                self._resume_moves = []
+                self.last_board_fen = board.fen()
+            else:
+                # Lances de livro, jogados de uma vez (ver opening_book.py)
+                for move in book:
+                    builder.push(board, move)
+                    board.push(move)
             while not board.is_game_over() and move_count < 60:
                 # Simulação: alterna lances aleatórios
                 legal_moves = list(board.legal_moves)
                 if not legal_moves:
                     break
                 move = legal_moves[move_count % len(legal_moves)]
+                builder.push(board, move)
                 board.push(move)
-                node = node.add_variation(move)
                 move_count += 1
-                self.last_board_fen = board.fen()
-                self.last_pgn = str(game)
+                self._publish_move(game_num, board)
                 time.sleep(self.realtime_speed)
             result = board.result()
-            game.headers["Result"] = result
-            self.results.append({
-                "game": game_num,
-                "white": self.white,
-                "black": self.black,
-                "result": result
-            })
-            self.pgns.append(str(game))
-            self.current_game = game_num
-            # Salvar no banco
+            builder.set_header("Result", result)
+            self._record_game(game_num, result, builder.pgn(), move_count)
+
+    def _play_queued(self):
+        """
+        ARENA_GAME_DISPATCH=queue: as partidas vão todas para a fila de uma vez
+        e são jogadas (com LLM, via GameEngine) por processos worker.py; aqui
+        só acompanhamos o progresso e gravamos os resultados em ordem.
+        """
+        queue = get_job_queue()
+        first = len(self.results) + 1
+        for game_num in range(first, self.num_games + 1):
+            queue.enqueue(f"arena:{self.id}:{game_num}", self.id, self.white, self.black,
+                          self.opening, game_num, self._resume_moves if game_num == first else None)
+        self._resume_moves = []
+        for game_num in range(first, self.num_games + 1):
+            board = chess.Board()
+            builder = self._new_pgn_builder()
+
+            def on_progress(moves, board=board, builder=builder, game_num=game_num):
+                for uci in moves[len(board.move_stack):]:
+                    move = chess.Move.from_uci(uci)
+                    builder.push(board, move)
+                    board.push(move)
+                self._publish_move(game_num, board)
+
+            try:
+                result = queue.wait_blocking(f"arena:{self.id}:{game_num}", on_progress,
+                                             should_stop=lambda: self._stop)
+            except JobFailed as e:
+                # Partida perdida (workers falharam JOB_MAX_ATTEMPTS vezes): segue a batalha
+                print(f"Partida {game_num} de {self.white} vs {self.black} falhou na fila: {e}")
+                self.results.append({"game": game_num, "white": self.white, "black": self.black,
+                                     "result": "*", "error": str(e)})
+                self.checkpoint()
+                continue
+            if result is None:
+                queue.cancel_batch(self.id)
+                self.status = "stopped"
+                break
+            self._record_game(game_num, result["result"], result["pgn"], result["moves"])
+
+    def _new_pgn_builder(self):
+        self._pgn_builder = PgnBuilder({
+            "White": self.white,
+            "Black": self.black,
+            "Date": datetime.now().strftime("%Y.%m.%d"),
+            "Event": "LLM Chess Arena",
+        })
+        return self._pgn_builder
+
+    def _publish_move(self, game_num, board):
+        self.last_board_fen = board.fen()
+        self.checkpoint(board)
+        # Estado mais recente por batalha: clientes lentos recebem só o último
+        get_ws_hub().publish_threadsafe(f"battle:{self.id}", {
+            "type": "arena_battle_move",
+            "battle_id": self.id,
+            "game": game_num,
+            "ply": board.ply(),
+            "fen": self.last_board_fen,
+            "status": self.status,
+        }, coalesce_key=f"arena_battle_move:{self.id}")
+
+    def _record_game(self, game_num, result, pgn, move_count):
+        self.results.append({
+            "game": game_num,
+            "white": self.white,
+            "black": self.black,
+            "result": result
+        })
+        self.current_game = game_num
+        # Salvar no banco (falha ao gravar não derruba a batalha)
+        try:
             save_game_to_db({
                 'white': self.white,
                 'black': self.black,
                 'result': result,
-                'pgn': str(game),
+                'pgn': pgn,
                 'moves': move_count,
                 'opening': self.opening,
                 'date': datetime.now().isoformat(),
                 'tournament_id': self.tournament_id,
                 'analysis': {}
             })
-        self.status = "finished"
+        except Exception as e:
+            print(f"Erro ao salvar partida {self.white} vs {self.black}: {e}")
+        self.checkpoint()
+
+    @property
+    def last_pgn(self):
+        builder = self._pgn_builder
+        return builder.pgn() if builder else None
 
     def stop(self):
         self._stop = True
@@ -122,55 +298,202 @@ class ArenaBattle:
 # Torneio todos-vs-todos
 
 
+def round_robin_pairings(models: List[str], double_round_robin: bool = False) -> List[Tuple[str, str]]:
+    """
+    Confrontos (brancas, pretas) em rodadas pelo método do círculo, para que
+    confrontos vizinhos na lista envolvam modelos diferentes e possam rodar
+    juntos. No turno único as cores seguem (i + j) % 2, equilibrando brancas
+    e pretas de cada modelo; no turno duplo cada par joga com as duas cores.
+    """
+    index = {model: i for i, model in enumerate(models)}
+    players = list(models) + ([None] if len(models) % 2 else [])
+    n = len(players)
+    pairings = []
+    for _ in range(n - 1):
+        for k in range(n // 2):
+            a, b = players[k], players[n - 1 - k]
+            if a is None or b is None:
+                continue
+            i, j = sorted((index[a], index[b]))
+            low, high = models[i], models[j]
+            pairings.append((low, high) if (i + j) %
+                            2 == 0 else (high, low))
+        # Gira todos menos o primeiro
+        players = [players[0]] + [players[-1]] + players[1:-1]
+    if double_round_robin:
+        pairings += [(black, white) for white, black in pairings]
+    return pairings
+
+
 class ArenaTournament:
-    def __init__(self, models, games_per_pair):
-        self.id = str(uuid.uuid4())
+    def __init__(self, models, games_per_pair, double_round_robin=True, opening="1. e4",
+                 realtime_speed=0.1, max_workers=TOURNAMENT_MAX_WORKERS,
+                 per_model_limit=TOURNAMENT_MAX_GAMES_PER_MODEL, autostart=True,
+                 tournament_id=None, resume_state=None, dispatch=GAME_DISPATCH):
+        self.id = tournament_id or str(uuid.uuid4())
         self.models = models
         self.games_per_pair = games_per_pair
+        self.double_round_robin = double_round_robin
+        self.opening = opening
+        self.realtime_speed = realtime_speed
+        self.max_workers = max(1, max_workers)
+        self.per_model_limit = max(1, per_model_limit)
+        # Com "queue" as batalhas só acompanham jobs; as partidas rodam em worker.py
+        self.dispatch = dispatch
         self.status = "playing"
+        self.pending = round_robin_pairings(models, double_round_robin)
         self.current_match = 0
-        self.total_matches = len(models) * (len(models) - 1)
+        self.total_matches = len(self.pending)
         self.results = []
-        self.battles = []
+        self.running: Dict[str, ArenaBattle] = {}
+        self.busy: Dict[str, int] = {model: 0 for model in models}
+        self.completed: List[Tuple[str, str]] = []
+        # Batalhas interrompidas por um restart, retomadas do checkpoint
+        self._resume_battles: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        if resume_state:
+            self._resume(resume_state)
+        self.started_at = None
+        self.finished_at = None
+        # Despachante acordado a cada batalha concluída (sem polling)
+        self._cond = threading.Condition()
         self.thread = threading.Thread(target=self.run_tournament)
         self.thread.daemon = True
         self._stop = False
-        self.thread.start()
+        if autostart:
+            self.thread.start()
+
+    def _resume(self, state: Dict[str, Any]):
+        for white, black in state.get("completed", []):
+            if (white, black) in self.pending:
+                self.pending.remove((white, black))
+                self.completed.append((white, black))
+        self.results = state.get("results", [])
+        self.current_match = len(self.completed)
+        if CHECKPOINTS_ENABLED:
+            for battle in get_checkpoint_store().children("arena_battle", self.id):
+                if battle["status"] == PLAYING:
+                    pairing = (battle["state"]["white"], battle["state"]["black"])
+                    self._resume_battles[pairing] = battle
+        # Batalhas interrompidas voltam primeiro
+        self.pending.sort(key=lambda pairing: pairing not in self._resume_battles)
+
+    def checkpoint(self, status=PLAYING):
+        state = {
+            "models": self.models,
+            "games_per_pair": self.games_per_pair,
+            "double_round_robin": self.double_round_robin,
+            "opening": self.opening,
+            "realtime_speed": self.realtime_speed,
+            "max_workers": self.max_workers,
+            "per_model_limit": self.per_model_limit,
+            "dispatch": self.dispatch,
+            "completed": self.completed,
+            "results": self.results,
+        }
+        _checkpoint("arena_tournament", self.id, state, status)
+        _share("tournaments", self.id, lambda: _tournament_status(self))
+
+    def _next_pairing(self) -> Optional[Tuple[str, str]]:
+        """Primeiro confronto pendente cujos dois modelos têm vaga"""
+        for pairing in self.pending:
+            white, black = pairing
+            if self.busy[white] < self.per_model_limit and self.busy[black] < self.per_model_limit:
+                return pairing
+        return None
 
     def run_tournament(self):
-        matchups = [(w, b) for i, w in enumerate(self.models)
-                    for j, b in enumerate(self.models) if i != j]
-        for idx, (white, black) in enumerate(matchups, 1):
-            if self._stop:
-                self.status = "stopped"
-                break
-            battle = ArenaBattle(white, black, "1. e4",
-                                 self.games_per_pair, 0.1, tournament_id=self.id)
-            self.battles.append(battle)
-            while battle.status != "finished":
-                time.sleep(0.5)
+        self.started_at = time.time()
+        self.checkpoint()
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix=f"tournament-{self.id[:8]}") as pool:
+            with self._cond:
+                while self.pending and not self._stop:
+                    pairing = None
+                    if len(self.running) < self.max_workers:
+                        pairing = self._next_pairing()
+                    if pairing is None:
+                        self._cond.wait()
+                        continue
+                    self.pending.remove(pairing)
+                    self._launch(pool, *pairing)
+                while self.running:
+                    self._cond.wait()
+        self.finished_at = time.time()
+        self.status = "stopped" if self._stop else "finished"
+        self.checkpoint(CANCELLED if self._stop else FINISHED)
+        _tournaments.finish(self.id)
+
+    def _launch(self, pool: ThreadPoolExecutor, white: str, black: str):
+        resume = self._resume_battles.pop((white, black), None)
+        battle = ArenaBattle(white, black, self.opening, self.games_per_pair, self.realtime_speed,
+                             tournament_id=self.id, autostart=False, on_finished=self._battle_finished,
+                             battle_id=resume["id"] if resume else None,
+                             resume_state=resume["state"] if resume else None, dispatch=self.dispatch)
+        self.running[battle.id] = battle
+        self.busy[white] += 1
+        self.busy[black] += 1
+        pool.submit(battle.run_battle)
+
+    def _battle_finished(self, battle: ArenaBattle):
+        with self._cond:
+            self.running.pop(battle.id, None)
+            self.busy[battle.white] -= 1
+            self.busy[battle.black] -= 1
             self.results.extend(battle.results)
-            self.current_match = idx
-        self.status = "finished"
+            self.current_match += 1
+            if battle.status != "stopped":
+                self.completed.append((battle.white, battle.black))
+                self.checkpoint()
+            self._cond.notify_all()
+        get_ws_hub().publish_threadsafe(f"tournament:{self.id}", {
+            "type": "tournament_update",
+            "tournament_id": self.id,
+            "current_match": self.current_match,
+            "total_matches": self.total_matches,
+            "finished_pairing": [battle.white, battle.black],
+            "standings": self.standings(),
+        })
+
+    def standings(self) -> List[Dict[str, Any]]:
+        table = {model: {"model": model, "points": 0.0, "wins": 0, "draws": 0, "losses": 0,
+                         "white_games": 0, "black_games": 0} for model in self.models}
+        for result in list(self.results):
+            white, black = table[result["white"]], table[result["black"]]
+            white["white_games"] += 1
+            black["black_games"] += 1
+            if result["result"] == "1-0":
+                white["points"] += 1
+                white["wins"] += 1
+                black["losses"] += 1
+            elif result["result"] == "0-1":
+                black["points"] += 1
+                black["wins"] += 1
+                white["losses"] += 1
+            elif result["result"] == "1/2-1/2":
+                white["points"] += 0.5
+                black["points"] += 0.5
+                white["draws"] += 1
+                black["draws"] += 1
+        return sorted(table.values(), key=lambda row: row["points"], reverse=True)
 
     def stop(self):
-        self._stop = True
+        with self._cond:
+            self._stop = True
+            for battle in self.running.values():
+                battle.stop()
+            self._cond.notify_all()
 
 # API helpers
 
 
 def start_battle(white, black, opening, num_games, realtime_speed):
-    battle = ArenaBattle(white, black, opening, num_games, realtime_speed)
-    with _battles_lock:
-        _battles[battle.id] = battle
+    battle = ArenaBattle(white, black, opening, num_games, realtime_speed, autostart=False)
+    _battles[battle.id] = battle
+    battle.thread.start()
     return battle.id
 
 
-def get_battle_status(battle_id):
-    with _battles_lock:
-        battle = _battles.get(battle_id)
-    if not battle:
-        return None
+def _battle_status(battle):
     return {
         "white": battle.white,
         "black": battle.black,
@@ -183,23 +506,77 @@ def get_battle_status(battle_id):
     }
 
 
-def start_tournament(models, games_per_pair):
-    tournament = ArenaTournament(models, games_per_pair)
-    with _tournaments_lock:
-        _tournaments[tournament.id] = tournament
+def get_battle_status(battle_id):
+    battle = _battles.get(battle_id)
+    if not battle:
+        # Batalha rodando em outro worker ou já arquivada
+        return get_state_backend().get("arena_battles", battle_id) or _battles.archived_state(battle_id)
+    return _battle_status(battle)
+
+
+def start_tournament(models, games_per_pair, double_round_robin=True,
+                     max_workers=TOURNAMENT_MAX_WORKERS, per_model_limit=TOURNAMENT_MAX_GAMES_PER_MODEL):
+    tournament = ArenaTournament(models, games_per_pair, double_round_robin=double_round_robin,
+                                 max_workers=max_workers, per_model_limit=per_model_limit, autostart=False)
+    _tournaments[tournament.id] = tournament
+    tournament.thread.start()
     return tournament.id
 
 
+def resume_from_checkpoints():
+    """Retoma torneios e batalhas avulsas interrompidos por um restart"""
+    if not CHECKPOINTS_ENABLED:
+        return {"tournaments": 0, "battles": 0}
+    store = get_checkpoint_store()
+    tournaments = 0
+    for checkpoint in store.unfinished("arena_tournament"):
+        state = checkpoint["state"]
+        tournament = ArenaTournament(
+            state["models"], state["games_per_pair"], state["double_round_robin"],
+            opening=state["opening"], realtime_speed=state["realtime_speed"],
+            max_workers=state["max_workers"], per_model_limit=state["per_model_limit"],
+            tournament_id=checkpoint["id"], resume_state=state,
+            dispatch=state.get("dispatch", GAME_DISPATCH), autostart=False)
+        _tournaments[tournament.id] = tournament
+        tournament.thread.start()
+        tournaments += 1
+    battles = 0
+    for checkpoint in store.unfinished("arena_battle"):
+        if checkpoint["parent_id"]:
+            # Batalhas de torneio são retomadas pelo próprio torneio
+            continue
+        state = checkpoint["state"]
+        battle = ArenaBattle(state["white"], state["black"], state["opening"], state["num_games"],
+                             state["realtime_speed"], battle_id=checkpoint["id"], resume_state=state,
+                             dispatch=state.get("dispatch", GAME_DISPATCH), autostart=False)
+        _battles[battle.id] = battle
+        battle.thread.start()
+        battles += 1
+    return {"tournaments": tournaments, "battles": battles}
+
+
 def get_tournament_status(tournament_id):
-    with _tournaments_lock:
-        tournament = _tournaments.get(tournament_id)
+    tournament = _tournaments.get(tournament_id)
     if not tournament:
-        return None
+        return get_state_backend().get("tournaments", tournament_id) or _tournaments.archived_state(tournament_id)
+    return _tournament_status(tournament)
+
+
+def registry_stats():
+    """Memória dos registros de batalhas simuladas e torneios"""
+    return {"arena_battles": _battles.stats(), "tournaments": _tournaments.stats()}
+
+
+def _tournament_status(tournament):
     return {
         "models": tournament.models,
         "games_per_pair": tournament.games_per_pair,
         "current_match": tournament.current_match,
         "total_matches": tournament.total_matches,
         "results": tournament.results,
-        "status": tournament.status
+        "status": tournament.status,
+        "double_round_robin": tournament.double_round_robin,
+        "running": [f"{b.white} vs {b.black}" for b in list(tournament.running.values())],
+        "pending": len(tournament.pending),
+        "standings": tournament.standings(),
     }
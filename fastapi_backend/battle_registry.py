@@ -0,0 +1,185 @@
+"""
+Registro de batalhas e torneios em memória com limite de tamanho.
+Batalhas em andamento ficam sempre em memória; ao terminar, o estado final
+é gravado na tabela battle_archive e a batalha passa para uma fila LRU de
+concluídas, que mantém no máximo BATTLE_REGISTRY_MAX_FINISHED entradas por
+até BATTLE_REGISTRY_TTL_SECONDS (para quem ainda consulta o status). Depois
+disso o status vem do arquivo no banco.
+
+Lances de partidas concluídas ficam empacotados (pack_moves): 2 bytes por
+lance em vez de uma string SAN/UCI por lance.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import chess
+
+from fastapi_backend.database import GameDatabase
+
+BATTLE_REGISTRY_TTL_SECONDS = float(os.getenv("BATTLE_REGISTRY_TTL_SECONDS", "3600"))
+BATTLE_REGISTRY_MAX_FINISHED = int(os.getenv("BATTLE_REGISTRY_MAX_FINISHED", "200"))
+
+
+def pack_moves(moves: Iterable[chess.Move]) -> array:
+    """Origem (6 bits), destino (6 bits) e promoção (3 bits) em um uint16 por lance"""
+    return array("H", (move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+                       for move in moves))
+
+
+def unpack_moves(packed: array) -> List[chess.Move]:
+    return [chess.Move(code & 63, code >> 6 & 63, (code >> 12) or None) for code in packed]
+
+
+def pack_san(san_moves: Iterable[str], board: chess.Board = None) -> array:
+    """Empacota uma lista SAN reaplicando-a num tabuleiro (inicial por padrão)"""
+    board = board or chess.Board()
+    moves = []
+    for san in san_moves:
+        move = board.parse_san(san)
+        board.push(move)
+        moves.append(move)
+    return pack_moves(moves)
+
+
+def approx_size(obj: Any, depth: int = 2) -> int:
+    """Bytes aproximados do objeto e de seus atributos, até depth níveis"""
+    size = sys.getsizeof(obj)
+    if depth == 0:
+        return size
+    if isinstance(obj, (list, tuple)):
+        return size + sum(approx_size(item, depth - 1) for item in obj)
+    if isinstance(obj, dict):
+        return size + sum(approx_size(item, depth - 1) for item in obj.values())
+    names = getattr(obj, "__slots__", None) or list(getattr(obj, "__dict__", {}))
+    return size + sum(approx_size(getattr(obj, name, None), depth - 1) for name in names)
+
+
+class BattleRegistry:
+    """
+    Mapa id -> batalha/torneio. snapshot(obj) gera o estado gravado no
+    arquivo; db_path() devolve o banco (None: chess_arena.db do projeto).
+    """
+
+    def __init__(self, kind: str, snapshot: Callable[[Any], Dict[str, Any]],
+                 db_path: Callable[[], Optional[str]] = lambda: None,
+                 ttl_seconds: float = BATTLE_REGISTRY_TTL_SECONDS,
+                 max_finished: int = BATTLE_REGISTRY_MAX_FINISHED):
+        self.kind = kind
+        self.snapshot = snapshot
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self._live: Dict[str, Any] = {}
+        # id -> (objeto, momento em que terminou), do mais antigo ao mais recente
+        self._finished: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.archived = 0
+        self.evicted = 0
+
+    def __setitem__(self, key: str, obj: Any):
+        with self._lock:
+            self._finished.pop(key, None)
+            self._live[key] = obj
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._live or key in self._finished
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._live) + len(self._finished)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            obj = self._live.get(key)
+            if obj is None and key in self._finished:
+                self._finished.move_to_end(key)
+                obj = self._finished[key][0]
+            return obj
+
+    def values(self) -> List[Any]:
+        self.sweep()
+        with self._lock:
+            return list(self._live.values()) + [obj for obj, _ in self._finished.values()]
+
+    def live(self) -> List[Any]:
+        with self._lock:
+            return list(self._live.values())
+
+    def finish(self, key: str):
+        """Arquiva o estado final e move a entrada para a fila de concluídas"""
+        with self._lock:
+            obj = self._live.pop(key, None)
+            if obj is None:
+                return
+            self._finished[key] = (obj, time.monotonic())
+        self._archive(key, obj)
+        self.sweep()
+
+    def sweep(self) -> int:
+        """Tira da memória concluídas vencidas (TTL) e as excedentes (LRU)"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            expired = [key for key, (_, finished_at) in self._finished.items() if finished_at < cutoff]
+            for key in expired:
+                del self._finished[key]
+            evicted = len(expired)
+            while len(self._finished) > self.max_finished:
+                self._finished.popitem(last=False)
+                evicted += 1
+            self.evicted += evicted
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._live.clear()
+            self._finished.clear()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(GameDatabase(self.db_path()).db_path, timeout=30)
+
+    def _archive(self, key: str, obj: Any):
+        try:
+            state = self.snapshot(obj)
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO battle_archive (kind, id, status, state, finished_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.kind, key, str(state.get("status")), json.dumps(state, default=str), time.time()))
+            self.archived += 1
+        except Exception as e:
+            print(f"Erro ao arquivar {self.kind} {key}: {e}")
+
+    def archived_state(self, key: str) -> Optional[Dict[str, Any]]:
+        """Estado gravado de uma entrada que já saiu da memória"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute("SELECT state FROM battle_archive WHERE kind = ? AND id = ?",
+                                   (self.kind, key)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Erro ao ler arquivo de {self.kind} {key}: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        self.sweep()
+        with self._lock:
+            live = list(self._live.values())
+            finished = [obj for obj, _ in self._finished.values()]
+        return {
+            "live": len(live),
+            "finished_in_memory": len(finished),
+            "approx_bytes": sum(approx_size(obj) for obj in live + finished),
+            "archived": self.archived,
+            "evicted": self.evicted,
+            "max_finished": self.max_finished,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -0,0 +1,121 @@
+"""
+Teste de carga da arena com o provedor falso (sem rede nem chaves de API).
+
+Uso (na raiz do repositório):
+    python -m fastapi_backend.benchmarks.arena_load --games 1000 --models 8 --latency-ms 200
+
+Roda as partidas pelo GameScheduler e pelo GameEngine da arena, como uma
+batalha real, e mostra vazão, latência por lance, filas do agendador e
+os 429 simulados. A telemetria vai para um banco temporário.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+
+def configure_env(args):
+    """FAKE_MODELS e limites precisam estar no ambiente antes de importar a arena"""
+    options = [f"latency_ms={args.latency_ms}", f"error_rate={args.error_rate}",
+               f"rate_limit_rate={args.rate_limit_rate}", f"garble_rate={args.garble_rate}",
+               f"policy={args.policy}", f"explanation_words={args.explanation_words}"]
+    os.environ["FAKE_MODELS"] = ",".join(
+        f"Fake-{i}:{';'.join(options)}" for i in range(1, args.models + 1))
+    os.environ["ARENA_MAX_CONCURRENT_GAMES"] = str(args.concurrency)
+    os.environ.setdefault("FAKE_MAX_CONCURRENT_GAMES", str(args.concurrency))
+    os.environ.setdefault("LLM_CACHE_MODE", "off")
+    if args.stream:
+        os.environ["LLM_STREAM_MOVES"] = "true"
+    if args.hedge:
+        os.environ["LLM_HEDGE"] = "true"
+
+
+async def run_load(args):
+    from fastapi_backend import arena
+    from fastapi_backend.database import GameDatabase
+    from fastapi_backend.move_parser import get_parse_stats
+    from fastapi_backend.rate_limiter import get_rate_limiter_stats
+    from fastapi_backend.telemetry import get_move_telemetry, summarize_move_metrics
+
+    db_path = os.path.join(tempfile.mkdtemp(), "arena_load.db")
+    recorder = get_move_telemetry()
+    recorder.db = GameDatabase(db_path)
+    models = [f"Fake-{i}" for i in range(1, args.models + 1)]
+    pairs = [random.sample(models, 2) for _ in range(args.games)]
+    peak = {"in_flight": 0}
+
+    async def sample_scheduler():
+        while True:
+            peak["in_flight"] = max(
+                peak["in_flight"], arena.game_scheduler.in_flight)
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_scheduler())
+    start = time.monotonic()
+    results = await asyncio.gather(*[
+        arena.game_scheduler.run(white, black, lambda w=white, b=black: arena.game_engine.aplay_game(
+            w, b, max_moves=args.max_moves, move_timeout=args.move_timeout))
+        for white, black in pairs
+    ], return_exceptions=True)
+    elapsed = time.monotonic() - start
+    sampler.cancel()
+    recorder.flush()
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    finished = [r for r in results if not isinstance(r, BaseException)]
+    moves = sum(r["moves"] for r in finished)
+    metrics = summarize_move_metrics(
+        recorder._database().get_move_metrics(limit=10_000_000))
+    return {
+        "games": args.games,
+        "finished": len(finished),
+        "errors": len(errors),
+        "first_error": repr(errors[0]) if errors else None,
+        "elapsed_seconds": round(elapsed, 2),
+        "games_per_second": round(len(finished) / elapsed, 2),
+        "moves_per_second": round(moves / elapsed, 1),
+        "peak_in_flight": peak["in_flight"],
+        "scheduler": arena.game_scheduler.stats(),
+        "rate_limits": get_rate_limiter_stats().get("Fake"),
+        "parse": get_parse_stats(),
+        "move_metrics": metrics,
+        "telemetry_db": db_path,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Teste de carga da arena com modelos falsos")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--models", type=int, default=4)
+    parser.add_argument("--max-moves", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=500,
+                        help="Partidas simultâneas (ARENA_MAX_CONCURRENT_GAMES)")
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--garble-rate", type=float, default=0.0)
+    parser.add_argument("--policy", default="random",
+                        choices=("random", "engine", "scripted"))
+    parser.add_argument("--explanation-words", type=int, default=30)
+    parser.add_argument("--move-timeout", type=float, default=30.0)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--hedge", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    configure_env(args)
+    report = asyncio.run(run_load(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
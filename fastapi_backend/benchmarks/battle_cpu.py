@@ -0,0 +1,132 @@
+"""
+CPU gasto por batalha da arena e pela montagem do PGN a cada lance.
+
+Uso (na raiz do repositório):
+    python -m fastapi_backend.benchmarks.battle_cpu --games 20 --plies 60 200 400
+
+Compara, para partidas de vários tamanhos, str(game) do python-chess a cada
+ply (como a arena fazia) com o PgnBuilder incremental lido a cada ply (pior
+caso: um status consultado por lance). Depois roda batalhas reais de
+ArenaBattle sem espera entre lances, gravando num banco temporário, e mede o
+tempo de CPU da thread por batalha.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import chess
+import chess.pgn
+
+from fastapi_backend.pgn_builder import PgnBuilder
+
+
+def random_moves(plies: int, seed: int) -> List[chess.Move]:
+    rnd = random.Random(seed)
+    board = chess.Board()
+    moves = []
+    while len(moves) < plies:
+        legal_moves = list(board.legal_moves)
+        if not legal_moves:
+            # Fim de jogo antes do tamanho pedido: recomeça com outra semente
+            board = chess.Board()
+            moves = []
+            continue
+        move = rnd.choice(legal_moves)
+        moves.append(move)
+        board.push(move)
+    return moves
+
+
+def export_each_ply(moves: List[chess.Move]) -> str:
+    board = chess.Board()
+    game = chess.pgn.Game()
+    node = game
+    pgn = ""
+    for move in moves:
+        board.push(move)
+        node = node.add_variation(move)
+        pgn = str(game)
+    return pgn
+
+
+def build_each_ply(moves: List[chess.Move]) -> str:
+    board = chess.Board()
+    builder = PgnBuilder()
+    pgn = ""
+    for move in moves:
+        builder.push(board, move)
+        board.push(move)
+        pgn = builder.pgn()
+    return pgn
+
+
+def cpu_time(fn, *args) -> float:
+    start = time.process_time()
+    fn(*args)
+    return time.process_time() - start
+
+
+def bench_pgn(plies_list: List[int], repeat: int) -> Dict:
+    results = {}
+    for plies in plies_list:
+        moves = random_moves(plies, seed=plies)
+        assert export_each_ply(moves) == build_each_ply(moves)
+        legacy = statistics.median(cpu_time(export_each_ply, moves) for _ in range(repeat))
+        incremental = statistics.median(cpu_time(build_each_ply, moves) for _ in range(repeat))
+        results[plies] = {
+            "str_game_ms": round(legacy * 1000, 2),
+            "pgn_builder_ms": round(incremental * 1000, 2),
+            "speedup": round(legacy / max(incremental, 1e-9), 1),
+        }
+        print(f"{plies:4d} plies: str(game) {results[plies]['str_game_ms']:9.2f} ms  "
+              f"PgnBuilder {results[plies]['pgn_builder_ms']:8.2f} ms  "
+              f"x{results[plies]['speedup']}")
+    return results
+
+
+def bench_battles(games: int) -> Dict:
+    from fastapi_backend import arena_engine
+
+    arena_engine.DB_PATH = os.path.join(tempfile.mkdtemp(), "battle_cpu.db")
+    per_battle = []
+    for _ in range(games):
+        battle = arena_engine.ArenaBattle("Bench-White", "Bench-Black", "1. e4", 1, 0,
+                                          autostart=False)
+        start = time.thread_time()
+        battle.run_battle()
+        per_battle.append(time.thread_time() - start)
+    result = {
+        "battles": games,
+        "cpu_ms_median": round(statistics.median(per_battle) * 1000, 2),
+        "cpu_ms_max": round(max(per_battle) * 1000, 2),
+    }
+    print(f"ArenaBattle (1 partida): CPU mediana {result['cpu_ms_median']} ms, "
+          f"máx {result['cpu_ms_max']} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU por batalha e por montagem de PGN")
+    parser.add_argument("--plies", type=int, nargs="*", default=[60, 200, 400])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--games", type=int, default=20,
+                        help="Batalhas de ArenaBattle medidas")
+    parser.add_argument("--output", help="Arquivo JSON de resultados")
+    args = parser.parse_args()
+    # Batalhas de benchmark não devem deixar checkpoints no banco do projeto
+    os.environ.setdefault("ARENA_CHECKPOINTS", "false")
+    report = {"pgn": bench_pgn(args.plies, args.repeat),
+              "battle": bench_battles(args.games)}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Gerador de corpus sintético para os benchmarks.
+Produz partidas no formato de games/ (PGNs com comentários longos no estilo
+das respostas dos LLMs, um diretório "A vs B" por confronto) e um banco
+SQLite com a tabela games preenchida.
+
+Uso (na raiz do repositório):
+    python -m fastapi_backend.benchmarks.corpus --games 10000 --out /tmp/corpus_10k
+
+As sequências de lances vêm de um conjunto de partidas aleatórias geradas
+uma vez (SEQUENCE_POOL) e combinadas com cabeçalhos e comentários
+diferentes, para que 100k partidas saiam em segundos.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import chess
+
+from fastapi_backend.database import GameDatabase
+
+CORPUS_SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+# Muda quando o formato gerado muda (invalida corpora em cache no /tmp)
+CORPUS_VERSION = 1
+SEQUENCE_POOL = 400
+MODELS = ["GPT-4o", "GPT-4-Turbo", "Gemini-Pro", "Claude-3.5-Sonnet",
+          "Deepseek-R1", "Llama3-70B", "Mixtral-8x7B", "GPT-3.5-Turbo"]
+OPENING_LINES = [["e4", "e5", "Nf3", "Nc6", "Bb5"], ["e4", "c5", "Nf3", "d6", "d4"],
+                 ["d4", "d5", "c4", "e6", "Nc3"], ["d4", "Nf6", "c4", "g6", "Nc3"],
+                 ["c4", "e5", "Nc3", "Nf6"], ["Nf3", "d5", "g3"], ["e4", "e6", "d4", "d5"],
+                 ["e4", "c6", "d4", "d5"], ["f4", "d5"], ["b3", "e5"]]
+OPENING_NAMES = ["Ruy Lopez", "Sicilian Defense", "Queen's Gambit Declined",
+                 "King's Indian Defense", "English Opening", "Réti Opening",
+                 "French Defense", "Caro-Kann Defense"]
+COMMENT_SENTENCES = [
+    "Escolhi {move} porque desenvolve uma peça menor e prepara o controle do centro.",
+    "A jogada {move} mantém a pressão no centro e melhora a segurança do rei.",
+    "Com {move}, disputo o controle central e preparo o desenvolvimento das peças.",
+    "O lance {move} abre linhas para os bispos e prepara o roque.",
+    "Aceito a troca com {move}, buscando atividade e iniciativa.",
+    "{move} ameaça a peça adversária e força uma resposta precisa.",
+    "Essa jogada leva a um jogo dinâmico, com chances para ambos os lados.",
+    "Além disso, é um movimento padrão nessa estrutura de peões.",
+]
+RESULTS = ["1-0", "0-1", "1/2-1/2", "*"]
+RESULT_WEIGHTS = [0.38, 0.34, 0.18, 0.10]
+
+
+def random_sequence(rnd: random.Random, min_plies: int = 20, max_plies: int = 140) -> List[str]:
+    """Partida aleatória a partir de uma abertura conhecida, em SAN"""
+    board = chess.Board()
+    sans = []
+    for san in rnd.choice(OPENING_LINES):
+        sans.append(san)
+        board.push_san(san)
+    target = rnd.randint(min_plies, max_plies)
+    while len(sans) < target and not board.is_game_over():
+        legal_moves = list(board.legal_moves)
+        # Prefere capturas às vezes, para as partidas não ficarem só em lances de espera
+        captures = [m for m in legal_moves if board.is_capture(m)]
+        move = rnd.choice(captures if captures and rnd.random()
+                          < 0.3 else legal_moves)
+        sans.append(board.san(move))
+        board.push(move)
+    return sans
+
+
+def _comment(rnd: random.Random, san: str) -> str:
+    marker = f'My move: "{san}"' if rnd.random() < 0.6 else f"My move: {san}"
+    sentences = " ".join(s.format(move=san)
+                         for s in rnd.sample(COMMENT_SENTENCES, rnd.randint(1, 3)))
+    return f"{marker}\n\n{sentences}"
+
+
+def render_pgn(rnd: random.Random, white: str, black: str, sans: List[str],
+               result: str, date: datetime) -> str:
+    headers = [("Event", "LLM Chess Arena"), ("Site", "?"), ("Date", date.strftime("%Y.%m.%d")),
+               ("Round", "?"), ("White", white), ("Black", black), ("Result", result)]
+    if rnd.random() < 0.5:
+        headers.append(("Opening", rnd.choice(OPENING_NAMES)))
+    parts = []
+    for ply, san in enumerate(sans):
+        number = ply // 2 + 1
+        prefix = f"{number}. " if ply % 2 == 0 else f"{number}... "
+        parts.append(f"{prefix}{san} {{ {_comment(rnd, san)} }}")
+    parts.append(result)
+    header_text = "\n".join(f'[{key} "{value}"]' for key, value in headers)
+    return f"{header_text}\n\n{' '.join(parts)}\n"
+
+
+def generate_games(count: int, seed: int = 42) -> Iterator[Dict]:
+    """Partidas sintéticas no formato usado por GameDatabase.save_game"""
+    rnd = random.Random(seed)
+    pool = [random_sequence(rnd) for _ in range(min(SEQUENCE_POOL, count))]
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        white, black = rnd.sample(MODELS, 2)
+        sans = rnd.choice(pool)
+        result = rnd.choices(RESULTS, RESULT_WEIGHTS)[0]
+        date = start + timedelta(minutes=7 * i)
+        yield {
+            "white": white,
+            "black": black,
+            "result": result,
+            "pgn": render_pgn(rnd, white, black, sans, result, date),
+            "moves": (len(sans) + 1) // 2,
+            "opening": "",
+            "date": date.isoformat(),
+        }
+
+
+def write_games_dir(games: List[Dict], games_dir: Path):
+    """Um diretório "White vs Black" por confronto, arquivos N_game.pgn (como em games/)"""
+    counters: Dict[Tuple[str, str], int] = {}
+    for game in games:
+        key = (game["white"], game["black"])
+        counters[key] = counters.get(key, 0) + 1
+        matchup_dir = games_dir / f"{game['white']} vs {game['black']}"
+        matchup_dir.mkdir(parents=True, exist_ok=True)
+        (matchup_dir / f"{counters[key]}_game.pgn").write_text(game["pgn"],
+                                                               encoding="utf-8")
+
+
+def write_database(games: List[Dict], db_path: str) -> GameDatabase:
+    """Cria o schema via GameDatabase e insere as partidas em lote"""
+    db = GameDatabase(db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO games (white, black, result, pgn, moves, opening, date, analysis_data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, '{}')",
+            [(g["white"], g["black"], g["result"], g["pgn"], g["moves"], g["opening"], g["date"])
+             for g in games])
+        conn.commit()
+    return db
+
+
+def build_corpus(count: int, out_dir: Path = None, seed: int = 42) -> Dict:
+    """Gera (ou reaproveita) o corpus: diretório de PGNs + banco"""
+    if out_dir is None:
+        out_dir = Path(tempfile.gettempdir()) / \
+            f"llms_chess_corpus_v{CORPUS_VERSION}_{count}_{seed}"
+    out_dir = Path(out_dir)
+    games_dir = out_dir / "games"
+    db_path = str(out_dir / "chess_arena.db")
+    marker = out_dir / ".complete"
+    if not marker.exists():
+        out_dir.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        games = list(generate_games(count, seed))
+        write_games_dir(games, games_dir)
+        write_database(games, db_path)
+        marker.write_text(str(count))
+    return {"count": count, "seed": seed, "dir": out_dir, "games_dir": games_dir, "db_path": db_path}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gera um corpus sintético de partidas")
+    parser.add_argument("--games", default="1k",
+                        help="1k, 10k, 100k ou um número")
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    count = CORPUS_SIZES.get(args.games) or int(args.games)
+    corpus = build_corpus(count, args.out, args.seed)
+    print(f"{count} partidas em {corpus['dir']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Micro-benchmarks do backend sobre um corpus sintético (benchmarks/corpus.py).
+
+Uso (na raiz do repositório):
+    python -m fastapi_backend.benchmarks.micro run --size 10k --output bench_10k.json
+    python -m fastapi_backend.benchmarks.micro compare base.json novo.json --threshold 0.2
+
+run grava um JSON com mediana/mínimo de cada benchmark; compare aponta os
+benchmarks cuja mediana piorou além do limite e sai com código 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import chess.pgn
+
+from fastapi_backend.benchmarks.corpus import CORPUS_SIZES, build_corpus, generate_games
+
+# Benchmarks por partida usam uma amostra fixa, independente do tamanho do corpus
+SAMPLE_GAMES = 500
+INSERT_GAMES = 500
+
+
+class Bench:
+    def __init__(self, name: str, fn: Callable[[], object], ops: int = 1, setup: Callable[[], None] = None):
+        self.name = name
+        self.fn = fn
+        self.ops = ops
+        self.setup = setup
+
+
+def build_benchmarks(corpus: Dict) -> List[Bench]:
+    from fastapi_backend import dashboard
+    from fastapi_backend.analysis import GameAnalyzer
+    from fastapi_backend.database import GameDatabase
+    from fastapi_backend.pgn_utils import parse_pgn
+
+    db = GameDatabase(corpus["db_path"])
+    games_dir = corpus["games_dir"]
+    analyzer = GameAnalyzer()
+    all_games = db.get_all_games()
+    sample = [g["pgn"] for g in all_games[:SAMPLE_GAMES]]
+    parsed = [chess.pgn.read_game(StringIO(pgn)) for pgn in sample]
+    first = all_games[0]
+    insert_rows = list(generate_games(INSERT_GAMES, seed=7))
+    scratch_dir = tempfile.mkdtemp()
+    insert_state = {}
+
+    def fresh_insert_db():
+        path = os.path.join(scratch_dir, f"insert_{time.monotonic_ns()}.db")
+        insert_state["db"] = GameDatabase(path)
+
+    def insert_games():
+        for game in insert_rows:
+            insert_state["db"].save_game(game)
+
+    return [
+        Bench("pgn_utils.parse_pgn", lambda: [parse_pgn(pgn) for pgn in sample], len(sample)),
+        Bench("GameAnalyzer.analyze_game", lambda: [analyzer.analyze_game(g) for g in parsed], len(parsed)),
+        Bench("GameAnalyzer.calculate_elo_ratings", lambda: analyzer.calculate_elo_ratings(all_games)),
+        Bench("GameAnalyzer.get_opening_statistics", lambda: analyzer.get_opening_statistics(db)),
+        Bench("dashboard.parse_pgn_stats", lambda: dashboard.parse_pgn_stats(games_dir)),
+        Bench("dashboard.parse_matchup_stats", lambda: dashboard.parse_matchup_stats(games_dir)),
+        Bench("GameDatabase.get_all_games", db.get_all_games),
+        Bench("GameDatabase.get_recent_games", lambda: db.get_recent_games(50)),
+        Bench("GameDatabase.get_games_between_models",
+              lambda: db.get_games_between_models(first["white"], first["black"])),
+        Bench("GameDatabase.get_games_for_model", lambda: db.get_games_for_model(first["white"])),
+        Bench("GameDatabase.get_database_stats", db.get_database_stats),
+        Bench("GameDatabase.get_results_by_model", db.get_results_by_model),
+        Bench("GameDatabase.get_winrate_data", db.get_winrate_data),
+        Bench("GameDatabase.save_game", insert_games, len(insert_rows), setup=fresh_insert_db),
+    ]
+
+
+def time_bench(bench: Bench, repeat: int, max_seconds: float) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        if bench.setup:
+            bench.setup()
+        start = time.perf_counter()
+        bench.fn()
+        timings.append(time.perf_counter() - start)
+        # Benchmarks lentos (corpus grande) rodam uma vez só
+        if sum(timings) > max_seconds:
+            break
+    median = statistics.median(timings)
+    return {
+        "runs": len(timings),
+        "ops": bench.ops,
+        "median_seconds": round(median, 6),
+        "min_seconds": round(min(timings), 6),
+        "per_op_ms": round(median / bench.ops * 1000, 4),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(args) -> int:
+    count = CORPUS_SIZES.get(args.size) or int(args.size)
+    corpus = build_corpus(count, args.corpus_dir, args.seed)
+    results = {}
+    for bench in build_benchmarks(corpus):
+        if args.only and not any(pattern in bench.name for pattern in args.only):
+            continue
+        results[bench.name] = time_bench(bench, args.repeat, args.max_seconds)
+        print(f"{bench.name:42s} {results[bench.name]['median_seconds']:>10.4f}s "
+              f"({results[bench.name]['per_op_ms']} ms/op)")
+    report = {
+        "meta": {
+            "size": count,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "commit": _git_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+        },
+        "benchmarks": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Resultados gravados em {args.output}")
+    return 0
+
+
+def compare(args) -> int:
+    base = json.loads(Path(args.base).read_text())
+    new = json.loads(Path(args.new).read_text())
+    if base["meta"]["size"] != new["meta"]["size"]:
+        print(f"Aviso: tamanhos de corpus diferentes ({base['meta']['size']} vs {new['meta']['size']})")
+    regressions = 0
+    for name, new_result in new["benchmarks"].items():
+        old_result = base["benchmarks"].get(name)
+        if not old_result:
+            print(f"{name:42s} (novo)")
+            continue
+        ratio = new_result["median_seconds"] / max(old_result["median_seconds"], 1e-9)
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = "  <-- REGRESSÃO"
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = "  (melhorou)"
+        print(f"{name:42s} {old_result['median_seconds']:>10.4f}s -> "
+              f"{new_result['median_seconds']:>10.4f}s  x{ratio:.2f}{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks do backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="Roda os benchmarks")
+    run_parser.add_argument("--size", default="1k", help="1k, 10k, 100k ou um número")
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--max-seconds", type=float, default=30.0,
+                            help="Tempo máximo acumulado por benchmark antes de parar de repetir")
+    run_parser.add_argument("--only", nargs="*", help="Filtra benchmarks pelo nome")
+    run_parser.add_argument("--corpus-dir", type=Path, default=None)
+    run_parser.add_argument("--output", help="Arquivo JSON de resultados")
+    compare_parser = sub.add_parser("compare", help="Compara dois resultados")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.2,
+                                help="Piora relativa tolerada (0.2 = 20%%)")
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == "run" else compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Harness do limitador de taxa contra um provedor falso local que aplica 429.
+
+Uso (na raiz do repositório):
+    python -m fastapi_backend.benchmarks.rate_limit_harness --provider-rps 5 --workers 20
+
+Compara chamadas sem limitador (retry cego, como o GameEngine fazia) com o
+ProviderRateLimiter: quantos 429 cada estratégia recebe e qual taxa o
+limitador aprende. Sai com código 1 se o limitador não reduzir os 429.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+
+from fastapi_backend.rate_limiter import (
+    ProviderRateLimiter, is_rate_limit_error, retry_after_seconds)
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.status_code = 429
+        self.headers = headers
+
+
+class FakeRateLimitError(Exception):
+    """Imita o erro 429 dos SDKs (status_code + response.headers)"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Error code: 429 - rate limit exceeded")
+        self.status_code = 429
+        self.response = FakeResponse({"retry-after": f"{retry_after:.3f}"})
+
+
+class ThrottlingProvider:
+    """Aceita no máximo `rps` chamadas numa janela deslizante de 1s"""
+
+    def __init__(self, rps: int, latency: float = 0.02):
+        self.rps = rps
+        self.latency = latency
+        self.window = deque()
+        self.accepted = 0
+        self.rejected = 0
+
+    async def call(self):
+        now = time.monotonic()
+        while self.window and now - self.window[0] > 1.0:
+            self.window.popleft()
+        if len(self.window) >= self.rps:
+            self.rejected += 1
+            raise FakeRateLimitError(1.0 - (now - self.window[0]))
+        self.window.append(now)
+        self.accepted += 1
+        await asyncio.sleep(self.latency)
+        return "ok"
+
+
+async def run_naive(provider: ThrottlingProvider, workers: int, duration: float):
+    async def worker():
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            try:
+                await provider.call()
+            except FakeRateLimitError:
+                await asyncio.sleep(0)
+    await asyncio.gather(*[worker() for _ in range(workers)])
+
+
+async def run_limited(provider: ThrottlingProvider, limiter: ProviderRateLimiter,
+                      workers: int, duration: float):
+    async def worker():
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            await limiter.aacquire(1)
+            try:
+                await provider.call()
+                limiter.on_success()
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    limiter.on_rate_limited(retry_after_seconds(e))
+    await asyncio.gather(*[worker() for _ in range(workers)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--provider-rps", type=int, default=5)
+    parser.add_argument("--limiter-rpm", type=int, default=1200,
+                        help="Teto inicial do limitador (acima do real, para forçar o aprendizado)")
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    naive = ThrottlingProvider(args.provider_rps)
+    asyncio.run(run_naive(naive, args.workers, args.duration))
+
+    limited = ThrottlingProvider(args.provider_rps)
+    limiter = ProviderRateLimiter("Fake", args.limiter_rpm, 10 ** 9,
+                                  base_backoff=0.1, max_backoff=2.0)
+    asyncio.run(run_limited(limited, limiter, args.workers, args.duration))
+
+    report = {
+        "provider_rpm": args.provider_rps * 60,
+        "naive": {"accepted": naive.accepted, "throttled": naive.rejected},
+        "limited": {"accepted": limited.accepted, "throttled": limited.rejected},
+        "limiter": limiter.stats(),
+    }
+    print(json.dumps(report, indent=2))
+    if limited.rejected >= naive.rejected:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark de startup do backend FastAPI.
+
+Mede (1) o tempo de import de fastapi_backend.main via `python -X importtime`
+e (2) o tempo até a primeira resposta 200 de /health com o uvicorn. Compara
+com o baseline versionado (startup_baseline.json) e sai com código 1 se
+alguma métrica piorar além do limite, ou 2 se o baseline não existir.
+
+Uso (na raiz do repositório):
+    python -m fastapi_backend.benchmarks.startup                    # compara
+    python -m fastapi_backend.benchmarks.startup --update-baseline  # grava baseline
+"""
+
+import argparse
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "startup_baseline.json"
+# Pacotes que não deveriam aparecer no import do app sem modelos configurados
+WATCHED_PACKAGES = ("langchain_openai", "langchain_google_genai", "langchain_groq",
+                    "langchain_anthropic", "anthropic", "numpy")
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_importtime(module: str = "fastapi_backend.main"):
+    """Tempo total de import (ms) e os maiores imports cumulativos"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        # "import time:   self |  cumulative | nome"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    total_us = sum(self_us for _, self_us, _ in entries)
+    top = sorted(entries, key=lambda e: e[2], reverse=True)[:15]
+    loaded = {name for name, _, _ in entries}
+    return {
+        "import_ms": round(total_us / 1000, 1),
+        "top_cumulative_ms": {name: round(cum / 1000, 1) for name, _, cum in top},
+        "watched_loaded": [pkg for pkg in WATCHED_PACKAGES if pkg in loaded],
+    }
+
+
+def measure_first_health(timeout: float = 60.0) -> float:
+    """Segundos entre iniciar o uvicorn e a primeira resposta 200 de /health"""
+    port = _free_port()
+    start = time.monotonic()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "fastapi_backend.main:app",
+                             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while time.monotonic() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(proc.stderr.read().decode()[-2000:])
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as r:
+                    if r.status == 200:
+                        return time.monotonic() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("/health não respondeu a tempo")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def run(repeat: int):
+    imports = [measure_importtime() for _ in range(repeat)]
+    health = [measure_first_health() for _ in range(repeat)]
+    return {
+        "python": sys.version.split()[0],
+        "import_ms": statistics.median(i["import_ms"] for i in imports),
+        "first_health_ms": round(statistics.median(health) * 1000, 1),
+        "top_cumulative_ms": imports[-1]["top_cumulative_ms"],
+        "watched_loaded": imports[-1]["watched_loaded"],
+    }
+
+
+def compare(result, baseline, threshold: float):
+    regressions = []
+    for metric in ("import_ms", "first_health_ms"):
+        limit = baseline[metric] * (1 + threshold)
+        if result[metric] > limit:
+            regressions.append(
+                f"{metric}: {result[metric]} > {limit:.1f} (baseline {baseline[metric]})")
+    newly_loaded = set(result["watched_loaded"]) - \
+        set(baseline.get("watched_loaded", []))
+    if newly_loaded:
+        regressions.append(
+            f"SDKs importados no startup: {', '.join(sorted(newly_loaded))}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de startup do backend")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Piora relativa tolerada (0.25 = 25%%)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    result = run(args.repeat)
+    print(json.dumps(result, indent=2))
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Baseline gravado em {args.baseline}")
+        return
+    if not args.baseline.exists():
+        # Sem baseline não há com o que comparar: em CI isso é erro, não um "passou"
+        print(f"ERRO: baseline {args.baseline} não existe; rode com --update-baseline")
+        sys.exit(2)
+    regressions = compare(result, json.loads(
+        args.baseline.read_text()), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSÃO: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Checkpoints em SQLite de batalhas, partidas e torneios em andamento.
+Cada lance regrava o estado da partida (lances em UCI desde a posição
+inicial), então um restart ou reload do uvicorn não perde as partidas
+pagas: no startup o trabalho com status "playing" é retomado do último ply.
+
+No event loop (arena.py) use enqueue(): a gravação fica com uma thread
+escritora que agrupa os pendentes por (kind, id) e grava só o estado mais
+recente de cada um, então contenção no SQLite nunca trava o loop.
+
+Tipos usados (coluna kind):
+- "battle" / "battle_game": batalhas da arena LLM (arena.py) e suas partidas
+- "arena_battle" / "arena_tournament": batalhas e torneios de arena_engine.py
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi_backend.database import GameDatabase
+
+CHECKPOINTS_ENABLED = os.getenv(
+    "ARENA_CHECKPOINTS", "true").lower() in ("1", "true", "yes")
+# Checkpoints concluídos/cancelados mais antigos que isso são apagados no startup
+CHECKPOINT_RETENTION_SECONDS = float(
+    os.getenv("CHECKPOINT_RETENTION_HOURS", "72")) * 3600
+
+PLAYING = "playing"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+
+
+class CheckpointStore:
+    """Conexão única (WAL) compartilhada entre threads, protegida por lock"""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = GameDatabase(db_path).db_path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.writes = 0
+        # (kind, id) -> argumentos de save; o mais recente substitui o anterior
+        self._pending: Dict[tuple, tuple] = {}
+        self._pending_cond = threading.Condition()
+        self._writing = False
+        self._writer = None
+        self.coalesced = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Com WAL, NORMAL só arrisca o último commit numa queda de energia,
+            # não num crash do processo
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def save(self, kind: str, key: str, state: Dict[str, Any], status: str = PLAYING,
+             parent_id: str = None):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (kind, id, parent_id, status, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key, parent_id, status, json.dumps(state), time.time()))
+            conn.commit()
+            self.writes += 1
+
+    def enqueue(self, kind: str, key: str, state: Dict[str, Any], status: str = PLAYING,
+                parent_id: str = None):
+        """Agenda o save na thread escritora (não bloqueia quem chama)"""
+        with self._pending_cond:
+            if (kind, key) in self._pending:
+                self.coalesced += 1
+            self._pending[(kind, key)] = (kind, key, state, status, parent_id)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_pending, daemon=True,
+                                                name="checkpoint-writer")
+                self._writer.start()
+            self._pending_cond.notify_all()
+
+    def _write_pending(self):
+        while True:
+            with self._pending_cond:
+                while not self._pending:
+                    self._pending_cond.wait()
+                batch, self._pending = list(self._pending.values()), {}
+                self._writing = True
+            try:
+                for args in batch:
+                    try:
+                        self.save(*args)
+                    except Exception as e:
+                        print(f"Erro ao gravar checkpoint {args[0]} {args[1]}: {e}")
+            finally:
+                with self._pending_cond:
+                    self._writing = False
+                    self._pending_cond.notify_all()
+
+    def flush(self, timeout: float = 30) -> bool:
+        """Espera a thread escritora gravar tudo que está pendente (shutdown)"""
+        deadline = time.monotonic() + timeout
+        with self._pending_cond:
+            while self._pending or self._writing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    def set_status(self, kind: str, key: str, status: str):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("UPDATE checkpoints SET status = ?, updated_at = ? WHERE kind = ? AND id = ?",
+                         (status, time.time(), kind, key))
+            conn.commit()
+
+    def load(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        rows = self._select("kind = ? AND id = ?", (kind, key))
+        return rows[0] if rows else None
+
+    def unfinished(self, kind: str) -> List[Dict[str, Any]]:
+        return self._select("kind = ? AND status = ?", (kind, PLAYING))
+
+    def children(self, kind: str, parent_id: str) -> List[Dict[str, Any]]:
+        return self._select("kind = ? AND parent_id = ?", (kind, parent_id))
+
+    def _select(self, where: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT kind, id, parent_id, status, state, updated_at FROM checkpoints "
+                f"WHERE {where} ORDER BY updated_at", params).fetchall()
+        return [{"kind": kind, "id": key, "parent_id": parent_id, "status": status,
+                 "state": json.loads(state), "updated_at": updated_at}
+                for kind, key, parent_id, status, state, updated_at in rows]
+
+    def prune(self, max_age_seconds: float = CHECKPOINT_RETENTION_SECONDS) -> int:
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute("DELETE FROM checkpoints WHERE status != ? AND updated_at < ?",
+                                   (PLAYING, time.time() - max_age_seconds)).rowcount
+            conn.commit()
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT kind, status, COUNT(*) FROM checkpoints GROUP BY kind, status").fetchall()
+        counts: Dict[str, Dict[str, int]] = {}
+        for kind, status, count in rows:
+            counts.setdefault(kind, {})[status] = count
+        with self._pending_cond:
+            pending = len(self._pending)
+        return {"enabled": CHECKPOINTS_ENABLED, "writes": self.writes, "pending": pending,
+                "coalesced": self.coalesced, "checkpoints": counts}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CheckpointStore()
+    return _store
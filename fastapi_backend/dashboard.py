@@ -6,22 +6,24 @@ from io import StringIO
 import chess.pgn
 import time
 import os
-from fastapi_backend.database import GameDatabase
-from fastapi_backend.models_manager import ModelManager
-from fastapi_backend.analysis import GameAnalyzer
+import threading
+from datetime import datetime
+from typing import Dict, Any
+from fastapi_backend.database import GameDatabase, add_write_listener, get_write_generation
+from fastapi_backend.models_manager import get_model_manager
+from fastapi_backend.analysis import game_analyzer
 
 router = APIRouter()
 
 GAMES_DIR = Path(__file__).resolve().parent.parent / "games"
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-model_manager = ModelManager()
-game_analyzer = GameAnalyzer()
+model_manager = get_model_manager()
 
 
-def parse_pgn_stats():
+def parse_pgn_stats(games_dir: Path = GAMES_DIR):
     stats = {}
-    for dir_path in GAMES_DIR.iterdir():
+    for dir_path in games_dir.iterdir():
         if not dir_path.is_dir():
             continue
         for file in dir_path.glob("*.pgn"):
@@ -56,9 +58,9 @@ def parse_pgn_stats():
     return list(stats.values())
 
 
-def parse_matchup_stats():
+def parse_matchup_stats(games_dir: Path = GAMES_DIR):
     matchup_stats = []
-    for dir_path in GAMES_DIR.iterdir():
+    for dir_path in games_dir.iterdir():
         if not dir_path.is_dir():
             continue
         dir_name = dir_path.name
@@ -110,35 +112,152 @@ def parse_matchup_stats():
     return matchup_stats
 
 
-@router.get("/api/data/dashboard")
-def get_dashboard_data():
+def build_dashboard_data(db: GameDatabase, games_dir: Path = GAMES_DIR):
+    """Executa as consultas e a varredura de PGNs que compõem o dashboard"""
+    stats = db.get_database_stats()
+    model_stats = []
+    # Buscar estatísticas dos modelos
+    with sqlite3.connect(db.db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT model_name, games_played, wins, draws, losses, current_elo, avg_accuracy FROM model_stats")
+        for row in cursor.fetchall():
+            model_stats.append({
+                "model": row[0],
+                "games_played": row[1],
+                "wins": row[2],
+                "draws": row[3],
+                "losses": row[4],
+                "elo": row[5],
+                "avg_accuracy": row[6],
+                "total": row[1],
+            })
+    recent_games = db.get_recent_games(10)
+    matchup_stats = parse_matchup_stats(games_dir)  # Preenche resultados por confronto
+    return {
+        "totalGames": stats['total_games'],
+        "modelStats": model_stats,
+        "recentGames": recent_games,
+        "matchupStats": matchup_stats
+    }
+
+
+def _file_signature(path: str):
     try:
-        db = GameDatabase()
-        stats = db.get_database_stats()
-        model_stats = []
-        # Buscar estatísticas dos modelos
-        with sqlite3.connect(db.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT model_name, games_played, wins, draws, losses, current_elo, avg_accuracy FROM model_stats")
-            for row in cursor.fetchall():
-                model_stats.append({
-                    "model": row[0],
-                    "games_played": row[1],
-                    "wins": row[2],
-                    "draws": row[3],
-                    "losses": row[4],
-                    "elo": row[5],
-                    "avg_accuracy": row[6],
-                    "total": row[1],
-                })
-        recent_games = db.get_recent_games(10)
-        matchup_stats = parse_matchup_stats()  # Preenche resultados por confronto
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def games_dir_signature(games_dir: Path = GAMES_DIR):
+    """Assinatura barata (apenas stat) da pasta games/ e seus PGNs"""
+    entries = []
+    if not games_dir.is_dir():
+        return ()
+    for dir_path in sorted(games_dir.iterdir()):
+        if not dir_path.is_dir():
+            continue
+        files = [_file_signature(str(f)) for f in dir_path.glob("*.pgn")]
+        entries.append((dir_path.name, _file_signature(str(dir_path)),
+                        len(files), max((f for f in files if f), default=None)))
+    return tuple(entries)
+
+
+def db_signature(db_path: str):
+    """Geração de escrita local + mtime do banco (cobre escritas de outros processos)"""
+    return (get_write_generation(), _file_signature(db_path),
+            _file_signature(db_path + "-wal"))
+
+
+class DashboardSnapshot:
+    """
+    Snapshot em memória do dashboard, recalculado em background.
+    O recálculo só acontece quando a tabela games ou a pasta games/ mudam,
+    com debounce para agrupar rajadas de escrita.
+    """
+
+    def __init__(self, db_path: str = None, games_dir: Path = GAMES_DIR,
+                 poll_interval: float = 5.0, debounce: float = 1.0):
+        self.db = GameDatabase(db_path)
+        self.games_dir = games_dir
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.data = None
+        self.generation = 0
+        self.built_at = None
+        self.build_seconds = 0.0
+        self.dirty = False
+        self._signature = None
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._thread = None
+        add_write_listener(self.notify)
+
+    def notify(self):
+        """Chamado quando uma partida é gravada neste processo"""
+        self.dirty = True
+        self._changed.set()
+
+    def _current_signature(self):
+        return (db_signature(self.db.db_path), games_dir_signature(self.games_dir))
+
+    def refresh(self):
+        with self._lock:
+            # Limpa antes de calcular: escritas durante o build marcam de novo
+            self.dirty = False
+            signature = self._current_signature()
+            start = time.monotonic()
+            data = build_dashboard_data(self.db, self.games_dir)
+            self.build_seconds = time.monotonic() - start
+            self.data = data
+            self._signature = signature
+            self.generation += 1
+            self.built_at = time.time()
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="dashboard-snapshot", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            notified = self._changed.wait(self.poll_interval)
+            try:
+                if not notified and self._current_signature() == self._signature:
+                    continue
+                self.dirty = True
+                # Debounce: espera as escritas pararem antes de recalcular
+                self._changed.clear()
+                while self._changed.wait(self.debounce):
+                    self._changed.clear()
+                self.refresh()
+            except Exception as e:
+                print(f"Erro ao atualizar snapshot do dashboard: {e}")
+
+    def get(self) -> Dict[str, Any]:
+        if self.data is None:
+            self.refresh()
+        self._ensure_worker()
         return {
-            "totalGames": stats['total_games'],
-            "modelStats": model_stats,
-            "recentGames": recent_games,
-            "matchupStats": matchup_stats
+            **self.data,
+            "snapshot": {
+                "generation": self.generation,
+                "built_at": datetime.fromtimestamp(self.built_at).isoformat(),
+                "age_seconds": round(time.time() - self.built_at, 3),
+                "build_seconds": round(self.build_seconds, 3),
+                "stale": self.dirty,
+            }
         }
+
+
+dashboard_snapshot = DashboardSnapshot()
+
+
+@router.get("/api/data/dashboard")
+def get_dashboard_data():
+    try:
+        return dashboard_snapshot.get()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
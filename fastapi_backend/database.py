@@ -6,18 +6,53 @@ from datetime import datetime, timedelta
 import chess.pgn
 from io import StringIO
 import re
+import threading
+
+# Geração de escrita: incrementada a cada partida gravada neste processo.
+# Caches (ex.: snapshot do dashboard) usam o valor para se invalidar.
+_write_generation = 0
+_write_lock = threading.Lock()
+_write_listeners = []
+
+
+def get_write_generation() -> int:
+    return _write_generation
+
+
+def bump_write_generation():
+    """Marca que a tabela games mudou e avisa os listeners registrados"""
+    global _write_generation
+    with _write_lock:
+        _write_generation += 1
+        listeners = list(_write_listeners)
+    for listener in listeners:
+        try:
+            listener()
+        except Exception as e:
+            print(f"Erro no listener de escrita: {e}")
+
+
+def add_write_listener(callback):
+    with _write_lock:
+        if callback not in _write_listeners:
+            _write_listeners.append(callback)
 
 
 class GameDatabase:
     """Manages the SQLite database for storing games and statistics"""
 
+    # Bancos cujo schema já foi criado neste processo
+    _initialized_paths = set()
+
     def __init__(self, db_path: str = None):
         if db_path is None:
             # Sempre usa o banco na raiz do projeto
             db_path = os.path.abspath(os.path.join(
                 os.path.dirname(__file__), '..', 'chess_arena.db'))
         self.db_path = db_path
-        self._initialize_database()
+        if db_path not in GameDatabase._initialized_paths:
+            self._initialize_database()
+            GameDatabase._initialized_paths.add(db_path)
 
     def _initialize_database(self):
         """Initialize the database with required tables"""
@@ -78,8 +113,119 @@ class GameDatabase:
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            # Colunas adicionadas depois da criação original do schema
+            columns = {row[1] for row in cursor.execute(
+                "PRAGMA table_info(games)").fetchall()}
+            if "tournament_id" not in columns:
+                cursor.execute(
+                    "ALTER TABLE games ADD COLUMN tournament_id TEXT")
+            # Telemetria por lance (latência, tokens, tentativas)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS move_metrics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    game_uid TEXT NOT NULL,
+                    ply INTEGER NOT NULL,
+                    color TEXT,
+                    model_name TEXT NOT NULL,
+                    provider TEXT,
+                    move_uci TEXT,
+                    wall_seconds REAL,
+                    prompt_tokens INTEGER DEFAULT 0,
+                    completion_tokens INTEGER DEFAULT 0,
+                    tokens_estimated INTEGER DEFAULT 0,
+                    attempts INTEGER DEFAULT 0,
+                    retries INTEGER DEFAULT 0,
+                    parse_failures INTEGER DEFAULT 0,
+                    rate_limited INTEGER DEFAULT 0,
+                    errors INTEGER DEFAULT 0,
+                    fallback INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_move_metrics_model ON move_metrics (model_name, id)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_move_metrics_game ON move_metrics (game_uid)")
+            # Checkpoints de batalhas/partidas/torneios em andamento (ver checkpoint.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    parent_id TEXT,
+                    status TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (kind, id)
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_checkpoints_status ON checkpoints (kind, status)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_checkpoints_parent ON checkpoints (parent_id)")
+            # Estado final de batalhas/torneios que saíram da memória (ver battle_registry.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS battle_archive (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    status TEXT,
+                    state TEXT NOT NULL,
+                    finished_at REAL NOT NULL,
+                    PRIMARY KEY (kind, id)
+                )
+            """)
+            # Fila de partidas para workers distribuídos (ver job_queue.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS game_jobs (
+                    id TEXT PRIMARY KEY,
+                    batch_id TEXT NOT NULL,
+                    white TEXT NOT NULL,
+                    black TEXT NOT NULL,
+                    opening TEXT,
+                    game_num INTEGER,
+                    status TEXT NOT NULL,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER DEFAULT 0,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_game_jobs_status ON game_jobs (status, created_at)")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_game_jobs_batch ON game_jobs (batch_id)")
             conn.commit()
 
+    def save_move_metrics(self, columns, rows: List[tuple]):
+        """Grava um lote de linhas de telemetria numa única transação"""
+        placeholders = ", ".join("?" for _ in columns)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.executemany(
+                f"INSERT INTO move_metrics ({', '.join(columns)}) VALUES ({placeholders})", rows)
+            conn.commit()
+
+    def get_move_metrics(self, model: str = None, game_uid: str = None,
+                         limit: int = 10000) -> List[Dict[str, Any]]:
+        """Linhas mais recentes de telemetria, opcionalmente filtradas"""
+        query = "SELECT * FROM move_metrics"
+        conditions, params = [], []
+        if model:
+            conditions.append("model_name = ?")
+            params.append(model)
+        if game_uid:
+            conditions.append("game_uid = ?")
+            params.append(game_uid)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+
     def save_game(self, game_data: Dict[str, Any]) -> int:
         """Save a game to the database"""
         with sqlite3.connect(self.db_path) as conn:
@@ -99,7 +245,8 @@ class GameDatabase:
             ))
             game_id = cursor.lastrowid
             conn.commit()
-            return game_id
+        bump_write_generation()
+        return game_id
 
     def get_all_games(self) -> List[Dict[str, Any]]:
         with sqlite3.connect(self.db_path) as conn:
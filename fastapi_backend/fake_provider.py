@@ -0,0 +1,251 @@
+"""
+Provedor falso de chat para testes de carga da arena sem rede nem chaves.
+Simula latência (lognormal com cauda), erros, rajadas de 429 com
+retry-after, streaming e diferentes políticas de escolha de lance.
+
+Ativação pela variável FAKE_MODELS:
+- FAKE_MODELS=4  -> Fake-1 .. Fake-4 com as opções padrão
+- FAKE_MODELS="Fake-Fast:latency_ms=50,Fake-Engine:policy=engine;error_rate=0.02"
+  (modelos separados por vírgula, opções por ponto e vírgula)
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import chess
+
+FAKE_PROVIDER = "Fake"
+FAKE_POLICIES = ("random", "engine", "scripted")
+
+FEN_PATTERN = re.compile(
+    r'FEN\)?:\s*([rnbqkpRNBQKP1-8/]+ [wb] \S+ \S+ \d+ \d+)')
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3,
+                chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+EXPLANATION_WORDS = ("controla", "o", "centro", "desenvolve", "a", "peça", "e",
+                     "prepara", "o", "roque", "pressionando", "a", "ala", "do", "rei")
+
+# Opções aceitas por FakeChatModel (valores padrão)
+FAKE_DEFAULTS = {
+    "latency_ms": 300.0,          # mediana da latência até a resposta completa
+    "latency_sigma": 0.5,         # dispersão lognormal
+    "tail_rate": 0.0,             # fração de chamadas com latência de cauda
+    "tail_ms": 5000.0,
+    "error_rate": 0.0,            # erros genéricos (500)
+    "rate_limit_rate": 0.0,       # chance de uma chamada iniciar uma rajada de 429
+    "burst_seconds": 2.0,         # duração da rajada; retry-after informa o restante
+    "garble_rate": 0.0,           # respostas fora do formato "My move:"
+    "policy": "random",
+    "script": "",                 # lances SAN separados por espaço (policy=scripted)
+    "explanation_words": 30,
+    "stream_chunk_ms": 5.0,       # intervalo entre chunks no streaming
+    "temperature": 0.7,
+    "seed": None,
+}
+
+
+class FakeProviderError(Exception):
+    def __init__(self, message: str, status_code: int = 500, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        # Mesmo formato dos SDKs (exc.response.headers) lido por retry_after_seconds
+        self.response = _FakeHTTPResponse(status_code, headers or {})
+
+
+class _FakeHTTPResponse:
+    def __init__(self, status_code: int, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeMessage:
+    def __init__(self, content: str, usage_metadata: Optional[Dict[str, int]] = None):
+        self.content = content
+        self.usage_metadata = usage_metadata or {}
+        self.response_metadata = {"provider": FAKE_PROVIDER}
+
+
+class FakeChatModel:
+    """Interface mínima de um chat model LangChain (invoke/ainvoke/stream/astream)"""
+
+    def __init__(self, model_name: str = "Fake", http_client=None, http_async_client=None, **options):
+        unknown = set(options) - set(FAKE_DEFAULTS)
+        if unknown:
+            raise ValueError(
+                f"Opções desconhecidas para {model_name}: {', '.join(sorted(unknown))}")
+        config = {**FAKE_DEFAULTS, **options}
+        if config["policy"] not in FAKE_POLICIES:
+            raise ValueError(
+                f"Política inválida: {config['policy']} (use {', '.join(FAKE_POLICIES)})")
+        self.model_name = model_name
+        self.config = config
+        self.temperature = float(config["temperature"])
+        self.script = config["script"].split()
+        self._random = random.Random(config["seed"])
+        self._lock = threading.Lock()
+        self.burst_until = 0.0
+        self.calls = 0
+
+    # --- Simulação do provedor ---
+
+    def _plan(self, messages):
+        """Sorteia latência e falhas da chamada; retorna (latência, texto ou exceção)"""
+        with self._lock:
+            self.calls += 1
+            rnd = self._random
+            now = time.monotonic()
+            if now < self.burst_until:
+                return 0.01, self._rate_limited(self.burst_until - now)
+            if rnd.random() < float(self.config["rate_limit_rate"]):
+                self.burst_until = now + float(self.config["burst_seconds"])
+                return 0.01, self._rate_limited(float(self.config["burst_seconds"]))
+            latency = rnd.lognormvariate(0, float(self.config["latency_sigma"])) * \
+                float(self.config["latency_ms"]) / 1000
+            if rnd.random() < float(self.config["tail_rate"]):
+                latency = float(self.config["tail_ms"]) / 1000
+            if rnd.random() < float(self.config["error_rate"]):
+                return latency, FakeProviderError("Fake provider internal error")
+            return latency, self._answer(messages, rnd)
+
+    def _rate_limited(self, retry_after: float) -> FakeProviderError:
+        return FakeProviderError("Rate limit exceeded (429)", status_code=429,
+                                 headers={"retry-after": f"{max(retry_after, 0.01):.2f}"})
+
+    def _answer(self, messages, rnd: random.Random) -> str:
+        prompt = getattr(messages[-1], "content", str(messages[-1]))
+        match = FEN_PATTERN.search(prompt)
+        board = chess.Board(match.group(1)) if match else chess.Board()
+        move = self._choose(board, rnd)
+        if move is None:
+            return "My move: \"resign\"\nNão há lances legais."
+        san = board.san(move)
+        explanation = " ".join(rnd.choice(EXPLANATION_WORDS)
+                               for _ in range(int(self.config["explanation_words"])))
+        if rnd.random() < float(self.config["garble_rate"]):
+            return f"Acho que o melhor aqui é {san.lower()}, {explanation}"
+        return f"My move: \"{san}\"\n{explanation.capitalize()}."
+
+    def _choose(self, board: chess.Board, rnd: random.Random) -> Optional[chess.Move]:
+        legal_moves = list(board.legal_moves)
+        if not legal_moves:
+            return None
+        policy = self.config["policy"]
+        if policy == "scripted":
+            # Lance do roteiro para o ply atual; fora do roteiro, joga aleatório
+            ply = board.ply()
+            if ply < len(self.script):
+                try:
+                    return board.parse_san(self.script[ply])
+                except ValueError:
+                    pass
+        elif policy == "engine":
+            return max(legal_moves, key=lambda move: _score_move(board, move) + rnd.random() * 0.5)
+        return rnd.choice(legal_moves)
+
+    def _usage(self, messages, content: str) -> Dict[str, int]:
+        prompt_tokens = sum(len(getattr(m, "content", str(m)))
+                            for m in messages) // 4
+        completion_tokens = max(1, len(content) // 4)
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    # --- Interface LangChain ---
+
+    def invoke(self, messages, **kwargs) -> FakeMessage:
+        latency, outcome = self._plan(messages)
+        time.sleep(latency)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeMessage(outcome, self._usage(messages, outcome))
+
+    async def ainvoke(self, messages, **kwargs) -> FakeMessage:
+        latency, outcome = self._plan(messages)
+        await asyncio.sleep(latency)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeMessage(outcome, self._usage(messages, outcome))
+
+    def _chunks(self, content: str) -> List[str]:
+        # Aproxima tokens: palavras com o espaço seguinte
+        return re.findall(r'\S+\s*|\s+', content)
+
+    def stream(self, messages, **kwargs):
+        latency, outcome = self._plan(messages)
+        if isinstance(outcome, Exception):
+            time.sleep(latency)
+            raise outcome
+        chunks = self._chunks(outcome)
+        # Tempo até o primeiro token: parte da latência total
+        time.sleep(latency * 0.3)
+        for chunk in chunks[:-1]:
+            yield FakeMessage(chunk)
+            time.sleep(float(self.config["stream_chunk_ms"]) / 1000)
+        yield FakeMessage(chunks[-1], self._usage(messages, outcome))
+
+    async def astream(self, messages, **kwargs):
+        latency, outcome = self._plan(messages)
+        if isinstance(outcome, Exception):
+            await asyncio.sleep(latency)
+            raise outcome
+        chunks = self._chunks(outcome)
+        await asyncio.sleep(latency * 0.3)
+        for chunk in chunks[:-1]:
+            yield FakeMessage(chunk)
+            await asyncio.sleep(float(self.config["stream_chunk_ms"]) / 1000)
+        yield FakeMessage(chunks[-1], self._usage(messages, outcome))
+
+
+def _score_move(board: chess.Board, move: chess.Move) -> float:
+    """Avaliação de 1 ply de um motor fraco: material, xeque e mate"""
+    score = 0.0
+    captured = board.piece_type_at(move.to_square)
+    if captured:
+        score += PIECE_VALUES[captured]
+    elif board.is_en_passant(move):
+        score += 1
+    if move.promotion:
+        score += PIECE_VALUES[move.promotion] - 1
+    board.push(move)
+    try:
+        if board.is_checkmate():
+            return 1000.0
+        if board.is_check():
+            score += 0.3
+        # Penaliza deixar a peça movida en prise para um peão/peça menor
+        if board.is_attacked_by(board.turn, move.to_square) and \
+                not board.is_attacked_by(not board.turn, move.to_square):
+            score -= PIECE_VALUES[board.piece_type_at(move.to_square)]
+    finally:
+        board.pop()
+    return score
+
+
+def _parse_value(value: str) -> Any:
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_fake_models(spec: str) -> Dict[str, Dict[str, Any]]:
+    """Interpreta FAKE_MODELS em {nome: opções}"""
+    spec = spec.strip()
+    if not spec:
+        return {}
+    if spec.isdigit():
+        return {f"Fake-{i}": {} for i in range(1, int(spec) + 1)}
+    models = {}
+    for entry in spec.split(","):
+        name, _, options = entry.strip().partition(":")
+        if not name:
+            continue
+        models[name] = {}
+        for option in filter(None, options.split(";")):
+            key, _, value = option.partition("=")
+            models[name][key.strip()] = _parse_value(value.strip())
+    return models
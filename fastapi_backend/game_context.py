@@ -0,0 +1,124 @@
+"""
+Contexto incremental das partidas para os prompts dos LLMs.
+Mantém o histórico em SAN conforme os lances são jogados (um SAN por ply),
+em vez de exportar a partida inteira com chess.pgn a cada lance.
+"""
+
+import os
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+import chess
+
+from fastapi_backend.rate_limiter import estimate_tokens
+
+# full: histórico completo; last_n: últimos N plies + FEN; fen: só a posição
+CONTEXT_STRATEGIES = ("full", "last_n", "fen")
+DEFAULT_CONTEXT_STRATEGY = os.getenv("LLM_CONTEXT_STRATEGY", "full")
+DEFAULT_LAST_N_PLIES = int(os.getenv("LLM_CONTEXT_LAST_N", "12"))
+
+# Orçamento de tokens do contexto por provedor. Se o histórico completo
+# estourar, o builder cai para last_n e depois para fen.
+CONTEXT_TOKEN_BUDGETS = {
+    "OpenAI": 2000,
+    "Google": 2000,
+    "Anthropic": 2000,
+    "DeepSeek": 1500,
+    "Groq": 1000,
+    "Fake": 2000,
+    "Unknown": 1000,
+}
+
+LEGAL_MOVES_SHOWN = 20
+
+
+class GameContextBuilder:
+    """Histórico de uma partida em SAN, atualizado a cada lance"""
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.plies = 0
+        # Tokens estimados de cada prompt gerado, por modelo
+        self.prompt_tokens: Dict[str, List[int]] = {}
+        self.strategies_used: Dict[str, int] = {}
+
+    @classmethod
+    def from_board(cls, board: chess.Board) -> "GameContextBuilder":
+        """Reconstrói o histórico de um tabuleiro já jogado (uso avulso)"""
+        builder = cls()
+        replay = board.root()
+        for move in board.move_stack:
+            builder.push(replay, move)
+            replay.push(move)
+        return builder
+
+    def push(self, board: chess.Board, move: chess.Move):
+        """Registra o lance; deve ser chamado ANTES de board.push(move)"""
+        san = board.san(move)
+        if board.turn == chess.WHITE:
+            self.tokens.append(f"{board.fullmove_number}. {san}")
+        elif not self.tokens:
+            self.tokens.append(f"{board.fullmove_number}... {san}")
+        else:
+            self.tokens.append(san)
+        self.plies += 1
+
+    def history(self, last_n: Optional[int] = None) -> str:
+        if last_n is None or last_n >= len(self.tokens):
+            return " ".join(self.tokens)
+        recent = self.tokens[-last_n:]
+        # Garante o número do lance no primeiro token recortado
+        if not recent[0][0].isdigit():
+            recent = ["..."] + recent
+        return " ".join(recent)
+
+    def build(self, board: chess.Board, last_move: str = None, model_name: str = "",
+              strategy: str = DEFAULT_CONTEXT_STRATEGY, token_budget: Optional[int] = None,
+              last_n: int = DEFAULT_LAST_N_PLIES) -> str:
+        if strategy not in CONTEXT_STRATEGIES:
+            strategy = "full"
+        legal_moves = [board.san(move) for move in islice(
+            board.legal_moves, LEGAL_MOVES_SHOWN + 1)]
+        more = "..." if len(legal_moves) > LEGAL_MOVES_SHOWN else ""
+        fallbacks = CONTEXT_STRATEGIES[CONTEXT_STRATEGIES.index(strategy):]
+        for current in fallbacks:
+            context = self._render(board, last_move, current, last_n,
+                                   legal_moves[:LEGAL_MOVES_SHOWN], more)
+            tokens = estimate_tokens(context)
+            if token_budget is None or tokens <= token_budget or current == "fen":
+                break
+        self.prompt_tokens.setdefault(model_name, []).append(tokens)
+        self.strategies_used[current] = self.strategies_used.get(
+            current, 0) + 1
+        return context
+
+    def _render(self, board: chess.Board, last_move: Optional[str], strategy: str,
+                last_n: int, legal_moves: List[str], more: str) -> str:
+        if strategy == "full":
+            history = self.history()
+        elif strategy == "last_n":
+            history = f"(last {last_n} plies) {self.history(last_n)}"
+        else:
+            history = "(omitted; use the FEN position)"
+        return f"""
+        Game History:
+        {history}
+        Last move played: {last_move or 'Game start'}
+        Current position (FEN): {board.fen()}
+        Legal moves available: {', '.join(legal_moves)}{more}
+        Find the best move for this position.
+        """
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "plies": self.plies,
+            "strategies": self.strategies_used,
+            "prompt_tokens": {
+                model: {
+                    "prompts": len(counts),
+                    "total": sum(counts),
+                    "max": max(counts) if counts else 0,
+                }
+                for model, counts in self.prompt_tokens.items()
+            }
+        }
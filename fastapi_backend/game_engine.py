@@ -3,74 +3,349 @@ Engine de partidas de xadrez para o LLM Chess Arena.
 Migrado de tests_streamlit/src/game_engine.py
 """
 
+import asyncio
+import os
+import time
 import chess
 import chess.pgn
 from typing import Optional, Dict, Any, List
 import re
 from datetime import datetime
-from fastapi_backend.models_manager import ModelManager
+from fastapi_backend.models_manager import get_model_manager
+from fastapi_backend.hedging import HEDGE_ENABLED, get_hedge_policy
+from fastapi_backend.game_context import (
+    CONTEXT_TOKEN_BUDGETS, DEFAULT_CONTEXT_STRATEGY, DEFAULT_LAST_N_PLIES, GameContextBuilder)
+from fastapi_backend.llm_cache import CacheMiss, get_response_cache
+from fastapi_backend.llm_streaming import STREAM_MOVES, astream_move, stream_move
+from fastapi_backend.opening_book import book_plies, opening_moves
+from fastapi_backend.adjudication import Adjudication, Adjudicator
+from fastapi_backend.move_parser import (
+    LegalMoveIndex, extract_move, record_fallback, record_parse, record_retry)
+from fastapi_backend.telemetry import (
+    MOVE_TELEMETRY_ENABLED, GameTelemetry, MoveProbe, get_move_telemetry)
+from fastapi_backend.rate_limiter import (
+    COMPLETION_TOKENS_ESTIMATE, estimate_tokens, get_rate_limiter,
+    is_rate_limit_error, retry_after_seconds)
+
+# Tempo máximo por chamada ao LLM (segundos) no loop assíncrono
+MOVE_TIMEOUT_SECONDS = float(os.getenv("MAX_MOVE_TIME_SECONDS", "30"))
+# 429 seguidos tolerados por lance antes de abandonar a partida (sem lance falso)
+MAX_RATE_LIMIT_RETRIES = 8
+
+
+class MoveAttempts:
+    """
+    Tentativas de um lance: contexto/prompt, retries, backoff em 429, parsing
+    e fallback. Comum a get_ai_move e aget_ai_move, que só diferem na chamada
+    ao modelo. result fica preenchido quando não há mais o que tentar.
+    """
+
+    def __init__(self, engine: "GameEngine", board: chess.Board, model_name: str, last_move: str,
+                 context: GameContextBuilder, probe: MoveProbe, max_retries: int, max_rate_limit_retries: int):
+        self.engine = engine
+        self.board = board
+        self.model_name = model_name
+        self.probe = probe
+        self.max_retries = max_retries
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.attempt = 0
+        self.throttled = 0
+        self.result = None
+        self.model = engine._get_model(model_name)
+        if not self.model:
+            self.result = (None, None)
+            return
+        prompt = engine._get_prompt(board)
+        if not prompt:
+            probe.fallback = True
+            self.result = engine._fallback_move(board)
+            return
+        game_context = engine._prepare_game_context(board, last_move, context, model_name)
+        self.messages = prompt.format_messages(input=game_context)
+        probe.set_messages(self.messages)
+        self.limiter = get_rate_limiter(engine.model_manager._get_provider(model_name))
+        self.estimated_tokens = estimate_tokens(game_context) + COMPLETION_TOKENS_ESTIMATE
+        # Lances legais indexados uma vez por posição, reaproveitados nas tentativas
+        self.legal_index = LegalMoveIndex(board)
+
+    def pending(self) -> bool:
+        if self.result is None and self.attempt >= self.max_retries:
+            record_fallback(self.model_name)
+            self.probe.fallback = True
+            self.result = self.engine._fallback_move(self.board)
+        return self.result is None
+
+    def on_failure(self):
+        """Erro ou timeout: gasta uma tentativa"""
+        self.probe.observe_error()
+        self.attempt += 1
+
+    def on_error(self, error: Exception):
+        if not is_rate_limit_error(error):
+            print(f"Error getting move from {self.model_name}: {error}")
+            self.on_failure()
+            return
+        # 429 não conta como tentativa: espera o backoff e tenta de novo
+        self.throttled += 1
+        self.probe.rate_limited += 1
+        delay = self.limiter.on_rate_limited(retry_after_seconds(error))
+        print(
+            f"Rate limit from {self.model_name}, backing off {delay:.1f}s")
+        if self.throttled > self.max_rate_limit_retries:
+            self.result = (None, None)
+
+    def on_response(self, response):
+        self.probe.observe_response(response)
+        move, explicacao = self.engine._parse_response(
+            response, self.board, self.legal_index, self.model_name)
+        if move:
+            self.result = (move, explicacao)
+            return
+        self.probe.parse_failures += 1
+        self.attempt += 1
+        if self.attempt < self.max_retries:
+            record_retry(self.model_name)
+
+
+class GameRun:
+    """Partida em andamento: tabuleiro, PGN, contexto, telemetria e adjudicação"""
+
+    def __init__(self, white_model: str, black_model: str, board: chess.Board, game):
+        self.white_model = white_model
+        self.black_model = black_model
+        self.board = board
+        self.game = game
+        self.node = game
+        self.context = GameContextBuilder()
+        self.telemetry = GameTelemetry(get_move_telemetry()) if MOVE_TELEMETRY_ENABLED else None
+        self.adjudicator = Adjudicator()
+        self.adjudication = None
+        self.last_move = None
+        self.move_count = 0
+
+    def model_to_move(self) -> str:
+        return self.black_model if self.board.turn == chess.BLACK else self.white_model
+
+    def finished(self, adjudication: Optional[Adjudication]) -> bool:
+        self.adjudication = adjudication
+        return adjudication is not None or self.board.is_game_over()
+
+    def push(self, move: chess.Move):
+        """Aplica o lance no tabuleiro, no PGN e no contexto"""
+        self.last_move = self.board.san(move)
+        self.context.push(self.board, move)
+        self.board.push(move)
+        self.node = self.node.add_variation(move)
+
+    def play(self, move: chess.Move, on_move=None):
+        """Lance do LLM: conta em move_count e avisa on_move(board, san)"""
+        self.push(move)
+        self.move_count += 1
+        if on_move:
+            on_move(self.board, self.last_move)
 
 
 class GameEngine:
     """Handles chess game logic and AI move generation (backend version)"""
 
     def __init__(self):
-        self.model_manager = ModelManager()
-        self.judge_model = None
+        self.model_manager = get_model_manager()
+        self.response_cache = get_response_cache()
+        self.hedge_policy = get_hedge_policy()
+        self.judge_model_name = None
         self._initialize_judge()
 
     def _initialize_judge(self):
         """Initialize the judge model for move validation"""
+        # Só escolhe o nome: o cliente é criado no primeiro acesso a judge_model
         available_models = self.model_manager.get_available_models()
         for preferred in ["Llama3-70B", "Mixtral-8x7B"]:
             if preferred in available_models:
-                self.judge_model = self.model_manager.get_model(preferred)
+                self.judge_model_name = preferred
                 return
         if available_models:
-            self.judge_model = self.model_manager.get_model(
-                list(available_models.keys())[0])
+            self.judge_model_name = list(available_models.keys())[0]
 
-    def get_ai_move(self, board: chess.Board, model_name: str, last_move: str = None, max_retries: int = 3):
+    @property
+    def judge_model(self):
+        if not self.judge_model_name:
+            return None
+        return self.model_manager.get_model(self.judge_model_name)
+
+    def get_ai_move(self, board: chess.Board, model_name: str, last_move: str = None, max_retries: int = 3,
+                    max_rate_limit_retries: int = MAX_RATE_LIMIT_RETRIES, context: GameContextBuilder = None,
+                    telemetry: GameTelemetry = None):
         """Get a move and explanation from an AI model (stub for backend)"""
-        model = self.model_manager.get_model(model_name)
-        if not model:
-            return None, None
-        color = "white" if board.turn == chess.WHITE else "black"
-        prompt = self.model_manager.get_chess_prompt(color)
-        if not prompt:
-            legal_moves = list(board.legal_moves)
-            if legal_moves:
-                return legal_moves[0], "(Fallback: lance aleatório)"
-            return None, None
-        game_context = self._prepare_game_context(board, last_move)
-        for attempt in range(max_retries):
+        probe = MoveProbe(model_name, self.model_manager._get_provider(model_name))
+        move, explicacao = self._get_ai_move(
+            board, model_name, last_move, max_retries, max_rate_limit_retries, context, probe)
+        if telemetry is not None:
+            telemetry.record(board, move, probe)
+        return move, explicacao
+
+    def _get_ai_move(self, board: chess.Board, model_name: str, last_move: str, max_retries: int,
+                     max_rate_limit_retries: int, context: GameContextBuilder, probe: MoveProbe):
+        attempts = MoveAttempts(self, board, model_name, last_move, context, probe, max_retries,
+                                max_rate_limit_retries)
+        while attempts.pending():
+            try:
+                response = self._invoke_model(
+                    model_name, attempts.model, attempts.messages, attempts.attempt, attempts.limiter,
+                    attempts.estimated_tokens, attempts.legal_index)
+            except CacheMiss:
+                raise
+            except Exception as e:
+                attempts.on_error(e)
+                continue
+            attempts.on_response(response)
+        return attempts.result
+
+    async def aget_ai_move(self, board: chess.Board, model_name: str, last_move: str = None,
+                           max_retries: int = 3, move_timeout: float = MOVE_TIMEOUT_SECONDS,
+                           max_rate_limit_retries: int = MAX_RATE_LIMIT_RETRIES,
+                           context: GameContextBuilder = None, telemetry: GameTelemetry = None):
+        """Versão assíncrona de get_ai_move: usa model.ainvoke com timeout por lance"""
+        probe = MoveProbe(model_name, self.model_manager._get_provider(model_name))
+        move, explicacao = await self._aget_ai_move(
+            board, model_name, last_move, max_retries, move_timeout, max_rate_limit_retries, context, probe)
+        if telemetry is not None:
+            telemetry.record(board, move, probe)
+        return move, explicacao
+
+    async def _aget_ai_move(self, board: chess.Board, model_name: str, last_move: str, max_retries: int,
+                            move_timeout: float, max_rate_limit_retries: int,
+                            context: GameContextBuilder, probe: MoveProbe):
+        attempts = MoveAttempts(self, board, model_name, last_move, context, probe, max_retries,
+                                max_rate_limit_retries)
+        while attempts.pending():
             try:
-                response = model.invoke(
-                    prompt.format_messages(input=game_context))
-                resposta_texto = response.content.strip() if hasattr(
-                    response, 'content') else str(response)
-                move = self._extract_move_from_response(resposta_texto, board)
-                explicacao = self._extract_explanation_from_response(
-                    resposta_texto)
-                if move:
-                    return move, explicacao
+                response = await self._ainvoke_model(
+                    model_name, attempts.model, attempts.messages, attempts.attempt, attempts.limiter,
+                    attempts.estimated_tokens, move_timeout, attempts.legal_index)
+            except CacheMiss:
+                raise
+            except asyncio.TimeoutError:
+                print(
+                    f"Timeout getting move from {model_name} after {move_timeout}s")
+                attempts.on_failure()
+                continue
             except Exception as e:
-                print(f"Error getting move from {model_name}: {e}")
+                attempts.on_error(e)
                 continue
+            attempts.on_response(response)
+        return attempts.result
+
+    def _invoke_model(self, model_name: str, model, messages, attempt: int, limiter, estimated_tokens: int,
+                      legal_index: LegalMoveIndex = None):
+        """Chamada ao LLM passando pelo cache de respostas e pelo limitador de taxa"""
+        cache_key = self.response_cache.key(
+            model_name, model, messages, attempt)
+        cached = self.response_cache.lookup(cache_key, model)
+        if cached is not None:
+            return cached
+        limiter.acquire(estimated_tokens)
+        if legal_index is not None and self._should_stream(model_name, model):
+            # Uso e cache são registrados quando o stream termina (ou é cortado)
+            return stream_move(model_name, model, messages, legal_index, on_complete=self._stream_completed(
+                cache_key, model_name, model, limiter, estimated_tokens))
+        response = model.invoke(messages)
+        self._record_success(limiter, response, estimated_tokens)
+        self.response_cache.store(cache_key, model_name, model, response)
+        return response
+
+    async def _ainvoke_model(self, model_name: str, model, messages, attempt: int, limiter,
+                             estimated_tokens: int, move_timeout: float, legal_index: LegalMoveIndex = None):
+        cache_key = self.response_cache.key(
+            model_name, model, messages, attempt)
+        # LRU em memória no loop; leitura em disco numa thread
+        cached = await self.response_cache.alookup(cache_key, model)
+        if cached is not None:
+            return cached
+        await limiter.aacquire(estimated_tokens)
+        stream = legal_index is not None and self._should_stream(
+            model_name, model)
+
+        async def request(extra: bool):
+            if extra:
+                # A duplicata do hedge também consome o orçamento do provedor
+                await limiter.aacquire(estimated_tokens)
+            if stream:
+                # Com streaming a resposta volta quando o lance aparece, não no fim da explicação
+                return await astream_move(model_name, model, messages, legal_index, on_complete=self._stream_completed(
+                    cache_key, model_name, model, limiter, estimated_tokens, background=True))
+            response = await self._ainvoke(model, messages)
+            self._record_success(limiter, response, estimated_tokens)
+            self.response_cache.store(cache_key, model_name, model, response, background=True)
+            return response
+
+        def accept(response) -> bool:
+            if legal_index is None:
+                return True
+            return extract_move(getattr(response, "content", str(response)), legal_index)[0] is not None
+
+        # O timeout vale só para a chamada ao provedor (com duplicatas), não para a espera do limitador
+        return await asyncio.wait_for(self.hedge_policy.call(
+            model_name, request, accept, estimated_tokens,
+            enabled=self._should_hedge(model_name, limiter)), timeout=move_timeout)
+
+    def _record_success(self, limiter, response, estimated_tokens: int):
+        metadata = getattr(response, "response_metadata", None) or {}
+        usage = getattr(response, "usage_metadata", None) or {}
+        limiter.on_success(metadata.get("headers"))
+        limiter.record_usage(estimated_tokens, usage.get("total_tokens"))
+
+    def _should_stream(self, model_name: str, model) -> bool:
+        config = self.model_manager.model_configs.get(model_name, {})
+        return config.get("stream", STREAM_MOVES) and hasattr(model, "stream")
+
+    def _should_hedge(self, model_name: str, limiter) -> bool:
+        config = self.model_manager.model_configs.get(model_name, {})
+        # Provedor em backoff: a duplicata só esperaria o mesmo bloqueio
+        return config.get("hedge", HEDGE_ENABLED) and limiter.blocked_until <= time.monotonic()
+
+    def _stream_completed(self, cache_key: str, model_name: str, model, limiter, estimated_tokens: int,
+                          background: bool = False):
+        def completed(response):
+            self._record_success(limiter, response, estimated_tokens)
+            self.response_cache.store(cache_key, model_name, model, response, background=background)
+        return completed
+
+    async def _ainvoke(self, model, messages):
+        # Modelos sem API assíncrona rodam em thread para não travar o event loop
+        if hasattr(model, "ainvoke"):
+            return await model.ainvoke(messages)
+        return await asyncio.to_thread(model.invoke, messages)
+
+    def _get_model(self, model_name: str):
+        model = self.model_manager.get_model(model_name)
+        if model is None:
+            # Replay offline: modelos gravados respondem sem chave de API
+            model = self.response_cache.replay_model(model_name)
+        return model
+
+    def _get_prompt(self, board: chess.Board):
+        color = "white" if board.turn == chess.WHITE else "black"
+        return self.model_manager.get_chess_prompt(color)
+
+    def _parse_response(self, response, board: chess.Board, legal_index: LegalMoveIndex = None,
+                        model_name: str = ""):
+        resposta_texto = response.content.strip() if hasattr(
+            response, 'content') else str(response)
+        move, method = extract_move(
+            resposta_texto, legal_index or LegalMoveIndex(board))
+        record_parse(model_name, method)
+        explicacao = self._extract_explanation_from_response(resposta_texto)
+        return move, explicacao
+
+    def _fallback_move(self, board: chess.Board):
         legal_moves = list(board.legal_moves)
         if legal_moves:
             return legal_moves[0], "(Fallback: lance aleatório)"
         return None, None
 
-    def _extract_move_from_response(self, resposta, board):
-        match = re.search(r'My move:\s*["\']?([^\n"\']+)["\']?', resposta)
-        if match:
-            move_san = match.group(1).strip()
-            try:
-                return board.parse_san(move_san)
-            except Exception:
-                return None
-        return None
+    def _extract_move_from_response(self, resposta, board, legal_index: LegalMoveIndex = None):
+        move, _ = extract_move(resposta, legal_index or LegalMoveIndex(board))
+        return move
 
     def _extract_explanation_from_response(self, resposta):
         match = re.search(
@@ -82,65 +357,124 @@ class GameEngine:
             return parts[1].strip()
         return resposta.strip()
 
-    def _prepare_game_context(self, board: chess.Board, last_move: str = None) -> str:
-        game_temp = chess.pgn.Game.from_board(board)
-        history = str(game_temp)
-        pattern = r".*?(?=1\.)"
-        history = re.sub(pattern, "", history, flags=re.DOTALL)
-        legal_moves = [board.san(move) for move in board.legal_moves]
-        context = f"""
-        Game History:
-        {history}
-        Last move played: {last_move or 'Game start'}
-        Current position (FEN): {board.fen()}
-        Legal moves available: {', '.join(legal_moves[:20])}{'...' if len(legal_moves) > 20 else ''}
-        Find the best move for this position.
-        """
-        return context
+    def _prepare_game_context(self, board: chess.Board, last_move: str = None,
+                              context: GameContextBuilder = None, model_name: str = "") -> str:
+        if context is None:
+            # Chamada avulsa (sem partida em andamento): reconstrói o histórico uma vez
+            context = GameContextBuilder.from_board(board)
+        strategy, token_budget, last_n = self._context_settings(model_name)
+        return context.build(board, last_move, model_name=model_name, strategy=strategy,
+                             token_budget=token_budget, last_n=last_n)
 
-    def play_game(self, white_model: str, black_model: str, opening: str = "1. e4", max_moves: int = 200) -> Dict[str, Any]:
-        """Play a complete game between two models (backend version)"""
+    def _context_settings(self, model_name: str):
+        """Estratégia de contexto do modelo (model_configs) e orçamento do provedor"""
+        config = self.model_manager.model_configs.get(model_name, {})
+        provider = self.model_manager._get_provider(model_name)
+        budget = config.get("context_token_budget", CONTEXT_TOKEN_BUDGETS.get(
+            provider, CONTEXT_TOKEN_BUDGETS["Unknown"]))
+        return (config.get("context_strategy", DEFAULT_CONTEXT_STRATEGY), budget,
+                config.get("context_last_n", DEFAULT_LAST_N_PLIES))
+
+    def _new_game(self, white_model: str, black_model: str):
         board = chess.Board()
         game = chess.pgn.Game()
-        node = game
         game.headers["White"] = white_model
         game.headers["Black"] = black_model
         game.headers["Date"] = datetime.now().strftime("%Y.%m.%d")
         game.headers["Event"] = "LLM Chess Arena"
-        # Play opening move
-        opening_move = opening.split()[-1]
-        try:
-            move = board.parse_san(opening_move)
-            board.push(move)
-            node = node.add_variation(move)
-        except ValueError:
-            move = board.parse_san("e4")
-            board.push(move)
-            node = node.add_variation(move)
-        last_move = opening
-        move_count = 0
-        # Game loop
-        while not board.is_game_over() and move_count < max_moves:
-            current_model = black_model if board.turn == chess.BLACK else white_model
-            move, explicacao = self.get_ai_move(
-                board, current_model, last_move=last_move)
-            if move:
-                board.push(move)
-                node = node.add_variation(move)
-                last_move = board.san(move)
-                move_count += 1
-            else:
-                break
-        result = board.result()
+        return board, game
+
+    def _start_run(self, white_model: str, black_model: str, opening: str, game_num: int,
+                   initial_moves: List[str]) -> "GameRun":
+        board, game = self._new_game(white_model, black_model)
+        run = GameRun(white_model, black_model, board, game)
+        self._play_opening(run, opening, game_num, initial_moves)
+        return run
+
+    def _play_opening(self, run: "GameRun", opening: str, game_num: int, initial_moves: List[str]):
+        """
+        Lances de livro (ver opening_book.py) jogados para os dois lados sem
+        chamar o LLM, ou os lances do checkpoint ao retomar. move_count conta
+        só os lances já jogados fora do livro.
+        """
+        book = opening_moves(opening, game_num) or [chess.Move.from_uci("e2e4")]
+        run.game.headers["Opening"] = chess.Board().variation_san(book)
+        if initial_moves:
+            self._resume_moves(run, initial_moves)
+            run.move_count = len(initial_moves) - book_plies(book, initial_moves)
+        else:
+            self._resume_moves(run, [move.uci() for move in book])
+
+    def _resume_moves(self, run: "GameRun", moves: List[str]):
+        """Reaplica lances UCI (checkpoint ou livro) sem chamar on_move"""
+        for uci in moves:
+            run.push(chess.Move.from_uci(uci))
+
+    def _finish_game(self, run: "GameRun"):
+        board, game, adjudication = run.board, run.game, run.adjudication
+        result = adjudication.result if adjudication else board.result()
         game.headers["Result"] = result
-        return {
+        if adjudication:
+            game.headers["Termination"] = "adjudication"
+            game.headers["Adjudication"] = adjudication.reason
+        finished = {
             "pgn": str(game),
             "result": result,
-            "moves": move_count,
-            "white": white_model,
-            "black": black_model,
+            "moves": run.move_count,
+            "white": run.white_model,
+            "black": run.black_model,
             "fen": board.fen(),
+            "opening": game.headers.get("Opening"),
+            "adjudication": adjudication.reason if adjudication else None,
+            # Só os lances em SAN (sem números, cabeçalhos nem comentários)
+            "san_moves": [token.split(" ")[-1] for token in run.context.tokens],
+            "context": run.context.summary(),
         }
+        if run.telemetry is not None:
+            # As linhas já foram para o buffer compartilhado a cada lance
+            finished["telemetry"] = run.telemetry.summary()
+        return finished
+
+    def play_game(self, white_model: str, black_model: str, opening: str = "1. e4", max_moves: int = 200,
+                  initial_moves: List[str] = None, on_move=None, game_num: int = 1) -> Dict[str, Any]:
+        """
+        Play a complete game between two models (backend version).
+        initial_moves (UCI, abertura inclusa) retoma uma partida de um checkpoint;
+        on_move(board, san) é chamado depois de cada lance. game_num escolhe a
+        linha em suítes de abertura.
+        """
+        run = self._start_run(white_model, black_model, opening, game_num, initial_moves)
+        while run.move_count < max_moves:
+            # Posição decidida (empate reclamável, tablebase, avaliação): sem mais chamadas ao LLM
+            if run.finished(run.adjudicator.check(run.board)):
+                break
+            move, _ = self.get_ai_move(
+                run.board, run.model_to_move(), last_move=run.last_move, context=run.context,
+                telemetry=run.telemetry)
+            if not move:
+                break
+            run.play(move, on_move)
+        return self._finish_game(run)
+
+    async def aplay_game(self, white_model: str, black_model: str, opening: str = "1. e4",
+                         max_moves: int = 200, move_timeout: float = MOVE_TIMEOUT_SECONDS,
+                         initial_moves: List[str] = None, on_move=None, game_num: int = 1) -> Dict[str, Any]:
+        """
+        Versão assíncrona de play_game. Cada lance aguarda model.ainvoke,
+        então várias partidas e o tráfego HTTP dividem o mesmo event loop.
+        Cancelar a task interrompe a partida no lance em andamento.
+        """
+        run = self._start_run(white_model, black_model, opening, game_num, initial_moves)
+        while run.move_count < max_moves:
+            if run.finished(await run.adjudicator.acheck(run.board)):
+                break
+            move, _ = await self.aget_ai_move(
+                run.board, run.model_to_move(), last_move=run.last_move, move_timeout=move_timeout,
+                context=run.context, telemetry=run.telemetry)
+            if not move:
+                break
+            run.play(move, on_move)
+        return self._finish_game(run)
 
     def start_game(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """
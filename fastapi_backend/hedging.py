@@ -0,0 +1,198 @@
+"""
+Requisições "hedged" para cortar a cauda de latência dos lances.
+Se a chamada ao LLM não devolveu um lance legal dentro do p90 observado do
+modelo, uma requisição duplicada é disparada; a primeira resposta legal
+vence e as demais são canceladas. O gasto extra fica registrado por modelo.
+
+Variáveis de ambiente:
+- LLM_HEDGE: liga o hedging para todos os modelos (model_configs["hedge"] sobrepõe)
+- LLM_HEDGE_QUANTILE: quantil da latência que dispara a duplicata (0.9)
+- LLM_HEDGE_MIN_SAMPLES: amostras necessárias antes de hedgear (20)
+- LLM_HEDGE_MAX_EXTRA: duplicatas por lance (1)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.9"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_EXTRA = int(os.getenv("LLM_HEDGE_MAX_EXTRA", "1"))
+# Janela de latências guardada por modelo
+LATENCY_WINDOW = 500
+# Nunca dispara duplicata antes disso, mesmo com modelos muito rápidos
+MIN_HEDGE_DELAY = 0.25
+
+
+class LatencyHistogram:
+    """Últimas latências (segundos) de um modelo em janela deslizante"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        def rounded(q):
+            value = self.quantile(q)
+            return round(value, 3) if value is not None else None
+        return {"samples": len(self.samples), "p50": rounded(0.5),
+                "p90": rounded(0.9), "p99": rounded(0.99)}
+
+
+class HedgeStats:
+    def __init__(self):
+        self.calls = 0
+        self.hedged_calls = 0
+        self.extra_requests = 0
+        self.extra_tokens_estimated = 0
+        self.hedge_wins = 0
+        self.cancelled = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged_calls": self.hedged_calls,
+            "hedge_rate": round(self.hedged_calls / self.calls, 4) if self.calls else 0.0,
+            "extra_requests": self.extra_requests,
+            "extra_tokens_estimated": self.extra_tokens_estimated,
+            "hedge_wins": self.hedge_wins,
+            "cancelled": self.cancelled,
+        }
+
+
+class HedgePolicy:
+    def __init__(self, quantile: float = HEDGE_QUANTILE, min_samples: int = HEDGE_MIN_SAMPLES,
+                 max_extra: int = HEDGE_MAX_EXTRA):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_extra = max_extra
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.stats: Dict[str, HedgeStats] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model_name: str, seconds: float):
+        with self._lock:
+            self.histograms.setdefault(
+                model_name, LatencyHistogram()).observe(seconds)
+
+    def hedge_delay(self, model_name: str) -> Optional[float]:
+        """Espera antes da duplicata, ou None enquanto não há amostras suficientes"""
+        with self._lock:
+            histogram = self.histograms.get(model_name)
+            if histogram is None or len(histogram.samples) < self.min_samples:
+                return None
+            return max(MIN_HEDGE_DELAY, histogram.quantile(self.quantile))
+
+    def _stats_for(self, model_name: str) -> HedgeStats:
+        if model_name not in self.stats:
+            self.stats[model_name] = HedgeStats()
+        return self.stats[model_name]
+
+    async def call(self, model_name: str, request: Callable[[bool], Awaitable[Any]],
+                   accept: Callable[[Any], bool], estimated_tokens: int = 0,
+                   enabled: bool = True):
+        """
+        Executa request(False) e, se passar do atraso de hedge sem resposta
+        aceita, dispara request(True) (a duplicata passa pelo limitador).
+        Retorna a primeira resposta aceita; se nenhuma for aceita, a última
+        resposta recebida ou a primeira exceção.
+        """
+        delay = self.hedge_delay(model_name) if enabled else None
+        with self._lock:
+            self._stats_for(model_name).calls += 1
+        started = {}
+        tasks = []
+
+        def launch(extra: bool):
+            task = asyncio.ensure_future(request(extra))
+            started[task] = time.monotonic()
+            tasks.append(task)
+
+        launch(False)
+        pending = set(tasks)
+        last_response = None
+        first_error = None
+        extra_fired = 0
+        try:
+            while pending:
+                can_hedge = delay is not None and extra_fired < self.max_extra
+                done, pending = await asyncio.wait(
+                    pending, timeout=delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Nenhuma resposta dentro do p90: dispara a duplicata
+                    extra_fired += 1
+                    self._record_extra(model_name, extra_fired,
+                                       estimated_tokens)
+                    launch(True)
+                    pending.add(tasks[-1])
+                    continue
+                for task in done:
+                    if task.exception() is not None:
+                        # Erros rápidos (429, por exemplo) não entram no histograma
+                        first_error = first_error or task.exception()
+                        continue
+                    self.observe(model_name, time.monotonic() - started[task])
+                    last_response = task.result()
+                    if accept(last_response):
+                        if task is not tasks[0]:
+                            with self._lock:
+                                self._stats_for(model_name).hedge_wins += 1
+                        return last_response
+        finally:
+            self._cancel(model_name, pending, started)
+        if last_response is None and first_error is not None:
+            raise first_error
+        return last_response
+
+    def _record_extra(self, model_name: str, extra_fired: int, estimated_tokens: int):
+        with self._lock:
+            stats = self._stats_for(model_name)
+            if extra_fired == 1:
+                stats.hedged_calls += 1
+            stats.extra_requests += 1
+            stats.extra_tokens_estimated += estimated_tokens
+
+    def _cancel(self, model_name: str, pending, started):
+        now = time.monotonic()
+        for task in pending:
+            task.cancel()
+            # Latência censurada: o perdedor levaria pelo menos esse tempo
+            self.observe(model_name, now - started[task])
+        if pending:
+            with self._lock:
+                self._stats_for(model_name).cancelled += len(pending)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "quantile": self.quantile,
+                "min_samples": self.min_samples,
+                "max_extra": self.max_extra,
+                "models": {
+                    name: {
+                        "latency": histogram.to_dict(),
+                        **self._stats_for(name).to_dict(),
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+
+_hedge_policy = HedgePolicy()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    return _hedge_policy
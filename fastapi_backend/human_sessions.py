@@ -0,0 +1,470 @@
+"""
+Sessões de partidas humano vs LLM.
+Cada sessão guarda só o essencial (lances UCI, SANs e FEN atual) em um
+objeto com __slots__; o tabuleiro python-chess é reconstruído dos lances
+quando preciso. Lances do jogador são validados pelo python-chess (UCI ou
+SAN) e a resposta do LLM roda numa task assíncrona, sem prender o request.
+
+Memória limitada: sessões paradas há mais de HUMAN_SESSION_TTL_SECONDS, ou
+as menos recentes além de HUMAN_SESSION_MAX, são gravadas na tabela games
+(com PGN) e saem da memória.
+
+Com estado compartilhado (ARENA_STATE_BACKEND=sqlite) o backend é a fonte
+da verdade: cada consulta relê a sessão, cada lance é gravado com
+compare-and-set no número de lances e só o worker que segura a trava
+"human-reply:<id>" pede o lance ao LLM.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import chess
+
+from fastapi_backend.move_parser import LegalMoveIndex
+from fastapi_backend.pgn_builder import PgnBuilder
+
+HUMAN_SESSION_TTL_SECONDS = float(os.getenv("HUMAN_SESSION_TTL_SECONDS", "1800"))
+HUMAN_SESSION_MAX = int(os.getenv("HUMAN_SESSION_MAX", "5000"))
+HUMAN_SESSION_SWEEP_SECONDS = float(os.getenv("HUMAN_SESSION_SWEEP_SECONDS", "60"))
+# Validade da trava de resposta do LLM (renovada enquanto o worker estiver vivo)
+HUMAN_REPLY_CLAIM_SECONDS = float(os.getenv("HUMAN_REPLY_CLAIM_SECONDS", "60"))
+
+PLAYING = "playing"
+FINISHED = "finished"
+HUMAN = "Human"
+
+UpdateCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class IllegalMove(ValueError):
+    pass
+
+
+class HumanSession:
+    __slots__ = ("id", "white_player", "black_player", "status", "moves", "san_moves", "fen",
+                 "result", "termination", "created_at", "updated_at", "last_seen", "error",
+                 "archived", "reply_task")
+
+    def __init__(self, session_id: str, white_player: str, black_player: str):
+        self.id = session_id
+        self.white_player = white_player
+        self.black_player = black_player
+        self.status = PLAYING
+        self.moves: List[str] = []
+        self.san_moves: List[str] = []
+        self.fen = chess.STARTING_FEN
+        self.result = None
+        self.termination = None
+        self.created_at = datetime.now()
+        self.updated_at = self.created_at
+        self.last_seen = time.monotonic()
+        self.error = None
+        self.archived = False
+        self.reply_task: Optional[asyncio.Task] = None
+
+    @property
+    def ai_model(self) -> str:
+        return self.black_player if self.white_player == HUMAN else self.white_player
+
+    @property
+    def current_turn(self) -> str:
+        return "white" if self.fen.split()[1] == "w" else "black"
+
+    @property
+    def human_to_move(self) -> bool:
+        return (self.current_turn == "white") == (self.white_player == HUMAN)
+
+    @property
+    def ai_thinking(self) -> bool:
+        return self.reply_task is not None and not self.reply_task.done()
+
+    def board(self) -> chess.Board:
+        """Tabuleiro com o histórico completo (repetição, regra dos 50 lances)"""
+        board = chess.Board()
+        for uci in self.moves:
+            board.push_uci(uci)
+        return board
+
+    def push(self, board: chess.Board, move: chess.Move) -> str:
+        san = board.san(move)
+        board.push(move)
+        self.moves.append(move.uci())
+        self.san_moves.append(san)
+        self.fen = board.fen()
+        self.updated_at = datetime.now()
+        outcome = board.outcome()
+        if outcome:
+            self.status = FINISHED
+            self.result = outcome.result()
+            self.termination = outcome.termination.name.lower()
+        return san
+
+    def pgn(self) -> str:
+        builder = PgnBuilder({
+            "Event": "Human vs LLM",
+            "White": self.white_player,
+            "Black": self.black_player,
+            "Date": self.created_at.strftime("%Y.%m.%d"),
+        })
+        board = chess.Board()
+        for uci in self.moves:
+            move = chess.Move.from_uci(uci)
+            builder.push(board, move)
+            board.push(move)
+        builder.set_header("Result", self.result or "*")
+        if self.termination:
+            builder.set_header("Termination", self.termination)
+        return builder.pgn()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "white_player": self.white_player,
+            "black_player": self.black_player,
+            "current_fen": self.fen,
+            "move_history": self.san_moves,
+            "uci_moves": self.moves,
+            "move_count": len(self.moves),
+            "result": self.result,
+            "termination": self.termination,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+            "current_turn": self.current_turn,
+            "ai_thinking": self.ai_thinking,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HumanSession":
+        """Reconstrói a sessão a partir do estado compartilhado (outro worker)"""
+        session = cls(data["id"], data["white_player"], data["black_player"])
+        session.created_at = datetime.fromisoformat(data["created_at"])
+        session.load(data)
+        return session
+
+    def load(self, data: Dict[str, Any]):
+        """Atualiza a cópia local com o estado compartilhado"""
+        self.status = data["status"]
+        self.moves = list(data["uci_moves"])
+        self.san_moves = list(data["move_history"])
+        self.fen = data["current_fen"]
+        self.result = data["result"]
+        self.termination = data.get("termination")
+        self.updated_at = datetime.fromisoformat(data["updated_at"])
+        self.error = data.get("error")
+
+
+def parse_human_move(board: chess.Board, token: str) -> chess.Move:
+    """UCI ("e2e4", promoção sem peça vira dama) ou SAN ("Nf3"); só lances legais"""
+    token = token.strip()
+    if len(token) == 4:
+        try:
+            move = chess.Move.from_uci(token.lower())
+        except ValueError:
+            move = None
+        if (move and board.piece_type_at(move.from_square) == chess.PAWN
+                and chess.square_rank(move.to_square) in (0, 7)):
+            token = token.lower() + "q"
+    move, _ = LegalMoveIndex(board).match(token, allow_close=False)
+    if move is None:
+        raise IllegalMove(f"Lance ilegal nesta posição: {token}")
+    return move
+
+
+class HumanSessionManager:
+    """
+    Registro LRU das sessões. get_reply(board, modelo, último SAN) devolve o
+    lance do LLM; on_update(evento) publica as mudanças (broadcast_update);
+    archive(sessão) grava a partida no banco ao sair da memória.
+    """
+
+    def __init__(self, get_reply, on_update: UpdateCallback = None,
+                 archive: Callable[[HumanSession], None] = None, backend=None,
+                 ttl_seconds: float = HUMAN_SESSION_TTL_SECONDS,
+                 max_sessions: int = HUMAN_SESSION_MAX):
+        self.get_reply = get_reply
+        self.on_update = on_update
+        self.archive = archive
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, HumanSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.evicted = 0
+        self.archived = 0
+        self.replies = 0
+
+    def _shared(self) -> bool:
+        return self.backend is not None and self.backend.shared
+
+    async def _share(self, session: HumanSession, expected: Optional[int] = None) -> bool:
+        """
+        Publica a sessão no estado compartilhado. Com expected, só grava se lá
+        ela ainda tiver expected lances (False: outro worker mudou ou encerrou).
+        O backend é SQLite: as chamadas rodam fora do event loop.
+        """
+        if not self._shared():
+            return True
+        if expected is None:
+            await asyncio.to_thread(self.backend.put, "games", session.id, session.to_dict())
+            return True
+        return await asyncio.to_thread(self.backend.put_if, "games", session.id, session.to_dict(),
+                                       "move_count", expected)
+
+    async def _reload(self, session_id: str, session: Optional[HumanSession]) -> Optional[HumanSession]:
+        """Relê a sessão do estado compartilhado; None se outro worker a encerrou"""
+        data = await asyncio.to_thread(self.backend.get, "games", session_id)
+        if data is None:
+            if session is not None:
+                with self._lock:
+                    self.sessions.pop(session_id, None)
+                if session.reply_task:
+                    session.reply_task.cancel()
+            return None
+        if session is None:
+            with self._lock:
+                session = self.sessions.setdefault(session_id, HumanSession.from_dict(data))
+        if len(data["uci_moves"]) >= len(session.moves):
+            # Menos lances lá: a gravação de um lance deste worker ainda está em curso
+            session.load(data)
+        return session
+
+    async def create(self, opponent_model: str, human_color: str = "white") -> HumanSession:
+        if human_color == "white":
+            session = HumanSession(str(uuid.uuid4()), HUMAN, opponent_model)
+        else:
+            session = HumanSession(str(uuid.uuid4()), opponent_model, HUMAN)
+        with self._lock:
+            self.sessions[session.id] = session
+            overflow = self._pop_overflow()
+        await self._share(session)
+        self._start_sweeper()
+        for old in overflow:
+            # Cancela no event loop; o arquivamento (banco) vai para uma thread
+            if old.reply_task:
+                old.reply_task.cancel()
+            self._in_thread(self._evict, old)
+        if not session.human_to_move:
+            self._start_reply(session)
+        return session
+
+    async def get(self, session_id: str) -> Optional[HumanSession]:
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session:
+                self.sessions.move_to_end(session_id)
+        if self._shared():
+            # Outro worker pode ter criado, mexido ou encerrado a sessão
+            session = await self._reload(session_id, session)
+        if session:
+            session.last_seen = time.monotonic()
+            # Resposta do LLM que falhou (ou outro worker caiu): tenta de novo
+            if session.status == PLAYING and not session.human_to_move and not session.ai_thinking:
+                self._start_reply(session)
+        return session
+
+    async def list(self) -> List[Dict[str, Any]]:
+        if self._shared():
+            return await asyncio.to_thread(self.backend.list, "games")
+        with self._lock:
+            return [session.to_dict() for session in self.sessions.values()]
+
+    async def move(self, session_id: str, token: str) -> HumanSession:
+        """Valida e aplica o lance do jogador e dispara a resposta do LLM"""
+        session = await self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        if session.status != PLAYING:
+            raise IllegalMove("Partida não está em andamento")
+        if not session.human_to_move:
+            raise IllegalMove("Aguarde o lance do oponente")
+        board = session.board()
+        move = parse_human_move(board, token)
+        expected = len(session.moves)
+        san = session.push(board, move)
+        if not await self._share(session, expected):
+            await self._reload(session_id, session)
+            raise IllegalMove("A partida mudou em outro worker; consulte o estado e tente de novo")
+        await self._notify("move_made", session, san)
+        if session.status == PLAYING:
+            self._start_reply(session)
+        else:
+            await asyncio.to_thread(self._archive, session)
+        return session
+
+    def _start_reply(self, session: HumanSession):
+        try:
+            session.reply_task = asyncio.get_running_loop().create_task(self._reply(session))
+        except RuntimeError:
+            # Sem event loop (ex.: chamada síncrona); a próxima consulta tenta de novo
+            pass
+
+    async def _reply(self, session: HumanSession):
+        claim = f"human-reply:{session.id}"
+        if self._shared() and not await asyncio.to_thread(self.backend.claim, claim,
+                                                          HUMAN_REPLY_CLAIM_SECONDS):
+            # Outro worker já está pedindo o lance
+            return
+        try:
+            await self._reply_claimed(session)
+        finally:
+            if self._shared():
+                await asyncio.to_thread(self.backend.release, claim)
+
+    async def _reply_claimed(self, session: HumanSession):
+        if self._shared():
+            # Com a trava, confere se outro worker já não respondeu
+            if await self._reload(session.id, session) is None or session.human_to_move:
+                return
+        board = session.board()
+        try:
+            move, _ = await self.get_reply(board, session.ai_model,
+                                           session.san_moves[-1] if session.san_moves else None)
+        except Exception as e:
+            move = None
+            print(f"Erro na resposta de {session.ai_model} (sessão {session.id}): {e}")
+        if move is None or session.status != PLAYING or session.moves != [m.uci() for m in board.move_stack]:
+            if move is None:
+                session.error = f"{session.ai_model} não respondeu; tente consultar a partida novamente"
+                await self._share(session, len(session.moves))
+            return
+        session.error = None
+        expected = len(session.moves)
+        san = session.push(board, move)
+        if not await self._share(session, expected):
+            # A partida mudou em outro worker enquanto o LLM pensava: descarta o lance
+            await self._reload(session.id, session)
+            return
+        self.replies += 1
+        await self._notify("ai_move", session, san)
+        if session.status != PLAYING:
+            await asyncio.to_thread(self._archive, session)
+
+    async def _notify(self, event: str, session: HumanSession, san: str):
+        if self.on_update:
+            await self.on_update({"type": event, "game_id": session.id, "move": san,
+                                  "game_state": session.to_dict()})
+
+    async def end(self, session_id: str) -> Optional[HumanSession]:
+        """Encerra a partida (abandono, se ainda em andamento) e a grava no banco"""
+        session = await self.get(session_id)
+        if session is None:
+            return None
+        with self._lock:
+            self.sessions.pop(session_id, None)
+        if session.reply_task:
+            session.reply_task.cancel()
+        if session.status == PLAYING:
+            session.status = FINISHED
+            session.termination = "abandoned"
+        await asyncio.to_thread(self._archive, session)
+        if self._shared():
+            await asyncio.to_thread(self.backend.delete, "games", session_id)
+        return session
+
+    def _archive(self, session: HumanSession):
+        if session.archived or not session.moves or self.archive is None:
+            return
+        session.archived = True
+        try:
+            self.archive(session)
+            self.archived += 1
+        except Exception as e:
+            print(f"Erro ao arquivar sessão {session.id}: {e}")
+
+    def _in_thread(self, fn, *args):
+        """Roda fn fora do event loop; sem loop (chamada síncrona), roda aqui mesmo"""
+        try:
+            asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        except RuntimeError:
+            fn(*args)
+
+    def _evict(self, session: HumanSession):
+        """Arquiva a sessão que saiu da memória; bloqueia (banco), chamar fora do loop"""
+        self.evicted += 1
+        if self._shared():
+            data = self.backend.get("games", session.id)
+            if data is None:
+                # Já encerrada e arquivada por outro worker
+                return
+            session.load(data)
+            if datetime.now() - session.updated_at < timedelta(seconds=self.ttl_seconds):
+                # Ainda em uso em outro worker: só sai da memória deste
+                return
+        if session.status == PLAYING:
+            session.termination = "abandoned"
+        self._archive(session)
+        if self._shared():
+            self.backend.delete("games", session.id)
+
+    def _pop_overflow(self) -> List[HumanSession]:
+        """Sessões menos recentes além do limite (chamar com o lock)"""
+        overflow = []
+        while len(self.sessions) > self.max_sessions:
+            overflow.append(self.sessions.popitem(last=False)[1])
+        return overflow
+
+    def sweep(self) -> int:
+        """Remove (e arquiva) as sessões paradas há mais que o TTL"""
+        cutoff = time.monotonic() - self.ttl_seconds
+        with self._lock:
+            idle = [session for session in self.sessions.values()
+                    if session.last_seen < cutoff and not session.ai_thinking]
+            for session in idle:
+                del self.sessions[session.id]
+        for session in idle:
+            self._evict(session)
+        return len(idle)
+
+    def _start_sweeper(self):
+        if self._sweeper is None or self._sweeper.done():
+            try:
+                self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+            except RuntimeError:
+                pass
+
+    async def _sweep_loop(self):
+        while self.sessions:
+            await asyncio.sleep(HUMAN_SESSION_SWEEP_SECONDS)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Erro ao expirar sessões: {e}")
+
+    def clear(self):
+        with self._lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            if session.reply_task:
+                session.reply_task.cancel()
+        if self.backend is not None:
+            self.backend.clear("games")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self.sessions.values())
+        approx_bytes = sum(
+            sys.getsizeof(s) + sys.getsizeof(s.moves) + sys.getsizeof(s.san_moves) + sys.getsizeof(s.fen)
+            + sum(sys.getsizeof(m) for m in s.moves) + sum(sys.getsizeof(m) for m in s.san_moves)
+            for s in sessions)
+        return {
+            "sessions": len(sessions),
+            "playing": sum(1 for s in sessions if s.status == PLAYING),
+            "ai_thinking": sum(1 for s in sessions if s.ai_thinking),
+            "approx_bytes": approx_bytes,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "ai_replies": self.replies,
+            "evicted": self.evicted,
+            "archived": self.archived,
+        }
@@ -0,0 +1,223 @@
+"""
+Fila persistente de partidas para workers distribuídos.
+Com ARENA_GAME_DISPATCH=queue, batalhas (arena.py) e torneios
+(arena_engine.py) não jogam as partidas no próprio processo: cada partida
+vira uma linha em game_jobs e processos worker.py (nesta ou em outras
+máquinas) pegam, jogam com GameEngine e devolvem o resultado.
+
+Ciclo de um job: pending -> leased -> done (ou failed / cancelled).
+O lease vale JOB_LEASE_SECONDS e é renovado pelo worker a cada lance
+(heartbeat, que também grava os lances UCI jogados até ali). Se o worker
+morre, o lease expira e outro worker retoma a partida desses lances.
+Depois de JOB_MAX_ATTEMPTS leases o job é marcado como failed.
+
+O id do job é determinístico (ex.: "battle:<id>:<partida>"), então uma
+batalha retomada de checkpoint reencontra os jobs que já enfileirou.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi_backend.database import GameDatabase
+
+# "local": partidas no próprio processo (padrão); "queue": via workers
+GAME_DISPATCH = os.getenv("ARENA_GAME_DISPATCH", "local").lower()
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Intervalo com que o coordenador confere progresso/resultado dos jobs
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "0.5"))
+# Banco da fila; por padrão o chess_arena.db do projeto
+JOB_DB_PATH = os.getenv("ARENA_JOB_DB")
+# Segredo que workers remotos enviam no cabeçalho X-Worker-Token; sem ele
+# configurado, os endpoints /jobs de lease/heartbeat/complete/fail recusam tudo
+JOB_WORKER_TOKEN = os.getenv("ARENA_WORKER_TOKEN")
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ProgressHandler = Callable[[List[str]], None]
+
+
+class JobFailed(Exception):
+    pass
+
+
+class GameJobQueue:
+    """Conexão única (WAL) por processo; o lease é atômico via BEGIN IMMEDIATE"""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = GameDatabase(db_path).db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # isolation_level=None: transações explícitas no lease
+            self._conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._connection().execute(sql, params).rowcount
+
+    def enqueue(self, job_id: str, batch_id: str, white: str, black: str, opening: str,
+                game_num: int, initial_moves: List[str] = None) -> bool:
+        """Enfileira a partida; False se o job já existia (batalha retomada)"""
+        now = time.time()
+        return self._execute(
+            "INSERT OR IGNORE INTO game_jobs (id, batch_id, white, black, opening, game_num, status, "
+            "progress, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, batch_id, white, black, opening, game_num, PENDING,
+             json.dumps(initial_moves or []), now, now)) > 0
+
+    def lease(self, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """Próximo job pendente (ou com lease vencido) para este worker"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Lease vencido depois da última tentativa: o job desiste
+                conn.execute(
+                    "UPDATE game_jobs SET status = ?, error = 'lease expired', updated_at = ? "
+                    "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (FAILED, now, LEASED, now, JOB_MAX_ATTEMPTS))
+                row = conn.execute(
+                    "SELECT id FROM game_jobs WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1", (PENDING, LEASED, now)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE game_jobs SET status = ?, worker_id = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (LEASED, worker_id, now + lease_seconds, now, row[0]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    def heartbeat(self, job_id: str, worker_id: str, moves: List[str] = None,
+                  lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        """Renova o lease (e grava o progresso); False se o worker perdeu o job"""
+        now = time.time()
+        if moves is None:
+            return self._execute(
+                "UPDATE game_jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = ?",
+                (now + lease_seconds, now, job_id, worker_id, LEASED)) > 0
+        return self._execute(
+            "UPDATE game_jobs SET lease_expires = ?, progress = ?, updated_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = ?",
+            (now + lease_seconds, json.dumps(moves), now, job_id, worker_id, LEASED)) > 0
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        return self._execute(
+            "UPDATE game_jobs SET status = ?, result = ?, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = ?",
+            (DONE, json.dumps(result), time.time(), job_id, worker_id, LEASED)) > 0
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """Devolve o job para a fila, ou o encerra se as tentativas acabaram"""
+        return self._execute(
+            "UPDATE game_jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "error = ?, worker_id = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = ?",
+            (JOB_MAX_ATTEMPTS, FAILED, PENDING, error, time.time(), job_id, worker_id, LEASED)) > 0
+
+    def cancel_batch(self, batch_id: str) -> int:
+        """Cancela os jobs ainda não concluídos; o worker percebe no próximo heartbeat"""
+        return self._execute(
+            "UPDATE game_jobs SET status = ?, updated_at = ? WHERE batch_id = ? AND status IN (?, ?)",
+            (CANCELLED, time.time(), batch_id, PENDING, LEASED))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connection()
+            conn.row_factory = sqlite3.Row
+            try:
+                row = conn.execute("SELECT * FROM game_jobs WHERE id = ?", (job_id,)).fetchone()
+            finally:
+                conn.row_factory = None
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"]) if job["progress"] else []
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _check(self, job_id: str) -> Dict[str, Any]:
+        job = self.get(job_id)
+        if job is None:
+            raise JobFailed(f"job {job_id} não existe")
+        if job["status"] in (FAILED, CANCELLED):
+            raise JobFailed(job["error"] or job["status"])
+        return job
+
+    async def wait(self, job_id: str, on_progress: ProgressHandler = None,
+                   poll_seconds: float = JOB_POLL_SECONDS) -> Dict[str, Any]:
+        """
+        Aguarda o resultado sem bloquear o event loop. on_progress(lances UCI)
+        roda no loop sempre que o worker registra lances novos.
+        """
+        seen = 0
+        while True:
+            job = await asyncio.to_thread(self._check, job_id)
+            if on_progress and len(job["progress"]) > seen:
+                seen = len(job["progress"])
+                on_progress(job["progress"])
+            if job["status"] == DONE:
+                return job["result"]
+            await asyncio.sleep(poll_seconds)
+
+    def wait_blocking(self, job_id: str, on_progress: ProgressHandler = None,
+                      poll_seconds: float = JOB_POLL_SECONDS,
+                      should_stop: Callable[[], bool] = None) -> Optional[Dict[str, Any]]:
+        """Versão para threads (arena_engine); None se should_stop() pedir parada"""
+        seen = 0
+        while not (should_stop and should_stop()):
+            job = self._check(job_id)
+            if on_progress and len(job["progress"]) > seen:
+                seen = len(job["progress"])
+                on_progress(job["progress"])
+            if job["status"] == DONE:
+                return job["result"]
+            time.sleep(poll_seconds)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM game_jobs GROUP BY status").fetchall())
+            workers = [row[0] for row in conn.execute(
+                "SELECT DISTINCT worker_id FROM game_jobs WHERE status = ? AND lease_expires >= ?",
+                (LEASED, now)).fetchall()]
+        return {"dispatch": GAME_DISPATCH, "lease_seconds": JOB_LEASE_SECONDS,
+                "jobs": counts, "active_workers": workers}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> GameJobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = GameJobQueue(JOB_DB_PATH)
+    return _queue
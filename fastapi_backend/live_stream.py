@@ -0,0 +1,170 @@
+"""
+Transmissão ao vivo de partidas por deltas numerados.
+Cada lance vira uma mensagem pequena {seq, ply, uci, san, fen, clock[, eval]}
+publicada no tópico "game:<stream_id>" do ws_hub; o tamanho não depende do
+comprimento da partida. As últimas LIVE_STREAM_BUFFER mensagens ficam num
+ring buffer: quem reconecta informa o último seq recebido e recebe só o que
+perdeu. Se o buffer já girou além disso, recebe um snapshot (FEN atual) e
+segue a partir dele.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import chess
+
+LIVE_STREAM_BUFFER = int(os.getenv("LIVE_STREAM_BUFFER", "256"))
+# Streams encerrados continuam disponíveis para replay por esse tempo
+LIVE_STREAM_TTL_SECONDS = float(os.getenv("LIVE_STREAM_TTL_SECONDS", "600"))
+
+
+class LiveGameStream:
+    def __init__(self, stream_id: str, white: str, black: str, buffer_size: int = LIVE_STREAM_BUFFER):
+        self.id = stream_id
+        self.white = white
+        self.black = black
+        self.seq = 0
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.fen = chess.STARTING_FEN
+        self.ply = 0
+        self.result = None
+        self.last_move_at = time.monotonic()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def topic(self) -> str:
+        return f"game:{self.id}"
+
+    def _append_move(self, ply: int, move: chess.Move, san: str, fen: str, clock: float,
+                     evaluation: Optional[float] = None) -> Dict[str, Any]:
+        self.seq += 1
+        delta = {
+            "type": "move",
+            "stream": self.id,
+            "seq": self.seq,
+            "ply": ply,
+            "uci": move.uci(),
+            "san": san,
+            # Posição depois do lance: outro worker que espelha o stream a
+            # partir do meio da partida ainda serve um snapshot correto
+            "fen": fen,
+            # Segundos gastos no lance
+            "clock": round(clock, 3),
+        }
+        if evaluation is not None:
+            delta["eval"] = evaluation
+        self.buffer.append(delta)
+        return delta
+
+    def push(self, board: chess.Board, san: str, evaluation: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Deltas do último lance de board (chamar depois de board.push). Lances
+        anteriores ainda não transmitidos (abertura, partida retomada) vão
+        antes, com clock 0.
+        """
+        now = time.monotonic()
+        stack = board.move_stack
+        with self._lock:
+            deltas = []
+            if len(stack) - 1 > self.ply:
+                replay = board.root()
+                for move in stack[:self.ply]:
+                    replay.push(move)
+                for move in stack[self.ply:-1]:
+                    move_san = replay.san(move)
+                    replay.push(move)
+                    deltas.append(self._append_move(
+                        replay.ply(), move, move_san, replay.fen(), 0.0))
+            deltas.append(self._append_move(len(stack), stack[-1], san, board.fen(),
+                                            now - self.last_move_at, evaluation))
+            self.last_move_at = now
+            self.fen = board.fen()
+            self.ply = len(stack)
+        return deltas
+
+    def mirror(self, delta: Dict[str, Any]):
+        """Copia um delta gerado em outro worker, para servir replay daqui"""
+        with self._lock:
+            if delta["seq"] <= self.seq:
+                return
+            self.seq = delta["seq"]
+            self.buffer.append(delta)
+            if delta["type"] == "end":
+                self.result = delta["result"]
+                self.finished_at = time.monotonic()
+            elif delta["type"] == "move":
+                # Delta sem FEN (worker antigo): melhor None que a posição errada
+                self.fen = delta.get("fen")
+                self.ply = delta["ply"]
+
+    def finish(self, result: str) -> Dict[str, Any]:
+        with self._lock:
+            self.seq += 1
+            self.result = result
+            self.finished_at = time.monotonic()
+            delta = {"type": "end", "stream": self.id, "seq": self.seq, "result": result}
+            self.buffer.append(delta)
+        return delta
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "snapshot", "stream": self.id, "seq": self.seq, "ply": self.ply,
+                "fen": self.fen, "white": self.white, "black": self.black, "result": self.result}
+
+    def since(self, seq: int) -> List[Dict[str, Any]]:
+        """Mensagens depois de seq; snapshot quando o buffer não cobre o intervalo"""
+        with self._lock:
+            oldest = self.buffer[0]["seq"] if self.buffer else self.seq + 1
+            if seq >= self.seq:
+                return []
+            if seq + 1 < oldest:
+                return [self.snapshot()]
+            return [delta for delta in self.buffer if delta["seq"] > seq]
+
+
+class LiveStreamRegistry:
+    def __init__(self, ttl_seconds: float = LIVE_STREAM_TTL_SECONDS):
+        self.streams: Dict[str, LiveGameStream] = {}
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+    def open(self, stream_id: str, white: str, black: str) -> LiveGameStream:
+        with self._lock:
+            self._prune()
+            stream = self.streams.get(stream_id)
+            if stream is None:
+                stream = LiveGameStream(stream_id, white, black)
+                self.streams[stream_id] = stream
+            return stream
+
+    def mirror(self, stream_id: str, delta: Dict[str, Any]):
+        self.open(stream_id, "", "").mirror(delta)
+
+    def get(self, stream_id: str) -> Optional[LiveGameStream]:
+        with self._lock:
+            return self.streams.get(stream_id)
+
+    def _prune(self):
+        now = time.monotonic()
+        for stream_id in [sid for sid, s in self.streams.items()
+                          if s.finished_at and now - s.finished_at > self.ttl_seconds]:
+            del self.streams[stream_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            streams = list(self.streams.values())
+        return {
+            "streams": len(streams),
+            "live": sum(1 for s in streams if s.result is None),
+            "buffered_deltas": sum(len(s.buffer) for s in streams),
+        }
+
+
+_registry = LiveStreamRegistry()
+
+
+def get_live_streams() -> LiveStreamRegistry:
+    return _registry
@@ -0,0 +1,250 @@
+"""
+Cache determinístico de respostas dos LLMs com modo record/replay.
+LRU em memória na frente de um armazenamento SQLite em disco.
+
+Modos (variável LLM_CACHE_MODE):
+- off: nunca usa o cache
+- auto: lê e grava apenas para modelos com temperature == 0 (padrão)
+- readwrite: lê e grava para qualquer modelo
+- record: sempre chama o modelo e grava a resposta
+- replay: só lê do cache; uma resposta ausente gera CacheMiss (modo offline)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+CACHE_MODES = ("off", "auto", "readwrite", "record", "replay")
+
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "auto")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', 'llm_cache.db')))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "4096"))
+
+# Atributos dos clientes LangChain que alteram a resposta
+SAMPLING_ATTRS = ("model_name", "model", "temperature", "top_p", "top_k",
+                  "max_tokens", "max_output_tokens", "openai_api_base")
+
+
+class CacheMiss(Exception):
+    """Resposta ausente no cache durante o modo replay"""
+
+
+class CachedResponse:
+    """Resposta servida pelo cache, com a mesma interface usada pelo GameEngine"""
+
+    def __init__(self, content: str, usage_metadata: Optional[Dict[str, Any]] = None):
+        self.content = content
+        self.usage_metadata = usage_metadata or {}
+        self.response_metadata = {"cached": True}
+
+
+class ReplayModel:
+    """Substituto offline de um modelo gravado; só responde pelo cache"""
+
+    def __init__(self, model_name: str, params: Dict[str, Any]):
+        self.model_name = model_name
+        self.params = params
+
+    def invoke(self, messages):
+        raise CacheMiss(f"Sem resposta gravada para {self.model_name}")
+
+    async def ainvoke(self, messages):
+        raise CacheMiss(f"Sem resposta gravada para {self.model_name}")
+
+
+def sampling_params(model) -> Dict[str, Any]:
+    if isinstance(model, ReplayModel):
+        return model.params
+    params = {}
+    for attr in SAMPLING_ATTRS:
+        value = getattr(model, attr, None)
+        if value is not None:
+            params[attr] = value if isinstance(
+                value, (int, float, str, bool)) else str(value)
+    return params
+
+
+class LLMResponseCache:
+    def __init__(self, db_path: str = LLM_CACHE_PATH, mode: str = LLM_CACHE_MODE,
+                 memory_entries: int = LLM_CACHE_MEMORY_ENTRIES):
+        if mode not in CACHE_MODES:
+            raise ValueError(
+                f"LLM_CACHE_MODE inválido: {mode} (use {', '.join(CACHE_MODES)})")
+        self.db_path = db_path
+        self.mode = mode
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        # _lock protege só o LRU em memória (consultado no event loop);
+        # _db_lock serializa a conexão SQLite, usada fora do loop no caminho assíncrono
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conn = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Conexão única protegida por _db_lock: o cache fica no caminho quente de cada lance
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model_name TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    usage TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_models (
+                    model_name TEXT PRIMARY KEY,
+                    params TEXT NOT NULL
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def _readable(self, params: Dict[str, Any]) -> bool:
+        if self.mode in ("readwrite", "replay"):
+            return True
+        return self.mode == "auto" and params.get("temperature") == 0
+
+    def _writable(self, params: Dict[str, Any]) -> bool:
+        if self.mode in ("readwrite", "record"):
+            return True
+        return self.mode == "auto" and params.get("temperature") == 0
+
+    def key(self, model_name: str, model, messages, attempt: int = 0) -> str:
+        """Hash de modelo + parâmetros de amostragem + prompt + número da tentativa"""
+        payload = json.dumps({
+            "model": model_name,
+            "params": sampling_params(model),
+            "messages": [[getattr(m, "type", ""), getattr(m, "content", str(m))]
+                         for m in messages],
+            "attempt": attempt,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str, model) -> Optional[CachedResponse]:
+        if self.mode == "off" or not self._readable(sampling_params(model)):
+            return None
+        return self.lookup_memory(key) or self._lookup_disk(key)
+
+    async def alookup(self, key: str, model) -> Optional[CachedResponse]:
+        """Como lookup, mas a leitura em disco roda em thread (fora do event loop)"""
+        if self.mode == "off" or not self._readable(sampling_params(model)):
+            return None
+        return self.lookup_memory(key) or await asyncio.to_thread(self._lookup_disk, key)
+
+    def lookup_memory(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        return CachedResponse(entry[0], entry[1])
+
+    def _lookup_disk(self, key: str) -> Optional[CachedResponse]:
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT content, usage FROM llm_responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise CacheMiss(f"Resposta não gravada (key={key[:12]})")
+            return None
+        self.disk_hits += 1
+        entry = (row[0], json.loads(row[1]) if row[1] else {})
+        with self._lock:
+            self._remember(key, entry)
+        return CachedResponse(entry[0], entry[1])
+
+    def store(self, key: str, model_name: str, model, response, background: bool = False):
+        """
+        Grava a resposta. Com background=True (event loop), só o LRU é
+        atualizado na hora; o INSERT/commit roda no executor padrão do loop.
+        """
+        params = sampling_params(model)
+        if self.mode == "off" or not self._writable(params):
+            return
+        content = response.content if hasattr(
+            response, "content") else str(response)
+        usage = getattr(response, "usage_metadata", None) or {}
+        entry = (content, dict(usage))
+        with self._lock:
+            self._remember(key, entry)
+        if background:
+            try:
+                asyncio.get_running_loop().run_in_executor(
+                    None, self._write, key, model_name, entry, params)
+                return
+            except RuntimeError:
+                pass  # sem loop rodando: grava aqui mesmo
+        self._write(key, model_name, entry, params)
+
+    def _write(self, key: str, model_name: str, entry: tuple, params: Dict[str, Any]):
+        try:
+            with self._db_lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, model_name, content, usage) VALUES (?, ?, ?, ?)",
+                    (key, model_name, entry[0], json.dumps(entry[1])))
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_models (model_name, params) VALUES (?, ?)",
+                    (model_name, json.dumps(params, sort_keys=True)))
+                conn.commit()
+                self.writes += 1
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar resposta no cache: {e}")
+
+    def _remember(self, key: str, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def replay_model(self, model_name: str) -> Optional[ReplayModel]:
+        """Modelo substituto para replay sem chaves de API"""
+        if self.mode != "replay":
+            return None
+        with self._db_lock:
+            row = self._connection().execute(
+                "SELECT params FROM llm_models WHERE model_name = ?", (model_name,)).fetchone()
+        if row is None:
+            return None
+        return ReplayModel(model_name, json.loads(row[0]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.db_path,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+        }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> LLMResponseCache:
+    """Cache compartilhado pelo processo"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = LLMResponseCache()
+        return _response_cache
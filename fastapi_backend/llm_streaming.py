@@ -0,0 +1,273 @@
+"""
+Streaming das respostas dos LLMs com extração antecipada do lance.
+O lance é jogado assim que a linha "My move:" termina; o restante da
+explicação continua chegando em segundo plano ou é cortado depois de
+STREAM_EXPLANATION_TOKENS tokens.
+
+Variáveis de ambiente:
+- LLM_STREAM_MOVES: liga o streaming para todos os modelos (model_configs["stream"] sobrepõe)
+- LLM_STREAM_EXPLANATION_TOKENS: tokens da explicação lidos após o lance
+  (0 corta na hora, negativo lê até o fim)
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import chess
+
+from fastapi_backend.move_parser import MOVE_MARKER, LegalMoveIndex
+from fastapi_backend.rate_limiter import estimate_tokens
+
+STREAM_MOVES = os.getenv("LLM_STREAM_MOVES", "false").lower() in (
+    "1", "true", "yes")
+STREAM_EXPLANATION_TOKENS = int(
+    os.getenv("LLM_STREAM_EXPLANATION_TOKENS", "64"))
+# Limite para a leitura da explicação em segundo plano
+STREAM_DRAIN_TIMEOUT = 60.0
+# Tokens examinados após cada marcador (mesmo limite de extract_move)
+MARKER_TOKENS = 4
+
+
+def early_move(text: str, index: LegalMoveIndex) -> Tuple[Optional[chess.Move], Optional[str]]:
+    """Lance após "My move:" considerando só tokens já completos no texto parcial"""
+    for marker in MOVE_MARKER.finditer(text):
+        line = marker.group(1)
+        # MOVE_MARKER para no fim da linha: se há texto depois, a linha terminou
+        line_done = marker.end() < len(text)
+        tokens = line.split()
+        if not line_done and not line[-1:].isspace():
+            # O último token ainda pode crescer ("N" -> "Nf3")
+            tokens = tokens[:-1]
+        for token in tokens[:MARKER_TOKENS]:
+            move, method = index.match(token)
+            if move:
+                return move, method
+    return None, None
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, list):
+        # Alguns provedores enviam blocos [{"type": "text", "text": ...}]
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part)
+                       for part in content)
+    return content if isinstance(content, str) else str(content)
+
+
+class StreamedResponse:
+    """Resposta montada a partir dos chunks; content cresce enquanto a explicação chega"""
+
+    def __init__(self):
+        self.parts = []
+        self.usage_metadata: Dict[str, int] = {}
+        self.response_metadata = {"streamed": True}
+        self.move: Optional[chess.Move] = None
+        self.method: Optional[str] = None
+        self.started_at = time.monotonic()
+        self.first_chunk_seconds: Optional[float] = None
+        self.move_seconds: Optional[float] = None
+        self.total_seconds: Optional[float] = None
+        self.explanation_tokens = 0
+        self.cut_off = False
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+    def add(self, chunk) -> str:
+        text = _chunk_text(chunk)
+        if self.first_chunk_seconds is None:
+            self.first_chunk_seconds = time.monotonic() - self.started_at
+        self.parts.append(text)
+        # Mesma soma feita por AIMessageChunk.__add__
+        for key, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+            if isinstance(value, int):
+                self.usage_metadata[key] = self.usage_metadata.get(
+                    key, 0) + value
+        if self.move is not None:
+            self.explanation_tokens += estimate_tokens(text)
+        return text
+
+    def found(self, move: chess.Move, method: str):
+        self.move = move
+        self.method = method
+        self.move_seconds = time.monotonic() - self.started_at
+
+    def finish(self, cut_off: bool = False):
+        self.cut_off = cut_off
+        self.total_seconds = time.monotonic() - self.started_at
+
+
+class StreamStats:
+    def __init__(self):
+        self.streams = 0
+        self.early_moves = 0
+        self.cut_offs = 0
+        self.first_chunk_seconds = 0.0
+        self.move_seconds = 0.0
+        self.total_seconds = 0.0
+        self.completed = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        def avg(total, count):
+            return round(total / count, 3) if count else None
+        return {
+            "streams": self.streams,
+            "early_moves": self.early_moves,
+            "cut_offs": self.cut_offs,
+            "avg_first_chunk_seconds": avg(self.first_chunk_seconds, self.streams),
+            "avg_move_seconds": avg(self.move_seconds, self.early_moves),
+            "avg_total_seconds": avg(self.total_seconds, self.completed),
+        }
+
+
+_stream_stats: Dict[str, StreamStats] = {}
+_stream_stats_lock = threading.Lock()
+
+
+def _record(model_name: str, response: StreamedResponse):
+    with _stream_stats_lock:
+        stats = _stream_stats.setdefault(model_name, StreamStats())
+        stats.streams += 1
+        stats.first_chunk_seconds += response.first_chunk_seconds or 0.0
+        if response.move_seconds is not None:
+            stats.early_moves += 1
+            stats.move_seconds += response.move_seconds
+        if response.cut_off:
+            stats.cut_offs += 1
+        else:
+            stats.completed += 1
+            stats.total_seconds += response.total_seconds or 0.0
+
+
+def get_stream_stats() -> Dict[str, Any]:
+    with _stream_stats_lock:
+        return {name: stats.to_dict() for name, stats in _stream_stats.items()}
+
+
+def _finish(model_name: str, response: StreamedResponse, cut_off: bool,
+            on_complete: Optional[Callable[[StreamedResponse], None]]):
+    response.finish(cut_off)
+    _record(model_name, response)
+    if on_complete:
+        try:
+            on_complete(response)
+        except Exception as e:
+            print(f"Erro ao finalizar streaming de {model_name}: {e}")
+
+
+def _explanation_done(response: StreamedResponse, explanation_tokens: int) -> bool:
+    return 0 <= explanation_tokens <= response.explanation_tokens
+
+
+def stream_move(model_name: str, model, messages, legal_index: LegalMoveIndex,
+                explanation_tokens: int = STREAM_EXPLANATION_TOKENS,
+                on_complete: Optional[Callable[[StreamedResponse], None]] = None) -> StreamedResponse:
+    """Versão síncrona: retorna assim que o lance aparece; a explicação segue numa thread"""
+    response = StreamedResponse()
+    stream = iter(model.stream(messages))
+    try:
+        for chunk in stream:
+            response.add(chunk)
+            move, method = early_move(response.content, legal_index)
+            if move:
+                response.found(move, method)
+                break
+        else:
+            _finish(model_name, response, False, on_complete)
+            return response
+    except BaseException:
+        _close(stream)
+        raise
+    if explanation_tokens == 0:
+        _close(stream)
+        _finish(model_name, response, True, on_complete)
+        return response
+
+    def drain():
+        try:
+            for chunk in stream:
+                response.add(chunk)
+                if _explanation_done(response, explanation_tokens):
+                    _close(stream)
+                    _finish(model_name, response, True, on_complete)
+                    return
+        except Exception as e:
+            print(f"Erro no streaming da explicação de {model_name}: {e}")
+        _finish(model_name, response, False, on_complete)
+
+    threading.Thread(target=drain, daemon=True).start()
+    return response
+
+
+def _close(stream):
+    close = getattr(stream, "close", None)
+    if close:
+        close()
+
+
+# Referências às tasks em segundo plano (o event loop guarda só referências fracas)
+_background_tasks = set()
+
+
+async def astream_move(model_name: str, model, messages, legal_index: LegalMoveIndex,
+                       explanation_tokens: int = STREAM_EXPLANATION_TOKENS,
+                       on_complete: Optional[Callable[[StreamedResponse], None]] = None,
+                       drain_timeout: float = STREAM_DRAIN_TIMEOUT) -> StreamedResponse:
+    """Versão assíncrona: retorna assim que o lance aparece; a explicação segue numa task"""
+    response = StreamedResponse()
+    stream = model.astream(messages)
+    try:
+        async for chunk in stream:
+            response.add(chunk)
+            move, method = early_move(response.content, legal_index)
+            if move:
+                response.found(move, method)
+                break
+        else:
+            _finish(model_name, response, False, on_complete)
+            return response
+    except BaseException:
+        # Timeout ou cancelamento: fecha a conexão do stream
+        await _aclose(stream)
+        raise
+    if explanation_tokens == 0:
+        await _aclose(stream)
+        _finish(model_name, response, True, on_complete)
+        return response
+
+    async def drain():
+        cut_off = False
+        try:
+            async for chunk in stream:
+                response.add(chunk)
+                if _explanation_done(response, explanation_tokens):
+                    cut_off = True
+                    break
+        finally:
+            await _aclose(stream)
+        return cut_off
+
+    async def drain_with_timeout():
+        try:
+            cut_off = await asyncio.wait_for(drain(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            cut_off = True
+        except Exception as e:
+            print(f"Erro no streaming da explicação de {model_name}: {e}")
+            cut_off = True
+        _finish(model_name, response, cut_off, on_complete)
+
+    task = asyncio.create_task(drain_with_timeout())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return response
+
+
+async def _aclose(stream):
+    aclose = getattr(stream, "aclose", None)
+    if aclose:
+        await aclose()
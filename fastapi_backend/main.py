@@ -1,15 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi_backend.dashboard import router as dashboard_router
-from fastapi_backend.arena import router as arena_router
+from fastapi_backend.arena import router as arena_router, resume_battles, start_shared_state
+from fastapi_backend.arena_engine import resume_from_checkpoints
+from fastapi_backend.checkpoint import CHECKPOINTS_ENABLED, get_checkpoint_store
 from fastapi_backend.settings import router as settings_router
-from fastapi_backend.models_manager import ModelManager
-from fastapi_backend.analysis import GameAnalyzer
+from fastapi_backend.state_backend import get_state_backend
+from fastapi_backend.models_manager import get_model_manager
+from fastapi_backend.model_registry import get_model_registry
+from fastapi_backend.telemetry import get_move_telemetry
+from fastapi_backend.analysis import game_analyzer
 from fastapi_backend.lichess_api import LichessAPI
 from fastapi_backend.pgn_importer import PGNImporter
 from fastapi_backend.human_game_utils import HumanGameUtils
 from fastapi_backend.analysis import router as analysis_router
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
 
 app = FastAPI()
@@ -32,13 +38,67 @@ pages_dir = os.path.abspath(os.path.join(
     os.path.dirname(__file__), '..', 'pages'))
 app.mount("/pages", StaticFiles(directory=pages_dir), name="pages")
 
-model_manager = ModelManager()
-game_analyzer = GameAnalyzer()
+model_manager = get_model_manager()
 lichess_api = LichessAPI()
 pgn_importer = PGNImporter()
 human_game_utils = HumanGameUtils()
 
 
+# Com vários workers só o dono desta trava retoma checkpoints (ele a renova
+# enquanto vive); os outros atendem status pelo estado compartilhado
+RESUME_LOCK = "resume_checkpoints"
+RESUME_LOCK_TTL_SECONDS = 60
+
+
+@app.on_event("startup")
+async def start_state_backend():
+    await start_shared_state()
+
+
+@app.on_event("startup")
+async def start_move_telemetry():
+    # Grava o buffer de telemetria periodicamente, fora do event loop
+    await get_move_telemetry().start()
+
+
+@app.on_event("startup")
+async def resume_checkpointed_work():
+    """Retoma batalhas e torneios interrompidos por um restart/reload"""
+    if not CHECKPOINTS_ENABLED:
+        return
+    if not get_state_backend().claim(RESUME_LOCK, RESUME_LOCK_TTL_SECONDS):
+        return
+    get_checkpoint_store().prune()
+    battles = resume_battles()
+    engine = resume_from_checkpoints()
+    if battles or engine["tournaments"] or engine["battles"]:
+        print(f"Retomados do checkpoint: {battles} batalhas LLM, "
+              f"{engine['tournaments']} torneios, {engine['battles']} batalhas simuladas")
+
+
+@app.on_event("shutdown")
+async def close_model_clients():
+    await get_model_registry().aclose()
+
+
+@app.on_event("shutdown")
+async def flush_move_telemetry():
+    await get_move_telemetry().stop()
+
+
+@app.on_event("shutdown")
+async def flush_checkpoints():
+    # Checkpoints ainda na fila da thread escritora
+    await asyncio.to_thread(get_checkpoint_store().flush)
+
+
+@app.on_event("shutdown")
+async def stop_state_backend():
+    backend = get_state_backend()
+    backend.release(RESUME_LOCK)
+    await backend.stop()
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
@@ -0,0 +1,168 @@
+"""
+Registro de clientes LLM compartilhado pelo processo.
+Cada cliente LangChain é criado só no primeiro uso do modelo, e os modelos
+de um mesmo provedor compartilham o pool HTTP (keep-alive), evitando novos
+handshakes TLS a cada cliente.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Limites dos pools HTTP compartilhados por provedor
+POOL_MAX_CONNECTIONS = 50
+POOL_MAX_KEEPALIVE = 20
+POOL_KEEPALIVE_EXPIRY = 120.0
+POOL_TIMEOUT = 60.0
+
+
+class ModelSpec:
+    """Como construir o cliente de um modelo; nada é instanciado no registro"""
+
+    def __init__(self, name: str, provider: str, factory: Callable[..., Any],
+                 base_url: Optional[str] = None, pooled: bool = False):
+        self.name = name
+        self.provider = provider
+        self.factory = factory
+        self.base_url = base_url
+        # pooled: a factory aceita http_client/http_async_client (SDKs baseados em httpx)
+        self.pooled = pooled
+
+
+class ProviderPool:
+    """Clientes httpx síncrono e assíncrono de um provedor"""
+
+    def __init__(self, provider: str, base_url: Optional[str]):
+        import httpx
+
+        limits = httpx.Limits(max_connections=POOL_MAX_CONNECTIONS,
+                              max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                              keepalive_expiry=POOL_KEEPALIVE_EXPIRY)
+        self.provider = provider
+        self.base_url = base_url
+        self.sync_client = httpx.Client(limits=limits, timeout=POOL_TIMEOUT)
+        self.async_client = httpx.AsyncClient(
+            limits=limits, timeout=POOL_TIMEOUT)
+        self.created_at = time.time()
+        self.warmups = 0
+        self.last_warmup_seconds = None
+
+    def warm(self) -> float:
+        """Abre (ou reaproveita) uma conexão com o host do provedor"""
+        if not self.base_url:
+            return 0.0
+        start = time.monotonic()
+        try:
+            self.sync_client.head(self.base_url)
+        except Exception as e:
+            print(f"Erro ao aquecer conexão com {self.provider}: {e}")
+        self.warmups += 1
+        self.last_warmup_seconds = time.monotonic() - start
+        return self.last_warmup_seconds
+
+    def _connections(self, client) -> Optional[int]:
+        # httpx não expõe o pool publicamente; melhor esforço para as estatísticas
+        try:
+            return len(client._transport._pool.connections)
+        except AttributeError:
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "sync_connections": self._connections(self.sync_client),
+            "async_connections": self._connections(self.async_client),
+            "warmups": self.warmups,
+            "last_warmup_seconds": self.last_warmup_seconds,
+            "age_seconds": round(time.time() - self.created_at, 1),
+        }
+
+    async def aclose(self):
+        self.sync_client.close()
+        await self.async_client.aclose()
+
+
+class ModelRegistry:
+    def __init__(self):
+        self.specs: Dict[str, ModelSpec] = {}
+        self.clients: Dict[str, Any] = {}
+        self.pools: Dict[str, ProviderPool] = {}
+        self.client_stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def register(self, spec: ModelSpec):
+        with self._lock:
+            self.specs.setdefault(spec.name, spec)
+
+    def spec(self, name: str) -> Optional[ModelSpec]:
+        return self.specs.get(name)
+
+    def available(self) -> List[str]:
+        return list(self.specs.keys())
+
+    def pool(self, provider: str, base_url: Optional[str] = None) -> ProviderPool:
+        with self._lock:
+            if provider not in self.pools:
+                self.pools[provider] = ProviderPool(provider, base_url)
+            return self.pools[provider]
+
+    def get(self, name: str):
+        """Cliente do modelo, construído no primeiro uso"""
+        client = self.clients.get(name)
+        if client is not None:
+            self.client_stats[name]["uses"] += 1
+            return client
+        spec = self.specs.get(name)
+        if spec is None:
+            return None
+        with self._lock:
+            if name not in self.clients:
+                start = time.monotonic()
+                if spec.pooled:
+                    pool = self.pool(spec.provider, spec.base_url)
+                    client = spec.factory(http_client=pool.sync_client,
+                                          http_async_client=pool.async_client)
+                else:
+                    client = spec.factory()
+                self.clients[name] = client
+                self.client_stats[name] = {
+                    "provider": spec.provider,
+                    "created_at": time.time(),
+                    "build_seconds": round(time.monotonic() - start, 4),
+                    "uses": 0,
+                }
+            self.client_stats[name]["uses"] += 1
+            return self.clients[name]
+
+    def warm(self, provider: str) -> Optional[float]:
+        """Aquece o pool do provedor sob demanda (antes de uma batalha, por exemplo)"""
+        spec = next((s for s in self.specs.values()
+                    if s.provider == provider and s.pooled), None)
+        if spec is None:
+            return None
+        return self.pool(provider, spec.base_url).warm()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "registered": len(self.specs),
+                "constructed": len(self.clients),
+                "clients": {name: dict(stats) for name, stats in self.client_stats.items()},
+                "pools": {provider: pool.stats() for provider, pool in self.pools.items()},
+            }
+
+    async def aclose(self):
+        """Fecha os pools HTTP (shutdown da aplicação)"""
+        with self._lock:
+            pools = list(self.pools.values())
+            self.pools.clear()
+            self.clients.clear()
+        for pool in pools:
+            await pool.aclose()
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    return _registry
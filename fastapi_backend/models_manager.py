@@ -4,39 +4,45 @@ Migrado de tests_streamlit/src/models.py
 """
 
 import os
+import importlib
+import importlib.util
 from typing import List, Dict, Any
 import time
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from dotenv import load_dotenv
-import time
-import anthropic
-
-# Tentar importar os provedores, mas permitir fallback se não instalados
-try:
-    from langchain_openai import ChatOpenAI
-except ImportError:
-    ChatOpenAI = None
-try:
-    from langchain_google_genai import ChatGoogleGenerativeAI
-except ImportError:
-    ChatGoogleGenerativeAI = None
-try:
-    from langchain_groq import ChatGroq
-except ImportError:
-    ChatGroq = None
-try:
-    from langchain_core.prompts import ChatPromptTemplate
-except ImportError:
-    ChatPromptTemplate = None
-try:
-    from langchain_anthropic import ChatAnthropic
-    CLAUDE_AVAILABLE = True
-except ImportError:
-    ChatAnthropic = None
-    CLAUDE_AVAILABLE = False
+from fastapi_backend.model_registry import ModelSpec, get_model_registry
+
+# SDKs dos provedores: (módulo, classe). Só são importados quando um modelo
+# configurado do provedor é usado pela primeira vez; no startup apenas
+# verificamos se o pacote está instalado, sem importá-lo.
+PROVIDER_CLASSES = {
+    "OpenAI": ("langchain_openai", "ChatOpenAI"),
+    "DeepSeek": ("langchain_openai", "ChatOpenAI"),
+    "Google": ("langchain_google_genai", "ChatGoogleGenerativeAI"),
+    "Groq": ("langchain_groq", "ChatGroq"),
+    "Anthropic": ("langchain_anthropic", "ChatAnthropic"),
+    # Provedor local para testes de carga (FAKE_MODELS)
+    "Fake": ("fastapi_backend.fake_provider", "FakeChatModel"),
+}
+
+
+def provider_installed(provider: str) -> bool:
+    module_name, _ = PROVIDER_CLASSES[provider]
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def load_chat_class(provider: str):
+    module_name, class_name = PROVIDER_CLASSES[provider]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _chat_prompt_template():
+    try:
+        from langchain_core.prompts import ChatPromptTemplate
+    except ImportError:
+        return None
+    return ChatPromptTemplate
 
 
 def get_env_var(key):
@@ -50,74 +56,74 @@ class ModelManager:
     """Manages all available LLM models and their configurations"""
 
     def __init__(self):
+        # Clientes ficam no registro do processo e só são criados no primeiro uso
+        self.registry = get_model_registry()
+        # Modelos adicionados explicitamente (add_model) têm precedência
         self.models = {}
         self.model_configs = {}
+        self._prompts = {}
         self._initialize_models()
 
     def _initialize_models(self):
         openai_key = get_env_var("OPENAI_API_KEY")
-        if openai_key and ChatOpenAI:
-            self.models.update({
-                "GPT-4o": ChatOpenAI(temperature=0.1, model='gpt-4o', api_key=openai_key),
-                "GPT-4-Turbo": ChatOpenAI(temperature=0.1, model='gpt-4-turbo', api_key=openai_key),
-                "GPT-3.5-Turbo": ChatOpenAI(temperature=0.1, model='gpt-3.5-turbo', api_key=openai_key),
-            })
+        if openai_key and provider_installed("OpenAI"):
+            for name, model_id in [("GPT-4o", "gpt-4o"), ("GPT-4-Turbo", "gpt-4-turbo"),
+                                   ("GPT-3.5-Turbo", "gpt-3.5-turbo")]:
+                self._register(name, "OpenAI",
+                               pool_url="https://api.openai.com/v1",
+                               temperature=0.1, model=model_id, api_key=openai_key)
         google_key = get_env_var("GOOGLE_API_KEY")
-        if google_key and ChatGoogleGenerativeAI:
-            self.models.update({
-                "Gemini-Pro": ChatGoogleGenerativeAI(temperature=0.1, model="gemini-1.5-pro-latest", google_api_key=google_key),
-                "Gemini-1.0-Pro": ChatGoogleGenerativeAI(temperature=0.1, model="gemini-1.0-pro", google_api_key=google_key),
-            })
+        if google_key and provider_installed("Google"):
+            # Cliente gRPC/REST próprio do SDK do Google: sem pool httpx compartilhado
+            for name, model_id in [("Gemini-Pro", "gemini-1.5-pro-latest"), ("Gemini-1.0-Pro", "gemini-1.0-pro")]:
+                self._register(name, "Google",
+                               temperature=0.1, model=model_id, google_api_key=google_key)
         deepseek_key = get_env_var("DEEPSEEK_API_KEY")
-        if deepseek_key and ChatOpenAI:
-            self.models.update({
-                "Deepseek-Chat": ChatOpenAI(
-                    temperature=0.1,
-                    model="deepseek-chat",
-                    api_key=deepseek_key,
-                    base_url="https://api.deepseek.com/v1"
-                ),
-                "Deepseek-Coder": ChatOpenAI(
-                    temperature=0.1,
-                    model="deepseek-coder",
-                    api_key=deepseek_key,
-                    base_url="https://api.deepseek.com/v1"
-                ),
-            })
+        if deepseek_key and provider_installed("DeepSeek"):
+            for name, model_id in [("Deepseek-Chat", "deepseek-chat"), ("Deepseek-Coder", "deepseek-coder")]:
+                self._register(name, "DeepSeek",
+                               pool_url="https://api.deepseek.com/v1",
+                               temperature=0.1, model=model_id, api_key=deepseek_key,
+                               base_url="https://api.deepseek.com/v1")
         groq_key = get_env_var("GROQ_API_KEY")
-        if groq_key and ChatGroq:
-            self.models.update({
-                "Llama3-70B": ChatGroq(temperature=0, model_name="llama3-70b-8192", groq_api_key=groq_key),
-                "Mixtral-8x7B": ChatGroq(temperature=0, model_name="mixtral-8x7b-32768", groq_api_key=groq_key),
-            })
+        if groq_key and provider_installed("Groq"):
+            for name, model_id in [("Llama3-70B", "llama3-70b-8192"), ("Mixtral-8x7B", "mixtral-8x7b-32768")]:
+                self._register(name, "Groq",
+                               pool_url="https://api.groq.com",
+                               temperature=0, model_name=model_id, groq_api_key=groq_key)
         claude_key = get_env_var("CLAUDE_API_KEY")
-        if claude_key and CLAUDE_AVAILABLE and ChatAnthropic:
-            self.models.update({
-                "Claude-3-Opus": ChatAnthropic(
-                    temperature=0.1,
-                    model_name="claude-3-opus-20240229",
-                    anthropic_api_key=claude_key
-                ),
-                "Claude-3-Sonnet": ChatAnthropic(
-                    temperature=0.1,
-                    model_name="claude-3-sonnet-20240229",
-                    anthropic_api_key=claude_key
-                ),
-                "Claude-3-Haiku": ChatAnthropic(
-                    temperature=0.1,
-                    model_name="claude-3-haiku-20240307",
-                    anthropic_api_key=claude_key
-                ),
-            })
+        if claude_key and provider_installed("Anthropic"):
+            for name, model_id in [("Claude-3-Opus", "claude-3-opus-20240229"),
+                                   ("Claude-3-Sonnet", "claude-3-sonnet-20240229"),
+                                   ("Claude-3-Haiku", "claude-3-haiku-20240307")]:
+                self._register(name, "Anthropic",
+                               temperature=0.1, model_name=model_id, anthropic_api_key=claude_key)
+        fake_models = get_env_var("FAKE_MODELS")
+        if fake_models:
+            from fastapi_backend.fake_provider import parse_fake_models
+            for name, options in parse_fake_models(fake_models).items():
+                self._register(name, "Fake", model_name=name, **options)
+
+    def _register(self, name: str, provider: str, pool_url: str = None, **kwargs):
+        """Registra como construir o cliente; pool_url indica SDK com pool httpx compartilhável"""
+        def factory(**http_clients):
+            chat_class = load_chat_class(provider)
+            return chat_class(**kwargs, **http_clients)
+        self.registry.register(ModelSpec(name, provider, factory, base_url=pool_url,
+                                         pooled=pool_url is not None))
 
     def get_available_models(self) -> Dict[str, bool]:
         status = {}
+        for name in self.registry.available():
+            status[name] = True
         for name, model in self.models.items():
             status[name] = True
         return status
 
     def get_model(self, model_name: str):
-        return self.models.get(model_name)
+        if model_name in self.models:
+            return self.models[model_name]
+        return self.registry.get(model_name)
 
     def test_model(self, model_name: str) -> Dict[str, Any]:
         model = self.get_model(model_name)
@@ -125,6 +131,7 @@ class ModelManager:
             return {"success": False, "error": "Model not found"}
         try:
             start_time = time.time()
+            ChatPromptTemplate = _chat_prompt_template()
             if not ChatPromptTemplate:
                 return {"success": False, "error": "PromptTemplate not available"}
             test_prompt = ChatPromptTemplate.from_messages([
@@ -149,6 +156,10 @@ class ModelManager:
             return {"success": False, "error": str(e)}
 
     def get_chess_prompt(self, color: str):
+        # O template é o mesmo em todos os lances: monta uma vez por cor
+        if color in self._prompts:
+            return self._prompts[color]
+        ChatPromptTemplate = _chat_prompt_template()
         if not ChatPromptTemplate:
             return None
         system_template = """
@@ -165,10 +176,11 @@ class ModelManager:
         My move: "Move"
         Brief explanation in Portuguese (max 2 sentences) of why you chose this move.
         """
-        return ChatPromptTemplate.from_messages([
+        self._prompts[color] = ChatPromptTemplate.from_messages([
             ("system", system_template.format(color=color)),
             ("human", "{input}")
         ])
+        return self._prompts[color]
 
     def update_model_config(self, model_name: str, config: Dict[str, Any]):
         self.model_configs[model_name] = config
@@ -176,7 +188,7 @@ class ModelManager:
             pass
 
     def get_model_info(self, model_name: str) -> Dict[str, Any]:
-        if model_name not in self.models:
+        if model_name not in self.get_available_models():
             return {}
         return {
             "name": model_name,
@@ -186,6 +198,9 @@ class ModelManager:
         }
 
     def _get_provider(self, model_name: str) -> str:
+        spec = self.registry.spec(model_name)
+        if spec:
+            return spec.provider
         if "GPT" in model_name:
             return "OpenAI"
         elif "Gemini" in model_name:
@@ -203,7 +218,7 @@ class ModelManager:
         self.models[name] = config
 
     def list_models(self) -> List[str]:
-        return list(self.models.keys())
+        return list(self.get_available_models().keys())
 
     def activate_model(self, name: str):
         if name in self.models:
@@ -214,3 +229,14 @@ class ModelManager:
             self.models[name]['active'] = False
 
     # Adicione outras funções conforme necessário para gerenciamento de modelos
+
+
+_model_manager = None
+
+
+def get_model_manager() -> ModelManager:
+    """ModelManager compartilhado por todos os routers e engines do processo"""
+    global _model_manager
+    if _model_manager is None:
+        _model_manager = ModelManager()
+    return _model_manager
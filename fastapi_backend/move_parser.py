@@ -0,0 +1,167 @@
+"""
+Extração tolerante de lances das respostas dos LLMs.
+Aceita UCI, SAN com variações de caixa, números de lance, roque com zeros
+e marcas de xeque, evitando uma nova chamada ao LLM por erro de formatação.
+"""
+
+import difflib
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import chess
+
+# Marcadores de lance nas respostas ("My move: ..." é o formato pedido no prompt)
+MOVE_MARKER = re.compile(
+    r'(?:my\s+move|move|meu\s+lance|lance|jogada)\s*[:：=-]\s*(.+)', re.IGNORECASE)
+MOVE_NUMBER = re.compile(r'^\d+\s*\.+\s*')
+LONG_ALGEBRAIC = re.compile(
+    r'^[KQRBN]?([a-h][1-8])\s*[-x:]?\s*([a-h][1-8])=?([qrbnQRBN])?$')
+CASTLING = re.compile(r'[0oO](-[0oO]){1,2}')
+PROMOTION_NO_EQUALS = re.compile(r'^([a-h](?:x[a-h])?[18])([QRBNqrbn])$')
+STRIP_CHARS = "\"'`*“”‘’.,;:!?()[]{}<>"
+FUZZY_CUTOFF = 0.8
+# Tokens examinados quando a resposta não tem marcador de lance
+MAX_SCAN_TOKENS = 60
+
+
+def normalize_token(token: str) -> str:
+    token = token.strip().strip(STRIP_CHARS)
+    token = MOVE_NUMBER.sub("", token)
+    token = token.rstrip("+#!?")
+    if CASTLING.fullmatch(token):
+        token = token.upper().replace("0", "O")
+    match = PROMOTION_NO_EQUALS.match(token)
+    if match:
+        token = f"{match.group(1)}={match.group(2).upper()}"
+    return token
+
+
+class LegalMoveIndex:
+    """Lances legais de uma posição indexados por UCI e SAN, calculados uma vez"""
+
+    def __init__(self, board: chess.Board):
+        self.by_uci: Dict[str, chess.Move] = {}
+        self.by_san: Dict[str, chess.Move] = {}
+        self.by_san_lower: Dict[str, List[chess.Move]] = {}
+        self.by_target: Dict[Tuple, List[chess.Move]] = {}
+        for move in board.legal_moves:
+            san = normalize_token(board.san(move))
+            self.by_uci[move.uci()] = move
+            self.by_san[san] = move
+            self.by_san_lower.setdefault(san.lower(), []).append(move)
+            piece = board.piece_type_at(move.from_square)
+            self.by_target.setdefault(
+                (piece, move.to_square, move.promotion), []).append(move)
+
+    def match(self, token: str, allow_close: bool = True) -> Tuple[Optional[chess.Move], Optional[str]]:
+        """Tenta UCI, depois SAN, depois correspondência aproximada"""
+        token = normalize_token(token)
+        if not token:
+            return None, None
+        move = self.by_uci.get(token.lower())
+        if move:
+            return move, "uci"
+        long_form = LONG_ALGEBRAIC.match(token)
+        if long_form:
+            uci = (long_form.group(1) + long_form.group(2) +
+                   (long_form.group(3) or "")).lower()
+            if uci in self.by_uci:
+                return self.by_uci[uci], "uci"
+        move = self.by_san.get(token)
+        if move:
+            return move, "san"
+        return self._fuzzy(token, allow_close)
+
+    def _fuzzy(self, token: str, allow_close: bool) -> Tuple[Optional[chess.Move], Optional[str]]:
+        candidates = self.by_san_lower.get(token.lower(), [])
+        if len(candidates) == 1:
+            return candidates[0], "fuzzy"
+        # Desambiguação ou captura supérflua: "Ngf3", "Nxf3" quando só há Nf3
+        match = re.fullmatch(
+            r'([KQRBNkqrbn])?[a-h]?[1-8]?x?([a-h][1-8])(?:=([QRBNqrbn]))?', token)
+        if match:
+            piece = chess.PIECE_SYMBOLS.index(
+                match.group(1).lower()) if match.group(1) else chess.PAWN
+            promotion = chess.PIECE_SYMBOLS.index(
+                match.group(3).lower()) if match.group(3) else None
+            moves = self.by_target.get(
+                (piece, chess.parse_square(match.group(2)), promotion), [])
+            if len(moves) == 1:
+                return moves[0], "fuzzy"
+        if not allow_close:
+            return None, None
+        close = difflib.get_close_matches(
+            token, list(self.by_san), n=2, cutoff=FUZZY_CUTOFF)
+        if len(close) == 1:
+            return self.by_san[close[0]], "fuzzy"
+        return None, None
+
+
+def extract_move(text: str, index: LegalMoveIndex) -> Tuple[Optional[chess.Move], Optional[str]]:
+    """Procura o lance primeiro após um marcador ("My move:") e depois no texto todo"""
+    for marker in MOVE_MARKER.finditer(text):
+        for token in marker.group(1).split()[:4]:
+            move, method = index.match(token)
+            if move:
+                return move, method
+    # Sem marcador válido: sem difflib, para não transformar palavras soltas em lances
+    for token in text.split()[:MAX_SCAN_TOKENS]:
+        move, method = index.match(token, allow_close=False)
+        if move:
+            return move, method
+    return None, None
+
+
+class ParseStats:
+    def __init__(self):
+        self.responses = 0
+        self.parsed = {"uci": 0, "san": 0, "fuzzy": 0}
+        self.failures = 0
+        self.retries = 0
+        self.fallbacks = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "responses": self.responses,
+            "parsed": dict(self.parsed),
+            "failures": self.failures,
+            "failure_rate": round(self.failures / self.responses, 4) if self.responses else 0.0,
+            "retries": self.retries,
+            "fallbacks": self.fallbacks,
+        }
+
+
+_parse_stats: Dict[str, ParseStats] = {}
+_parse_stats_lock = threading.Lock()
+
+
+def _stats_for(model_name: str) -> ParseStats:
+    if model_name not in _parse_stats:
+        _parse_stats[model_name] = ParseStats()
+    return _parse_stats[model_name]
+
+
+def record_parse(model_name: str, method: Optional[str]):
+    with _parse_stats_lock:
+        stats = _stats_for(model_name)
+        stats.responses += 1
+        if method:
+            stats.parsed[method] += 1
+        else:
+            stats.failures += 1
+
+
+def record_retry(model_name: str):
+    with _parse_stats_lock:
+        _stats_for(model_name).retries += 1
+
+
+def record_fallback(model_name: str):
+    with _parse_stats_lock:
+        _stats_for(model_name).fallbacks += 1
+
+
+def get_parse_stats() -> Dict[str, Any]:
+    with _parse_stats_lock:
+        return {name: stats.to_dict() for name, stats in _parse_stats.items()}
@@ -0,0 +1,193 @@
+"""
+Livro de aberturas: lances de abertura jogados direto, sem chamar o LLM.
+
+Formatos aceitos no campo opening (BattleRequest, torneios, jobs):
+- linha PGN completa: "1. e4 e5 2. Nf3 Nc6 3. Bb5"
+- várias linhas separadas por "|": a partida N usa a linha (N-1) % total
+- "suite:<nome>": suíte de OPENING_SUITES (ou do JSON em OPENING_SUITES_FILE),
+  também rotacionada pelo número da partida
+- livro polyglot: "book" (usa OPENING_BOOK_PATH), "book:<arquivo>" ou um
+  nome terminado em .bin; até OPENING_BOOK_MAX_PLIES lances, escolhidos
+  por peso com semente fixa por partida (a mesma partida repete a linha)
+
+Só são abertos livros dentro de OPENING_BOOK_DIR (padrão: o diretório de
+OPENING_BOOK_PATH); outros caminhos são recusados (validate_opening).
+
+Linhas inválidas valem até o último lance legal.
+"""
+
+import json
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import chess
+import chess.polyglot
+
+OPENING_BOOK_PATH = os.getenv("OPENING_BOOK_PATH")
+OPENING_BOOK_MAX_PLIES = int(os.getenv("OPENING_BOOK_MAX_PLIES", "12"))
+# "weighted": sorteio pelo peso das entradas; "best": sempre a de maior peso
+OPENING_BOOK_SELECTION = os.getenv("OPENING_BOOK_SELECTION", "weighted").lower()
+OPENING_SUITES_FILE = os.getenv("OPENING_SUITES_FILE")
+OPENING_BOOK_DIR = os.getenv("OPENING_BOOK_DIR") or os.path.dirname(OPENING_BOOK_PATH or "") or None
+# Livros mapeados em memória ao mesmo tempo (LRU)
+OPENING_BOOK_MAX_READERS = int(os.getenv("OPENING_BOOK_MAX_READERS", "8"))
+
+OPENING_SUITES: Dict[str, List[str]] = {
+    "classical": [
+        "1. e4 e5 2. Nf3 Nc6 3. Bb5 a6",
+        "1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 a6",
+        "1. e4 e6 2. d4 d5",
+        "1. e4 c6 2. d4 d5",
+        "1. d4 d5 2. c4 e6 3. Nc3 Nf6",
+        "1. d4 Nf6 2. c4 g6 3. Nc3 Bg7 4. e4 d6",
+        "1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5",
+        "1. c4 e5 2. Nc3 Nf6",
+    ],
+    "gambits": [
+        "1. e4 e5 2. f4 exf4",
+        "1. d4 d5 2. c4 dxc4",
+        "1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. b4",
+        "1. d4 Nf6 2. c4 c5 3. d5 b5",
+        "1. e4 e5 2. d4 exd4 3. c3",
+    ],
+}
+
+_MOVE_NUMBER = re.compile(r"^\d+\.+")
+_RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+
+_readers: "OrderedDict[str, chess.polyglot.MemoryMappedReader]" = OrderedDict()
+_readers_lock = threading.Lock()
+
+
+class BookNotAllowed(ValueError):
+    pass
+
+
+@lru_cache(maxsize=1)
+def get_opening_suites() -> Dict[str, List[str]]:
+    """Suítes embutidas mais as do arquivo OPENING_SUITES_FILE"""
+    suites = dict(OPENING_SUITES)
+    if OPENING_SUITES_FILE:
+        try:
+            with open(OPENING_SUITES_FILE, encoding="utf-8") as f:
+                suites.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Erro ao ler suítes de abertura {OPENING_SUITES_FILE}: {e}")
+    return suites
+
+
+@lru_cache(maxsize=256)
+def parse_line(line: str) -> Tuple[chess.Move, ...]:
+    """Lances de uma linha PGN a partir da posição inicial"""
+    board = chess.Board()
+    moves = []
+    for token in line.split():
+        token = _MOVE_NUMBER.sub("", token)
+        if not token or token in _RESULTS:
+            continue
+        try:
+            move = board.parse_san(token)
+        except ValueError:
+            print(f"Abertura '{line}': lance inválido '{token}', usando {len(moves)} lance(s)")
+            break
+        board.push(move)
+        moves.append(move)
+    return tuple(moves)
+
+
+def resolve_book(opening: str) -> Optional[str]:
+    """Caminho do livro polyglot pedido em opening (None se não for livro)"""
+    opening = (opening or "").strip()
+    if not (opening == "book" or opening.startswith("book:") or opening.endswith(".bin")):
+        return None
+    name = opening[5:] if opening.startswith("book:") else opening
+    if name == "book":
+        if not OPENING_BOOK_PATH:
+            raise BookNotAllowed("Abertura 'book' sem OPENING_BOOK_PATH configurado")
+        return OPENING_BOOK_PATH
+    if OPENING_BOOK_PATH and os.path.realpath(name) == os.path.realpath(OPENING_BOOK_PATH):
+        return OPENING_BOOK_PATH
+    if OPENING_BOOK_DIR:
+        root = os.path.realpath(OPENING_BOOK_DIR)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath([root, path]) == root and os.path.isfile(path):
+            return path
+    raise BookNotAllowed(f"Livro de aberturas não permitido: {name} (use um arquivo de OPENING_BOOK_DIR)")
+
+
+def validate_opening(opening: str):
+    """Levanta BookNotAllowed se opening pede um livro fora dos permitidos"""
+    resolve_book(opening)
+
+
+def _reader(path: str) -> chess.polyglot.MemoryMappedReader:
+    with _readers_lock:
+        reader = _readers.get(path)
+        if reader is None:
+            reader = _readers[path] = chess.polyglot.open_reader(path)
+            # O mmap do livro removido é liberado quando ninguém mais o usa
+            while len(_readers) > OPENING_BOOK_MAX_READERS:
+                _readers.popitem(last=False)
+        else:
+            _readers.move_to_end(path)
+        return reader
+
+
+def book_line(path: str, game_num: int = 1, max_plies: int = OPENING_BOOK_MAX_PLIES) -> List[chess.Move]:
+    """Segue o livro polyglot até sair dele ou completar max_plies"""
+    try:
+        reader = _reader(path)
+    except OSError as e:
+        print(f"Erro ao abrir livro de aberturas {path}: {e}")
+        return []
+    rng = random.Random(f"{path}:{game_num}")
+    board = chess.Board()
+    moves = []
+    while len(moves) < max_plies:
+        try:
+            if OPENING_BOOK_SELECTION == "best":
+                entry = reader.find(board)
+            else:
+                entry = reader.weighted_choice(board, random=rng)
+        except IndexError:
+            break
+        board.push(entry.move)
+        moves.append(entry.move)
+    return moves
+
+
+def opening_moves(opening: str, game_num: int = 1) -> List[chess.Move]:
+    """Lances de livro da partida game_num (1, 2, ...) de uma batalha"""
+    opening = (opening or "").strip()
+    try:
+        path = resolve_book(opening)
+    except BookNotAllowed as e:
+        print(e)
+        return []
+    if path:
+        return book_line(path, game_num)
+    if opening.startswith("suite:"):
+        lines = get_opening_suites().get(opening[6:])
+        if not lines:
+            print(f"Suíte de aberturas desconhecida: {opening[6:]}")
+            return []
+    else:
+        lines = [line for line in opening.split("|") if line.strip()]
+    if not lines:
+        return []
+    return list(parse_line(lines[(max(game_num, 1) - 1) % len(lines)].strip()))
+
+
+def book_plies(book: List[chess.Move], played: List[str]) -> int:
+    """Quantos dos lances UCI já jogados vieram do livro (retomada de checkpoint)"""
+    plies = 0
+    for move, uci in zip(book, played):
+        if move.uci() != uci:
+            break
+        plies += 1
+    return plies
@@ -0,0 +1,70 @@
+"""
+Construção incremental de PGN para partidas em andamento.
+Cada lance vira um token SAN acrescentado a uma lista; o PGN só é montado
+quando alguém pede, e o resultado fica em um snapshot imutável reaproveitado
+até o próximo lance. Leitores (endpoints de status) não precisam de lock: a
+lista só cresce e o snapshot é trocado por uma única atribuição.
+
+O texto gerado é o mesmo de str(game) do python-chess (sem quebra de linha).
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+import chess
+import chess.pgn
+
+
+class PgnSnapshot(NamedTuple):
+    plies: int
+    movetext: str
+
+
+class PgnBuilder:
+    def __init__(self, headers: Optional[Dict[str, str]] = None, board: Optional[chess.Board] = None):
+        # Headers() já vem com os sete cabeçalhos obrigatórios, na ordem do PGN
+        self._headers = chess.pgn.Headers()
+        self._headers.update(headers or {})
+        if board is not None and board.fen() != chess.STARTING_FEN:
+            self._headers["FEN"] = board.fen()
+            self._headers["SetUp"] = "1"
+        self._header_state = self._render_headers()
+        self._tokens: List[str] = []
+        self._snapshot = PgnSnapshot(0, "")
+
+    def _render_headers(self):
+        # (texto dos cabeçalhos, resultado) trocados juntos numa só atribuição
+        text = "\n".join(f'[{key} "{value}"]' for key, value in self._headers.items())
+        return text, self._headers.get("Result", "*")
+
+    def set_header(self, key: str, value: str):
+        self._headers[key] = value
+        self._header_state = self._render_headers()
+
+    @property
+    def plies(self) -> int:
+        return len(self._tokens)
+
+    def push(self, board: chess.Board, move: chess.Move) -> str:
+        """Registra o lance; chamar antes de board.push(move). Retorna o SAN"""
+        san = board.san(move)
+        if board.turn == chess.WHITE:
+            token = f"{board.fullmove_number}. {san}"
+        elif not self._tokens:
+            token = f"{board.fullmove_number}... {san}"
+        else:
+            token = san
+        self._tokens.append(token)
+        return san
+
+    def snapshot(self) -> PgnSnapshot:
+        plies = len(self._tokens)
+        snapshot = self._snapshot
+        if snapshot.plies != plies:
+            snapshot = PgnSnapshot(plies, " ".join(self._tokens[:plies]))
+            self._snapshot = snapshot
+        return snapshot
+
+    def pgn(self) -> str:
+        header_text, result = self._header_state
+        movetext = self.snapshot().movetext
+        return f"{header_text}\n\n{movetext} {result}" if movetext else f"{header_text}\n\n{result}"
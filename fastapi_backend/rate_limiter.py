@@ -0,0 +1,276 @@
+"""
+Limitador de taxa adaptativo por provedor de LLM.
+Token buckets para requisições/min e tokens/min, backoff exponencial com
+jitter nos erros 429 e aprendizado da taxa sustentável (AIMD).
+"""
+
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+
+def _env_rate(provider: str, rpm: int, tpm: int) -> Tuple[int, int]:
+    key = provider.upper()
+    return (int(os.getenv(f"{key}_RPM", rpm)), int(os.getenv(f"{key}_TPM", tpm)))
+
+
+# Limites iniciais (requisições/min, tokens/min) por provedor.
+# Funcionam como teto: a taxa real é aprendida a partir dos 429 recebidos.
+PROVIDER_RATE_LIMITS = {
+    "OpenAI": _env_rate("OpenAI", 500, 30000),
+    "Google": _env_rate("Google", 60, 32000),
+    "Groq": _env_rate("Groq", 30, 6000),
+    "Anthropic": _env_rate("Anthropic", 50, 40000),
+    "DeepSeek": _env_rate("DeepSeek", 60, 100000),
+    # Provedor falso (testes de carga): sem limite prático, a menos que configurado
+    "Fake": _env_rate("Fake", 1000000, 1000000000),
+    "Unknown": (30, 10000),
+}
+
+# Tokens de saída reservados por chamada (resposta curta: lance + explicação)
+COMPLETION_TOKENS_ESTIMATE = 150
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa grosseira (~4 caracteres por token)"""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Bucket com reabastecimento contínuo; reservas podem deixar saldo negativo (fila)"""
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        self.rate_per_min = rate_per_min
+        self.capacity = capacity if capacity is not None else rate_per_min
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.capacity, self.tokens +
+                          elapsed * self.rate_per_min / 60.0)
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Debita amount e retorna quantos segundos esperar até o saldo cobrir a reserva"""
+        self._refill(now)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens * 60.0 / self.rate_per_min
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def set_rate(self, rate_per_min: float, now: float):
+        self._refill(now)
+        self.rate_per_min = rate_per_min
+
+
+class ProviderRateLimiter:
+    """
+    Limita chamadas de um provedor. A taxa de requisições começa no teto
+    configurado, cai multiplicativamente a cada 429 e sobe aos poucos após
+    sequências de sucesso, convergindo para a taxa sustentável.
+    """
+
+    def __init__(self, provider: str, rpm: int, tpm: int,
+                 min_rpm: float = 1.0, decrease_factor: float = 0.7,
+                 increase_every: int = 10, base_backoff: float = 1.0,
+                 max_backoff: float = 60.0):
+        self.provider = provider
+        self.max_rpm = rpm
+        self.learned_rpm = float(rpm)
+        self.min_rpm = min_rpm
+        self.decrease_factor = decrease_factor
+        self.increase_every = increase_every
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.consecutive_throttles = 0
+        self.success_streak = 0
+        self.total_requests = 0
+        self.total_throttled = 0
+        self.total_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.requests.reserve(1, now),
+                       self.tokens.reserve(tokens, now),
+                       self.blocked_until - now)
+            self.total_requests += 1
+            self.total_wait_seconds += wait
+            return wait
+
+    def acquire(self, tokens: int = COMPLETION_TOKENS_ESTIMATE):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = COMPLETION_TOKENS_ESTIMATE):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated: int, actual: Optional[int]):
+        """Corrige o bucket de tokens com o uso real informado pelo provedor"""
+        if actual is None:
+            return
+        with self._lock:
+            self.tokens.refund(estimated - actual)
+
+    def on_success(self, headers: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self.consecutive_throttles = 0
+            self.success_streak += 1
+            if headers:
+                self._observe_headers(headers)
+            if self.success_streak >= self.increase_every and self.learned_rpm < self.max_rpm:
+                # Aumento aditivo: 5% do teto a cada sequência de sucessos
+                self.success_streak = 0
+                self.learned_rpm = min(
+                    self.max_rpm, self.learned_rpm + self.max_rpm * 0.05)
+                self.requests.set_rate(self.learned_rpm, time.monotonic())
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """Registra um 429; reduz a taxa e bloqueia o provedor pelo backoff. Retorna o atraso"""
+        with self._lock:
+            now = time.monotonic()
+            self.total_throttled += 1
+            if now < self.blocked_until:
+                # Chamadas concorrentes do mesmo episódio: a taxa cai uma vez só
+                return self.blocked_until - now
+            self.consecutive_throttles += 1
+            self.success_streak = 0
+            self.learned_rpm = max(
+                self.min_rpm, self.learned_rpm * self.decrease_factor)
+            self.requests.set_rate(self.learned_rpm, now)
+            # Esvazia o bucket para não disparar a rajada acumulada logo em seguida
+            self.requests.tokens = min(self.requests.tokens, 0)
+            delay = self.backoff_delay(self.consecutive_throttles)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            self.blocked_until = max(self.blocked_until, now + delay)
+            return delay
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Backoff exponencial com jitter (metade fixa, metade aleatória)"""
+        ceiling = min(self.max_backoff, self.base_backoff * (2 ** (attempt - 1)))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def _observe_headers(self, headers: Dict[str, Any]):
+        limit = _header(headers, "x-ratelimit-limit-requests")
+        if limit:
+            try:
+                self.max_rpm = int(limit)
+            except ValueError:
+                pass
+        remaining = _header(headers, "x-ratelimit-remaining-requests")
+        reset = _parse_duration(
+            _header(headers, "x-ratelimit-reset-requests"))
+        if remaining == "0" and reset:
+            self.blocked_until = max(
+                self.blocked_until, time.monotonic() + reset)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "max_rpm": self.max_rpm,
+            "learned_rpm": round(self.learned_rpm, 2),
+            "tpm": self.tokens.rate_per_min,
+            "requests": self.total_requests,
+            "throttled": self.total_throttled,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 3),
+        }
+
+
+def _header(headers, name: str) -> Optional[str]:
+    for key, value in headers.items():
+        if key.lower() == name:
+            return str(value)
+    return None
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Converte '1.5', '200ms', '6m0s' em segundos"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts:
+        return None
+    for number, unit in parts:
+        total += float(number) * {"ms": 0.001, "s": 1,
+                                  "m": 60, "h": 3600}[unit]
+    return total
+
+
+def _error_response(exc: Exception):
+    return getattr(exc, "response", None)
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    response = _error_response(exc)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    if status is not None:
+        # Status conhecido manda: um 500 com "429" no corpo/request id não é throttling
+        return status == 429
+    if "RateLimit" in type(exc).__name__ or "ResourceExhausted" in type(exc).__name__:
+        return True
+    message = str(exc).lower()
+    return "429" in message or "rate limit" in message or "resource_exhausted" in message
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Lê retry-after / x-ratelimit-reset-* dos headers do erro, se houver"""
+    response = _error_response(exc)
+    headers = getattr(response, "headers", None) if response is not None else None
+    if not headers:
+        return None
+    retry_after = _header(headers, "retry-after")
+    if retry_after:
+        seconds = _parse_duration(retry_after)
+        if seconds is not None:
+            return seconds
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return _parse_duration(_header(headers, "x-ratelimit-reset-requests")) or \
+        _parse_duration(_header(headers, "x-ratelimit-reset-tokens"))
+
+
+_limiters: Dict[str, ProviderRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """Limitador compartilhado pelo processo para o provedor"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            rpm, tpm = PROVIDER_RATE_LIMITS.get(
+                provider, PROVIDER_RATE_LIMITS["Unknown"])
+            _limiters[provider] = ProviderRateLimiter(provider, rpm, tpm)
+        return _limiters[provider]
+
+
+def get_rate_limiter_stats() -> Dict[str, Any]:
+    with _limiters_lock:
+        return {name: limiter.stats() for name, limiter in _limiters.items()}
@@ -1,9 +1,12 @@
 import uvicorn
+import os
 import socket
 import sys
 
 START_PORT = 8000
 MAX_PORT = 8019
+# Mais de um worker desliga o reload e usa o estado compartilhado em SQLite
+WORKERS = int(os.getenv("UVICORN_WORKERS", "1"))
 
 
 def is_port_in_use(port):
@@ -11,11 +14,16 @@ def is_port_in_use(port):
         return s.connect_ex(("127.0.0.1", port)) == 0
 
 
-def main():
+def main(workers=WORKERS):
+    if workers > 1:
+        # Herdado pelos processos dos workers
+        os.environ.setdefault("ARENA_STATE_BACKEND", "sqlite")
     for port in range(START_PORT, MAX_PORT + 1):
         if not is_port_in_use(port):
-            print(f"\n🚀 FastAPI backend rodando na porta {port}")
-            uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
+            print(f"\n🚀 FastAPI backend rodando na porta {port} ({workers} worker(s))")
+            # permessage-deflate: os deltas JSON repetem as mesmas chaves
+            uvicorn.run("main:app", host="0.0.0.0", port=port, reload=workers == 1,
+                        workers=workers, ws_per_message_deflate=True)
             break
         else:
             print(f"⚠️  Porta {port} em uso. Tentando próxima...")
@@ -25,4 +33,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS)
@@ -0,0 +1,110 @@
+"""
+Agendador de partidas concorrentes para o LLM Chess Arena.
+Limita quantas partidas rodam ao mesmo tempo por provedor e no total.
+"""
+
+import asyncio
+import os
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Partidas simultâneas por provedor (nomes de ModelManager._get_provider).
+# Uma partida ocupa um slot de cada provedor envolvido durante toda a partida.
+PROVIDER_CONCURRENCY = {
+    "OpenAI": int(os.getenv("OPENAI_MAX_CONCURRENT_GAMES", "8")),
+    "Google": int(os.getenv("GOOGLE_MAX_CONCURRENT_GAMES", "4")),
+    "Groq": int(os.getenv("GROQ_MAX_CONCURRENT_GAMES", "4")),
+    "Anthropic": int(os.getenv("ANTHROPIC_MAX_CONCURRENT_GAMES", "4")),
+    "DeepSeek": int(os.getenv("DEEPSEEK_MAX_CONCURRENT_GAMES", "4")),
+    "Fake": int(os.getenv("FAKE_MAX_CONCURRENT_GAMES", "1000")),
+    "Unknown": 2,
+}
+
+GLOBAL_CONCURRENCY = int(os.getenv("ARENA_MAX_CONCURRENT_GAMES", "16"))
+
+
+class GameScheduler:
+    """Executa partidas em paralelo respeitando semáforos por provedor e um limite global"""
+
+    def __init__(self, provider_of: Callable[[str], str],
+                 provider_limits: Optional[Dict[str, int]] = None,
+                 global_limit: int = GLOBAL_CONCURRENCY):
+        self.provider_of = provider_of
+        self.provider_limits = dict(PROVIDER_CONCURRENCY)
+        if provider_limits:
+            self.provider_limits.update(provider_limits)
+        self.global_limit = global_limit
+        self._global = asyncio.Semaphore(global_limit)
+        self._providers: Dict[str, asyncio.Semaphore] = {}
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self._provider_queued: Dict[str, int] = {}
+        self._provider_in_flight: Dict[str, int] = {}
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._providers:
+            limit = self.provider_limits.get(
+                provider, self.provider_limits["Unknown"])
+            self._providers[provider] = asyncio.Semaphore(limit)
+        return self._providers[provider]
+
+    def _count(self, counters: Dict[str, int], providers, delta: int):
+        for provider in providers:
+            counters[provider] = counters.get(provider, 0) + delta
+
+    async def run(self, white_model: str, black_model: str,
+                  game_factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Aguarda slots livres e executa a partida criada por game_factory"""
+        # Ordem fixa de aquisição evita deadlock entre partidas de provedores cruzados
+        providers = sorted({self.provider_of(white_model),
+                           self.provider_of(black_model)})
+        self.queued += 1
+        self._count(self._provider_queued, providers, 1)
+        started = False
+        try:
+            async with AsyncExitStack() as stack:
+                # Provedores antes do global: quem espera um provedor lotado
+                # não segura um slot global que outra partida poderia usar
+                for provider in providers:
+                    await stack.enter_async_context(self._semaphore(provider))
+                await stack.enter_async_context(self._global)
+                self.queued -= 1
+                self._count(self._provider_queued, providers, -1)
+                self.in_flight += 1
+                self._count(self._provider_in_flight, providers, 1)
+                started = True
+                try:
+                    result = await game_factory()
+                    self.completed += 1
+                    return result
+                except Exception:
+                    self.failed += 1
+                    raise
+                finally:
+                    self.in_flight -= 1
+                    self._count(self._provider_in_flight, providers, -1)
+        finally:
+            if not started:
+                self.queued -= 1
+                self._count(self._provider_queued, providers, -1)
+
+    def stats(self) -> Dict[str, Any]:
+        providers = set(self._providers) | set(self._provider_queued)
+        return {
+            "global_limit": self.global_limit,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "providers": {
+                provider: {
+                    "limit": self.provider_limits.get(
+                        provider, self.provider_limits["Unknown"]),
+                    "queued": self._provider_queued.get(provider, 0),
+                    "in_flight": self._provider_in_flight.get(provider, 0),
+                }
+                for provider in sorted(providers)
+            }
+        }
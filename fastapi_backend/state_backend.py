@@ -0,0 +1,265 @@
+"""
+Estado compartilhado entre workers do uvicorn.
+- "memory" (padrão): tudo no processo, como antes; um único worker.
+- "sqlite": estado de partidas/batalhas/torneios numa tabela chave-valor e
+  eventos de broadcast numa tabela de log que cada worker lê a partir do
+  último id visto. Qualquer worker responde consultas de status e repassa
+  aos seus clientes WebSocket as atualizações geradas nos outros.
+
+O SQLite não tem LISTEN/NOTIFY, então o pub/sub é uma leitura incremental
+da tabela de eventos a cada STATE_EVENTS_POLL_SECONDS (consulta indexada
+por id, barata quando não há nada novo).
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+STATE_BACKEND = os.getenv("ARENA_STATE_BACKEND", "memory").lower()
+STATE_DB_PATH = os.getenv("ARENA_STATE_DB") or os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', 'arena_state.db'))
+STATE_EVENTS_POLL_SECONDS = float(os.getenv("STATE_EVENTS_POLL_SECONDS", "0.1"))
+# Eventos mais antigos que isso são apagados (ninguém mais vai lê-los)
+STATE_EVENTS_RETENTION_SECONDS = float(
+    os.getenv("STATE_EVENTS_RETENTION_SECONDS", "300"))
+
+EventHandler = Callable[[str, Dict[str, Any]], None]
+
+
+class MemoryStateBackend:
+    """Estado no próprio processo; publish não sai do processo"""
+
+    shared = False
+
+    def __init__(self):
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def put(self, namespace: str, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = value
+
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._data.get(namespace, {}).get(key)
+
+    def put_if(self, namespace: str, key: str, value: Dict[str, Any], field: str, expected: Any) -> bool:
+        """Compare-and-set: grava só se o valor atual existe e tem value[field] == expected"""
+        with self._lock:
+            items = self._data.get(namespace, {})
+            current = items.get(key)
+            if current is None or current.get(field) != expected:
+                return False
+            items[key] = value
+            return True
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._data.get(namespace, {}).pop(key, None)
+
+    def list(self, namespace: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._data.get(namespace, {}).values())
+
+    def clear(self, namespace: str):
+        with self._lock:
+            self._data.pop(namespace, None)
+
+    def claim(self, name: str, ttl_seconds: float) -> bool:
+        """Trava entre workers (ex.: só um retoma checkpoints); sempre livre aqui"""
+        return True
+
+    def release(self, name: str):
+        pass
+
+    def publish(self, channel: str, message: Dict[str, Any]):
+        self.published += 1
+
+    async def start(self, handler: EventHandler):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {namespace: len(items)
+                      for namespace, items in self._data.items()}
+        return {"backend": "memory", "worker_id": self.worker_id, "keys": counts,
+                "published": self.published}
+
+
+class SQLiteStateBackend(MemoryStateBackend):
+    shared = True
+
+    def __init__(self, db_path: str = STATE_DB_PATH):
+        super().__init__()
+        self.db_path = db_path
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS shared_state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE TABLE IF NOT EXISTS state_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+        self._conn.commit()
+        # Só eventos publicados depois que este worker subiu
+        self.last_event_id = self._conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM state_events").fetchone()[0]
+        self._poller: Optional[asyncio.Task] = None
+        self.received = 0
+        # Travas deste worker, renovadas pelo _poll enquanto ele estiver vivo
+        self._claims: Dict[str, float] = {}
+
+    def _write(self, sql: str, params: tuple) -> int:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def put(self, namespace: str, key: str, value: Dict[str, Any]):
+        self._write("INSERT OR REPLACE INTO shared_state (namespace, key, value, updated_at) "
+                    "VALUES (?, ?, ?, ?)", (namespace, key, json.dumps(value, default=str), time.time()))
+
+    def put_if(self, namespace: str, key: str, value: Dict[str, Any], field: str, expected: Any) -> bool:
+        return self._write("UPDATE shared_state SET value = ?, updated_at = ? "
+                           "WHERE namespace = ? AND key = ? AND json_extract(value, ?) = ?",
+                           (json.dumps(value, default=str), time.time(), namespace, key,
+                            f"$.{field}", expected)) == 1
+
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM shared_state WHERE namespace = ? AND key = ?",
+                                     (namespace, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, namespace: str, key: str):
+        self._write("DELETE FROM shared_state WHERE namespace = ? AND key = ?",
+                    (namespace, key))
+
+    def list(self, namespace: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT value FROM shared_state WHERE namespace = ? "
+                                      "ORDER BY updated_at", (namespace,)).fetchall()
+        return [json.loads(value) for value, in rows]
+
+    def clear(self, namespace: str):
+        self._write("DELETE FROM shared_state WHERE namespace = ?", (namespace,))
+
+    def claim(self, name: str, ttl_seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT value, updated_at FROM shared_state "
+                                         "WHERE namespace = 'locks' AND key = ?", (name,)).fetchone()
+                if row and json.loads(row[0]).get("owner") != self.worker_id and now - row[1] < ttl_seconds:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute("INSERT OR REPLACE INTO shared_state (namespace, key, value, updated_at) "
+                                   "VALUES ('locks', ?, ?, ?)",
+                                   (name, json.dumps({"owner": self.worker_id}), now))
+                self._conn.execute("COMMIT")
+                self._claims[name] = ttl_seconds
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def release(self, name: str):
+        self._claims.pop(name, None)
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_state WHERE namespace = 'locks' AND key = ? "
+                               "AND json_extract(value, '$.owner') = ?", (name, self.worker_id))
+            self._conn.commit()
+
+    def publish(self, channel: str, message: Dict[str, Any]):
+        self._write("INSERT INTO state_events (channel, origin, payload, created_at) VALUES (?, ?, ?, ?)",
+                    (channel, self.worker_id, json.dumps(message, default=str), time.time()))
+        self.published += 1
+
+    def _read_events(self) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, channel, origin, payload FROM state_events WHERE id > ? ORDER BY id",
+                (self.last_event_id,)).fetchall()
+
+    async def start(self, handler: EventHandler):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll(handler))
+
+    async def _poll(self, handler: EventHandler):
+        last_prune = last_renew = time.monotonic()
+        while True:
+            try:
+                for event_id, channel, origin, payload in self._read_events():
+                    self.last_event_id = event_id
+                    if origin == self.worker_id:
+                        continue
+                    self.received += 1
+                    try:
+                        handler(channel, json.loads(payload))
+                    except Exception as e:
+                        print(f"Erro ao tratar evento compartilhado ({channel}): {e}")
+                if self._claims and time.monotonic() - last_renew > min(self._claims.values()) / 3:
+                    for name, ttl_seconds in list(self._claims.items()):
+                        self.claim(name, ttl_seconds)
+                    last_renew = time.monotonic()
+                if time.monotonic() - last_prune > STATE_EVENTS_RETENTION_SECONDS:
+                    self._write("DELETE FROM state_events WHERE created_at < ?",
+                                (time.time() - STATE_EVENTS_RETENTION_SECONDS,))
+                    last_prune = time.monotonic()
+            except sqlite3.Error as e:
+                print(f"Erro ao ler eventos compartilhados: {e}")
+            await asyncio.sleep(STATE_EVENTS_POLL_SECONDS)
+
+    async def stop(self):
+        if self._poller:
+            self._poller.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, COUNT(*) FROM shared_state GROUP BY namespace").fetchall()
+        return {"backend": "sqlite", "db_path": self.db_path, "worker_id": self.worker_id,
+                "keys": dict(rows), "claims": sorted(self._claims),
+                "published": self.published, "received": self.received,
+                "last_event_id": self.last_event_id}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STATE_BACKEND == "sqlite":
+                    _backend = SQLiteStateBackend()
+                else:
+                    if STATE_BACKEND != "memory":
+                        print(f"ARENA_STATE_BACKEND desconhecido: {STATE_BACKEND}; usando memory")
+                    _backend = MemoryStateBackend()
+    return _backend
@@ -0,0 +1,257 @@
+"""
+Telemetria por lance das partidas entre LLMs.
+Cada ply registra modelo, provedor, tempo de parede, tokens de prompt e de
+resposta, tentativas, falhas de parsing e se o lance de fallback foi usado.
+Cada linha entra no buffer compartilhado assim que o lance é jogado (partidas
+canceladas ou interrompidas também ficam registradas) e vai para a tabela
+move_metrics em lotes, gravados por uma task periódica fora do event loop.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import chess
+
+from fastapi_backend.database import GameDatabase
+from fastapi_backend.rate_limiter import estimate_tokens
+
+MOVE_TELEMETRY_ENABLED = os.getenv(
+    "MOVE_TELEMETRY", "true").lower() in ("1", "true", "yes")
+# Linhas acumuladas antes de gravar, e intervalo máximo entre gravações
+MOVE_TELEMETRY_BATCH = int(os.getenv("MOVE_TELEMETRY_BATCH", "200"))
+MOVE_TELEMETRY_FLUSH_SECONDS = float(
+    os.getenv("MOVE_TELEMETRY_FLUSH_SECONDS", "5"))
+# Com o banco falhando, as linhas voltam ao buffer até esse limite (as mais
+# antigas são descartadas além dele)
+MOVE_TELEMETRY_MAX_BUFFER = int(
+    os.getenv("MOVE_TELEMETRY_MAX_BUFFER", str(10 * MOVE_TELEMETRY_BATCH)))
+
+MOVE_METRIC_COLUMNS = ("game_uid", "ply", "color", "model_name", "provider", "move_uci",
+                       "wall_seconds", "prompt_tokens", "completion_tokens", "tokens_estimated",
+                       "attempts", "retries", "parse_failures", "rate_limited", "errors", "fallback")
+
+
+class MoveProbe:
+    """Coleta os números de uma chamada a get_ai_move/aget_ai_move"""
+
+    def __init__(self, model_name: str, provider: str):
+        self.model_name = model_name
+        self.provider = provider
+        self.started = time.monotonic()
+        self.wall_seconds = None
+        self.prompt_estimate = 0
+        self.attempts = 0
+        self.parse_failures = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.fallback = False
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tokens_estimated = False
+
+    def set_messages(self, messages):
+        self.prompt_estimate = sum(estimate_tokens(getattr(m, "content", str(m)))
+                                   for m in messages)
+
+    def observe_error(self):
+        self.attempts += 1
+        self.errors += 1
+
+    def observe_response(self, response):
+        """Soma o uso de tokens informado pelo provedor; estima quando não há"""
+        self.attempts += 1
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("input_tokens") is not None:
+            self.prompt_tokens += usage["input_tokens"]
+            self.completion_tokens += usage.get("output_tokens", 0)
+            return
+        content = getattr(response, "content", str(response))
+        self.prompt_tokens += self.prompt_estimate
+        self.completion_tokens += estimate_tokens(
+            content if isinstance(content, str) else str(content))
+        self.tokens_estimated = True
+
+    def finish(self):
+        self.wall_seconds = time.monotonic() - self.started
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+
+class GameTelemetry:
+    """Linhas de telemetria de uma partida; cada uma também vai para o recorder"""
+
+    def __init__(self, recorder: "MoveTelemetryRecorder" = None):
+        self.game_uid = uuid.uuid4().hex
+        self.rows: List[tuple] = []
+        self.recorder = recorder
+
+    def record(self, board: chess.Board, move: Optional[chess.Move], probe: MoveProbe):
+        """Chamar antes de board.push(move)"""
+        if probe.wall_seconds is None:
+            probe.finish()
+        self.rows.append((
+            self.game_uid, board.ply() + 1,
+            "white" if board.turn == chess.WHITE else "black",
+            probe.model_name, probe.provider, move.uci() if move else None,
+            round(probe.wall_seconds, 4), probe.prompt_tokens, probe.completion_tokens,
+            int(probe.tokens_estimated), probe.attempts, probe.retries,
+            probe.parse_failures, probe.rate_limited, probe.errors, int(probe.fallback),
+        ))
+        if self.recorder is not None:
+            self.recorder.add_row(self.rows[-1])
+
+    def summary(self) -> Dict[str, Any]:
+        return {"game_uid": self.game_uid,
+                "models": summarize_move_metrics([dict(zip(MOVE_METRIC_COLUMNS, row)) for row in self.rows])}
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize_move_metrics(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """p50/p95/p99 de latência e tokens por lance, agrupados por modelo"""
+    by_model: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_model.setdefault(row["model_name"], []).append(row)
+    summary = {}
+    for model, model_rows in by_model.items():
+        latencies = sorted(r["wall_seconds"] for r in model_rows)
+        tokens = sorted(r["prompt_tokens"] + r["completion_tokens"]
+                        for r in model_rows)
+        moves = len(model_rows)
+        summary[model] = {
+            "provider": model_rows[0]["provider"],
+            "moves": moves,
+            "latency_seconds": {f"p{int(q * 100)}": round(percentile(latencies, q), 4)
+                                for q in (0.5, 0.95, 0.99)},
+            "tokens_per_move": {
+                "avg_prompt": round(sum(r["prompt_tokens"] for r in model_rows) / moves, 1),
+                "avg_completion": round(sum(r["completion_tokens"] for r in model_rows) / moves, 1),
+                "p50": percentile(tokens, 0.5),
+                "p95": percentile(tokens, 0.95),
+                "p99": percentile(tokens, 0.99),
+                "estimated_share": round(sum(r["tokens_estimated"] for r in model_rows) / moves, 4),
+            },
+            "retries": sum(r["retries"] for r in model_rows),
+            "parse_failures": sum(r["parse_failures"] for r in model_rows),
+            "rate_limited": sum(r["rate_limited"] for r in model_rows),
+            "fallback_rate": round(sum(r["fallback"] for r in model_rows) / moves, 4),
+        }
+    return summary
+
+
+class MoveTelemetryRecorder:
+    """
+    Buffer compartilhado; grava com executemany a cada lote ou intervalo.
+    Com start() rodando, a gravação é feita pela task periódica em
+    asyncio.to_thread; sem ela (scripts síncronos), no próprio add_row.
+    """
+
+    def __init__(self, db: GameDatabase = None, batch_size: int = MOVE_TELEMETRY_BATCH,
+                 flush_seconds: float = MOVE_TELEMETRY_FLUSH_SECONDS,
+                 max_buffer: int = MOVE_TELEMETRY_MAX_BUFFER):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max(max_buffer, batch_size)
+        self.buffer: List[tuple] = []
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+        self.batches_written = 0
+        self.rows_dropped = 0
+        # Linhas novas desde a última tentativa (após uma falha, espera outro lote)
+        self._added = 0
+        self._lock = threading.Lock()
+        self._task = None
+        self._loop = None
+        self._wake = None
+
+    def _database(self) -> GameDatabase:
+        if self.db is None:
+            self.db = GameDatabase()
+        return self.db
+
+    def add_row(self, row: tuple):
+        with self._lock:
+            self.buffer.append(row)
+            self._added += 1
+            full = self._added >= self.batch_size
+        if not full:
+            return
+        if self._task is None:
+            self.flush()
+        else:
+            # Lote cheio: acorda a task (add_row pode vir de outra thread)
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Para a task periódica e grava o que restou no buffer"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await asyncio.to_thread(self.flush)
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self.buffer = self.buffer, []
+            self._added = 0
+            self.last_flush = time.monotonic()
+        if not rows:
+            return 0
+        try:
+            self._database().save_move_metrics(MOVE_METRIC_COLUMNS, rows)
+        except Exception as e:
+            print(f"Erro ao gravar telemetria de lances: {e}")
+            with self._lock:
+                # Volta para a frente do buffer; a próxima gravação tenta de novo
+                self.buffer[:0] = rows
+                overflow = len(self.buffer) - self.max_buffer
+                if overflow > 0:
+                    del self.buffer[:overflow]
+                    self.rows_dropped += overflow
+            return 0
+        with self._lock:
+            self.rows_written += len(rows)
+            self.batches_written += 1
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": MOVE_TELEMETRY_ENABLED, "buffered": len(self.buffer),
+                    "rows_written": self.rows_written, "batches_written": self.batches_written,
+                    "rows_dropped": self.rows_dropped}
+
+
+_recorder = MoveTelemetryRecorder()
+
+
+def get_move_telemetry() -> MoveTelemetryRecorder:
+    return _recorder
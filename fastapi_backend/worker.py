@@ -0,0 +1,185 @@
+"""
+Worker de partidas da fila distribuída (ver job_queue.py).
+
+Uso (na raiz do repositório):
+    # mesma máquina do coordenador: lê a fila direto do banco
+    python -m fastapi_backend.worker --concurrency 4
+    # outra máquina: fala com o coordenador pela API /api/arena/jobs
+    # (ARENA_WORKER_TOKEN igual ao do coordenador)
+    python -m fastapi_backend.worker --coordinator http://host:8000 --concurrency 4
+
+Cada slot pega um job, joga a partida com GameEngine.aplay_game e renova o
+lease enquanto joga, gravando os lances feitos (o coordenador transmite ao
+vivo e, se este processo morrer, outro worker continua desses lances).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+import urllib.request
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi_backend.job_queue import JOB_LEASE_SECONDS, JOB_WORKER_TOKEN, get_job_queue
+from fastapi_backend.telemetry import get_move_telemetry
+
+# Lances novos são enviados ao coordenador no máximo a cada X segundos
+JOB_PROGRESS_SECONDS = float(os.getenv("JOB_PROGRESS_SECONDS", "1.0"))
+WORKER_IDLE_SECONDS = float(os.getenv("WORKER_IDLE_SECONDS", "1.0"))
+
+
+class HttpJobClient:
+    """Mesma interface de GameJobQueue, via endpoints /api/arena/jobs do coordenador"""
+
+    def __init__(self, base_url: str, timeout: float = 30, token: Optional[str] = JOB_WORKER_TOKEN):
+        self.base_url = base_url.rstrip("/") + "/api/arena/jobs"
+        self.timeout = timeout
+        self.token = token
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Any:
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json", "X-Worker-Token": self.token or ""},
+            method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def lease(self, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        return self._post("/lease", {"worker_id": worker_id, "lease_seconds": lease_seconds}).get("job")
+
+    def heartbeat(self, job_id: str, worker_id: str, moves: List[str] = None,
+                  lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        return self._post(f"/{job_id}/heartbeat", {"worker_id": worker_id, "moves": moves,
+                                                  "lease_seconds": lease_seconds})["ok"]
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        return self._post(f"/{job_id}/complete", {"worker_id": worker_id, "result": result})["ok"]
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        return self._post(f"/{job_id}/fail", {"worker_id": worker_id, "error": error})["ok"]
+
+
+class GameWorker:
+    def __init__(self, queue, concurrency: int = 1, worker_id: str = None,
+                 lease_seconds: float = JOB_LEASE_SECONDS):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.played = 0
+        self.failed = 0
+        self._engine = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            # Import tardio: carrega provedores e modelos só quando há trabalho
+            from fastapi_backend.game_engine import GameEngine
+            self._engine = GameEngine()
+        return self._engine
+
+    async def run(self, max_jobs: int = None, exit_when_idle: bool = False):
+        """Roda os slots até max_jobs partidas (ou a fila esvaziar, com exit_when_idle)"""
+        telemetry = get_move_telemetry()
+        await telemetry.start()
+        try:
+            await asyncio.gather(*[self._slot(max_jobs, exit_when_idle)
+                                   for _ in range(self.concurrency)])
+        finally:
+            await telemetry.stop()
+
+    async def _slot(self, max_jobs: Optional[int], exit_when_idle: bool):
+        while max_jobs is None or self.played + self.failed < max_jobs:
+            try:
+                job = await asyncio.to_thread(self.queue.lease, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Erro ao pegar job da fila: {e}")
+                job = None
+            if job is None:
+                if exit_when_idle:
+                    return
+                await asyncio.sleep(WORKER_IDLE_SECONDS)
+                continue
+            await self.play(job)
+
+    async def play(self, job: Dict[str, Any]):
+        state = {"board": None, "dirty": False}
+
+        def on_move(board, san):
+            state["board"] = board
+            state["dirty"] = True
+
+        game = asyncio.create_task(self.engine.aplay_game(
+            job["white"], job["black"], job["opening"] or "1. e4",
+            initial_moves=job["progress"] or None, on_move=on_move, game_num=job["game_num"]))
+        beats = asyncio.create_task(self._heartbeat(job["id"], state, game))
+        try:
+            result = await game
+        except asyncio.CancelledError:
+            if beats.done() and not beats.result():
+                print(f"Job {job['id']} perdido (lease vencido ou cancelado); abandonando")
+                return
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"Erro na partida do job {job['id']}: {e}")
+            await asyncio.to_thread(self.queue.fail, job["id"], self.worker_id, str(e))
+            return
+        finally:
+            beats.cancel()
+        payload = {key: result[key] for key in ("white", "black", "result", "moves", "fen", "pgn",
+                                                "san_moves")}
+        if state["board"] is not None:
+            payload["uci_moves"] = [move.uci() for move in state["board"].move_stack]
+        if await asyncio.to_thread(self.queue.complete, job["id"], self.worker_id, payload):
+            self.played += 1
+
+    async def _heartbeat(self, job_id: str, state: Dict[str, Any], game: asyncio.Task) -> bool:
+        """Renova o lease e envia os lances; cancela a partida se o job foi perdido"""
+        last_beat = time.monotonic()
+        while True:
+            await asyncio.sleep(JOB_PROGRESS_SECONDS)
+            due = time.monotonic() - last_beat > self.lease_seconds / 3
+            if not (state["dirty"] or due):
+                continue
+            moves = None
+            if state["dirty"]:
+                state["dirty"] = False
+                moves = [move.uci() for move in state["board"].move_stack]
+            try:
+                ok = await asyncio.to_thread(self.queue.heartbeat, job_id, self.worker_id,
+                                             moves, self.lease_seconds)
+            except Exception as e:
+                # Coordenador fora do ar: continua jogando e tenta de novo
+                print(f"Erro no heartbeat do job {job_id}: {e}")
+                continue
+            last_beat = time.monotonic()
+            if not ok:
+                game.cancel()
+                return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker de partidas da fila distribuída")
+    parser.add_argument("--coordinator", help="URL do backend (sem isso, usa o banco local)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Partidas simultâneas")
+    parser.add_argument("--max-jobs", type=int, help="Sai depois de N partidas")
+    parser.add_argument("--exit-when-idle", action="store_true",
+                        help="Sai quando a fila estiver vazia")
+    parser.add_argument("--worker-id")
+    args = parser.parse_args()
+    queue = HttpJobClient(args.coordinator) if args.coordinator else get_job_queue()
+    worker = GameWorker(queue, args.concurrency, args.worker_id)
+    print(f"Worker {worker.worker_id}: {worker.concurrency} slot(s)")
+    try:
+        asyncio.run(worker.run(args.max_jobs, args.exit_when_idle))
+    except KeyboardInterrupt:
+        pass
+    print(f"Worker {worker.worker_id}: {worker.played} partidas, {worker.failed} falhas")
+
+
+if __name__ == "__main__":
+    main()
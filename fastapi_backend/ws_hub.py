@@ -0,0 +1,267 @@
+"""
+Fan-out de atualizações por WebSocket com tópicos e fila por cliente.
+Cada cliente assina tópicos ("battle:<id>", "game:<id>", "tournament:<id>"
+ou "*" para tudo) e tem uma fila limitada com uma task própria de envio:
+um cliente lento só atrasa a si mesmo. Fila cheia descarta a mensagem mais
+antiga (menos as finais: battle_finished, battle_error, fim de partida);
+mensagens com a mesma chave de coalescência (ex.: estado de uma batalha)
+substituem a versão ainda não enviada.
+
+Protocolo (texto JSON vindo do cliente):
+- {"action": "subscribe", "topics": ["battle:<id>"]}
+- {"action": "unsubscribe", "topics": [...]}
+- {"type": "pong"} em resposta ao {"type": "ping"} periódico do servidor
+Clientes que nunca mandam nada (frontend antigo) recebem só os eventos que
+ele trata (LEGACY_EVENTS: resumos de batalha/torneio e lances das partidas
+humanas), sem os deltas por lance, e só são removidos se um envio demorar
+mais que WS_SEND_TIMEOUT_SECONDS.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "20"))
+# Sem pong por esse tempo, o cliente é removido
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "60"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+ALL_TOPICS = "*"
+# Assinatura implícita de quem não escolhe tópicos: filtra pelo tipo do evento
+LEGACY_TOPICS = "legacy"
+LEGACY_EVENTS = {"battle_update", "battle_finished", "battle_error", "tournament_update",
+                 "move_made", "ai_move"}
+# Mensagens finais: a fila cheia nunca as descarta
+TERMINAL_EVENTS = {"battle_finished", "battle_error", "end"}
+
+
+class ClientQueue:
+    """Fila limitada com descarte do mais antigo e coalescência por chave"""
+
+    def __init__(self, maxsize: int = WS_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Any, str]" = OrderedDict()
+        self._event = asyncio.Event()
+        self._seq = 0
+        # Chaves das mensagens que não podem ser descartadas
+        self._keep: Set[Any] = set()
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, message: str, key: Optional[str] = None, keep: bool = False):
+        if key is not None and key in self._items:
+            # Mantém a posição na fila, troca pelo conteúdo mais novo
+            self._items[key] = message
+            self.coalesced += 1
+            return
+        if len(self._items) >= self.maxsize:
+            self._drop_oldest()
+        if key is None:
+            self._seq += 1
+            key = ("seq", self._seq)
+        self._items[key] = message
+        if keep:
+            self._keep.add(key)
+        self._event.set()
+
+    def _drop_oldest(self):
+        for key in self._items:
+            if key not in self._keep:
+                del self._items[key]
+                self.dropped += 1
+                return
+        # Só mensagens finais na fila: passa do limite em vez de perder uma
+
+    async def get(self) -> str:
+        while not self._items:
+            self._event.clear()
+            await self._event.wait()
+        key, message = self._items.popitem(last=False)
+        self._keep.discard(key)
+        return message
+
+    def __len__(self):
+        return len(self._items)
+
+
+class WebSocketClient:
+    def __init__(self, websocket: WebSocket, topics: Iterable[str], queue_size: int = WS_QUEUE_SIZE):
+        self.websocket = websocket
+        self.topics: Set[str] = set(topics) or {LEGACY_TOPICS}
+        self.queue = ClientQueue(queue_size)
+        self.connected_at = time.monotonic()
+        self.last_seen = self.connected_at
+        self.last_sent = self.connected_at
+        # Só quem já falou o protocolo precisa responder ao ping
+        self.speaks_protocol = False
+        self.sent = 0
+        self.sender: Optional[asyncio.Task] = None
+
+    def wants(self, topic: str, event_type: Optional[str] = None) -> bool:
+        if ALL_TOPICS in self.topics or topic in self.topics:
+            return True
+        return LEGACY_TOPICS in self.topics and event_type in LEGACY_EVENTS
+
+
+class WebSocketHub:
+    def __init__(self):
+        self.clients: Set[WebSocketClient] = set()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.published = 0
+        self.evicted = 0
+        # relay(topic, data, coalesce_key) repassa publicações locais aos outros
+        # workers (ver state_backend.py); None com um único processo
+        self.relay = None
+
+    async def connect(self, websocket: WebSocket, topics: Iterable[str] = (),
+                      queue_size: int = WS_QUEUE_SIZE) -> WebSocketClient:
+        await websocket.accept()
+        self.loop = asyncio.get_running_loop()
+        client = WebSocketClient(websocket, topics, queue_size)
+        client.sender = asyncio.create_task(self._send_loop(client))
+        self.clients.add(client)
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        return client
+
+    async def serve(self, websocket: WebSocket, topics: Iterable[str] = (), on_connect=None,
+                    queue_size: int = WS_QUEUE_SIZE):
+        """
+        Atende um cliente até ele desconectar (usado pelos endpoints /ws).
+        on_connect(client) roda logo após a inscrição, sem ceder o event loop:
+        o que ele enfileirar (ex.: replay) chega antes de qualquer publish novo.
+        """
+        client = await self.connect(websocket, topics, queue_size)
+        if on_connect:
+            on_connect(client)
+        try:
+            while True:
+                self.handle_message(client, await websocket.receive_text())
+        except Exception:
+            pass
+        finally:
+            self.disconnect(client)
+
+    def handle_message(self, client: WebSocketClient, text: str):
+        client.last_seen = time.monotonic()
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        client.speaks_protocol = True
+        topics = message.get("topics") or []
+        if message.get("action") == "subscribe":
+            client.topics.difference_update((ALL_TOPICS, LEGACY_TOPICS))
+            client.topics.update(topics)
+        elif message.get("action") == "unsubscribe":
+            client.topics.difference_update(topics)
+
+    def disconnect(self, client: WebSocketClient):
+        if client not in self.clients:
+            return
+        self.clients.discard(client)
+        if client.sender and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+
+    async def _send_loop(self, client: WebSocketClient):
+        try:
+            while True:
+                message = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(message),
+                                       timeout=WS_SEND_TIMEOUT_SECONDS)
+                client.sent += 1
+                client.last_sent = time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Envio falhou ou travou: o cliente sai, os outros não esperam
+            self.disconnect(client)
+            await self._close(client)
+
+    async def _close(self, client: WebSocketClient):
+        try:
+            await client.websocket.close()
+        except Exception:
+            pass
+
+    async def _heartbeat_loop(self):
+        while self.clients:
+            await asyncio.sleep(WS_HEARTBEAT_SECONDS)
+            now = time.monotonic()
+            ping = json.dumps({"type": "ping", "ts": time.time()})
+            for client in list(self.clients):
+                # Socket travado já cai pelo timeout de envio em _send_loop
+                if client.speaks_protocol and now - client.last_seen > WS_IDLE_TIMEOUT_SECONDS:
+                    self.evicted += 1
+                    self.disconnect(client)
+                    await self._close(client)
+                    continue
+                client.queue.put(ping, key="ping")
+
+    def publish(self, topic: str, data: Dict[str, Any], coalesce_key: Optional[str] = None,
+                relay: bool = True):
+        """Enfileira para os assinantes do tópico; chamar no event loop"""
+        if relay and self.relay:
+            self.relay(topic, data, coalesce_key)
+        event_type = data.get("type")
+        clients = [client for client in self.clients if client.wants(topic, event_type)]
+        self.published += 1
+        if not clients:
+            return 0
+        # Serializa uma vez para todos os clientes
+        message = json.dumps({**data, "topic": topic})
+        keep = event_type in TERMINAL_EVENTS
+        for client in clients:
+            client.queue.put(message, coalesce_key, keep)
+        return len(clients)
+
+    def publish_threadsafe(self, topic: str, data: Dict[str, Any], coalesce_key: Optional[str] = None):
+        """Ponte para threads (arena_engine): agenda o publish no event loop"""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            # Nenhum cliente conectado neste worker ainda: só repassa
+            if self.relay:
+                self.relay(topic, data, coalesce_key)
+            return
+        if not self.clients and not self.relay:
+            return
+        try:
+            loop.call_soon_threadsafe(self.publish, topic, data, coalesce_key)
+        except RuntimeError:
+            # Loop encerrado entre a checagem e o agendamento
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        clients = list(self.clients)
+        return {
+            "clients": len(clients),
+            "published": self.published,
+            "evicted": self.evicted,
+            "queued": sum(len(c.queue) for c in clients),
+            "dropped": sum(c.queue.dropped for c in clients),
+            "coalesced": sum(c.queue.coalesced for c in clients),
+            "topics": sorted({topic for c in clients for topic in c.topics}),
+        }
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_ws_hub() -> WebSocketHub:
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = WebSocketHub()
+    return _hub